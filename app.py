@@ -3,10 +3,18 @@ Q.Invoice - Query Your Invoices Intelligently
 Clean working version with preview and delete
 """
 import streamlit as st
+import pandas as pd
+import hashlib
+import io
+import os
 import tempfile
+import shutil
 import json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from datetime import datetime
+from sqlalchemy import func, case, delete, update
+from PIL import Image
 
 st.set_page_config(
     page_title="Q.Invoice",
@@ -15,580 +23,30 @@ st.set_page_config(
     initial_sidebar_state="expanded"  # Changed to expanded so it's visible
 )
 
-# Clean CSS with good sidebar
-st.markdown("""
-<style>
-    @import url('https://rsms.me/inter/inter.css');
-    
-    * {
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-    }
-    
-    /* Hide defaults */
-    #MainMenu, footer, header {visibility: hidden;}
-    
-    /* Dark background */
-    .main {
-        background: #1a1a1a;
-        padding: 0;
-    }
-    
-    .block-container {
-        padding: 1.5rem 2rem 2rem 2rem;
-        max-width: 1400px;
-    }
-    
-    /* Header */
-    .app-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 1.5rem 0;
-        margin-bottom: 2rem;
-        border-bottom: 1px solid #333;
-    }
-    
-    .app-header h1 {
-        font-size: 32px;
-        font-weight: 700;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin: 0;
-        letter-spacing: -1px;
-    }
-    
-    .app-header .tagline {
-        font-size: 14px;
-        color: #888;
-        margin-top: 4px;
-        font-weight: 400;
-    }
-    
-    .app-header .quick-stats {
-        display: flex;
-        gap: 3rem;
-        font-size: 15px;
-        color: #999;
-        font-weight: 500;
-    }
-    
-    .app-header .quick-stats .stat-item {
-        text-align: center;
-    }
-    
-    .app-header .quick-stats .stat-num {
-        font-size: 24px;
-        font-weight: 700;
-        color: #fff;
-        display: block;
-        margin-bottom: 2px;
-    }
-    
-    .app-header .quick-stats .stat-label {
-        font-size: 11px;
-        color: #666;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Hero */
-    .hero {
-        text-align: center;
-        padding: 4rem 2rem;
-        background: #222;
-        border-radius: 16px;
-        border: 2px dashed #444;
-        margin: 2rem 0;
-    }
-    
-    .hero h1 {
-        font-size: 56px;
-        font-weight: 700;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin-bottom: 0.5rem;
-        letter-spacing: -2px;
-    }
-    
-    .hero .tagline {
-        font-size: 20px;
-        color: #888;
-        margin-bottom: 2rem;
-    }
-    
-    /* Sidebar - Rich and visible */
-    section[data-testid="stSidebar"] {
-        background: #1a1a1a;
-        border-right: 1px solid #333;
-        min-width: 320px !important;
-        max-width: 320px !important;
-    }
-    
-    section[data-testid="stSidebar"] > div {
-        padding: 1rem;
-    }
-    
-    section[data-testid="stSidebar"] h3 {
-        font-size: 13px;
-        font-weight: 700;
-        color: #999;
-        margin: 1rem 0 0.75rem 0;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    section[data-testid="stSidebar"] hr {
-        border: none;
-        border-top: 1px solid #333;
-        margin: 1rem 0;
-    }
-    
-    /* Sidebar expanders */
-    section[data-testid="stSidebar"] .streamlit-expanderHeader {
-        background: #222;
-        border: 1px solid #333;
-        border-radius: 6px;
-        font-size: 12px;
-        padding: 0.5rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    section[data-testid="stSidebar"] .streamlit-expanderHeader:hover {
-        border-color: #667eea;
-    }
-    
-    /* Sidebar buttons */
-    section[data-testid="stSidebar"] .stButton > button {
-        font-size: 13px;
-        padding: 0.5rem;
-    }
-    
-    /* Sidebar metrics */
-    section[data-testid="stSidebar"] .stMetric {
-        background: #222;
-        padding: 0.75rem;
-        border-radius: 6px;
-        border: 1px solid #333;
-    }
-    
-    section[data-testid="stSidebar"] .stMetric label {
-        font-size: 11px !important;
-        color: #888 !important;
-    }
-    
-    section[data-testid="stSidebar"] .stMetric [data-testid="stMetricValue"] {
-        font-size: 20px !important;
-        color: #fff !important;
-    }
-    
-    /* Force sidebar to always show */
-    [data-testid="collapsedControl"] {
-        display: block !important;
-    }
-    
-    /* Sidebar toggle button */
-    button[kind="header"] {
-        color: #fff !important;
-    }
-    
-    /* Cards */
-    .card {
-        background: #222;
-        border: 1px solid #333;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-bottom: 1rem;
-        transition: all 0.2s;
-    }
-    
-    .card:hover {
-        border-color: #667eea;
-        box-shadow: 0 4px 20px rgba(102, 126, 234, 0.2);
-    }
-    
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 0;
-        background: transparent;
-        border-bottom: 1px solid #333;
-        padding: 0;
-        margin-bottom: 2rem;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        padding: 0.75rem 1.5rem;
-        color: #888;
-        border: none;
-        border-bottom: 2px solid transparent;
-        font-weight: 500;
-        font-size: 14px;
-        background: transparent;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        color: #667eea;
-        border-bottom-color: #667eea;
-        background: transparent;
-    }
-    
-    /* Buttons */
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 8px;
-        padding: 0.625rem 1.25rem;
-        font-weight: 600;
-        font-size: 14px;
-        transition: all 0.2s;
-        width: 100%;
-    }
-    
-    .stButton > button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 6px 20px rgba(102, 126, 234, 0.4);
-    }
-    
-    /* Stats */
-    .stat-card {
-        background: #222;
-        border: 1px solid #333;
-        border-radius: 12px;
-        padding: 1.5rem;
-        text-align: center;
-        transition: all 0.2s;
-    }
-    
-    .stat-card:hover {
-        border-color: #667eea;
-    }
-    
-    .stat-num {
-        font-size: 36px;
-        font-weight: 700;
-        color: #fff;
-        margin-bottom: 0.5rem;
-    }
-    
-    .stat-label {
-        font-size: 12px;
-        color: #888;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        font-weight: 600;
-        display: block;
-        margin-bottom: 0.5rem;
-    }
-    
-    .stat-indicator {
-        font-size: 13px;
-        margin-top: 0.5rem;
-        font-weight: 500;
-    }
-    
-    .stat-good { color: #4ade80; }
-    .stat-warning { color: #fbbf24; }
-    .stat-bad { color: #f87171; }
-    
-    /* Chat */
-    .chat-suggestions {
-        display: flex;
-        gap: 0.75rem;
-        margin-bottom: 1.5rem;
-        flex-wrap: wrap;
-    }
-    
-    .suggestion-chip {
-        background: #222;
-        border: 1px solid #444;
-        border-radius: 20px;
-        padding: 0.5rem 1rem;
-        font-size: 13px;
-        color: #ccc;
-        cursor: pointer;
-        transition: all 0.2s;
-        font-weight: 500;
-    }
-    
-    .suggestion-chip:hover {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border-color: transparent;
-    }
-    
-    /* Messages */
-    .stChatMessage {
-        border: 1px solid #333;
-        border-radius: 12px;
-        padding: 1rem;
-        margin-bottom: 0.75rem;
-        background: #222;
-    }
-    
-    .stChatMessage[data-testid="user-message"] {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-    }
-    
-    .stChatMessage[data-testid="assistant-message"] {
-        background: #222;
-        border: 1px solid #333;
-        color: #e5e5e5;
-    }
-    
-    /* Input */
-    .stChatInput > div {
-        border-radius: 12px;
-        border: 2px solid #333;
-        background: #222;
-    }
-    
-    .stChatInput > div:focus-within {
-        border-color: #667eea;
-        box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.2);
-    }
-    
-    .stChatInput input {
-        background: #222 !important;
-        color: #fff !important;
-        font-size: 14px !important;
-    }
-    
-    .stChatInput input::placeholder {
-        color: #666 !important;
-    }
-    
-    /* Document Item */
-    .doc-item {
-        background: #222;
-        border: 1px solid #333;
-        border-radius: 12px;
-        padding: 1.25rem;
-        margin-bottom: 1rem;
-        transition: all 0.2s;
-        display: flex;
-        gap: 1rem;
-    }
-    
-    .doc-item:hover {
-        border-color: #667eea;
-        box-shadow: 0 4px 20px rgba(102, 126, 234, 0.2);
-    }
-    
-    .doc-preview {
-        width: 80px;
-        height: 100px;
-        background: #1a1a1a;
-        border: 1px solid #444;
-        border-radius: 8px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 32px;
-        flex-shrink: 0;
-    }
-    
-    .doc-content {
-        flex: 1;
-        min-width: 0;
-    }
-    
-    .doc-name {
-        font-size: 16px;
-        font-weight: 600;
-        color: #fff;
-        margin-bottom: 0.75rem;
-        word-break: break-word;
-    }
-    
-    .doc-meta {
-        display: flex;
-        gap: 0.75rem;
-        align-items: center;
-        flex-wrap: wrap;
-    }
-    
-    /* Badges */
-    .badge {
-        display: inline-block;
-        padding: 0.3rem 0.75rem;
-        border-radius: 6px;
-        font-size: 12px;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.3px;
-    }
-    
-    .badge-success {
-        background: rgba(74, 222, 128, 0.2);
-        color: #4ade80;
-        border: 1px solid #4ade80;
-    }
-    
-    .badge-warning {
-        background: rgba(251, 191, 36, 0.2);
-        color: #fbbf24;
-        border: 1px solid #fbbf24;
-    }
-    
-    .badge-danger {
-        background: rgba(248, 113, 113, 0.2);
-        color: #f87171;
-        border: 1px solid #f87171;
-    }
-    
-    .badge-info {
-        background: rgba(102, 126, 234, 0.2);
-        color: #667eea;
-        border: 1px solid #667eea;
-    }
-    
-    .badge-secondary {
-        background: rgba(255, 255, 255, 0.1);
-        color: #ccc;
-        border: 1px solid #444;
-    }
-    
-    /* Status dot */
-    .status-dot {
-        width: 8px;
-        height: 8px;
-        border-radius: 50%;
-        display: inline-block;
-        margin-right: 0.5rem;
-    }
-    
-    .status-success { background: #4ade80; }
-    .status-processing {
-        background: #fbbf24;
-        animation: pulse 1.5s infinite;
-    }
-    .status-failed { background: #f87171; }
-    
-    @keyframes pulse {
-        0%, 100% { opacity: 1; }
-        50% { opacity: 0.4; }
-    }
-    
-    /* Select */
-    .stSelectbox > div > div {
-        border-radius: 8px;
-        border: 1px solid #333;
-        background: #222;
-        color: #fff;
-    }
-    
-    /* Expander */
-    .streamlit-expanderHeader {
-        background: #222;
-        border: 1px solid #333;
-        border-radius: 8px;
-        font-size: 14px;
-        font-weight: 600;
-        padding: 0.75rem 1rem;
-        color: #fff;
-    }
-    
-    .streamlit-expanderHeader:hover {
-        border-color: #667eea;
-    }
-    
-    /* Tabs in expander */
-    .streamlit-expanderContent .stTabs [data-baseweb="tab-list"] {
-        background: #222;
-        border-bottom: 1px solid #444;
-        padding: 0.5rem;
-        gap: 0.5rem;
-        border-radius: 8px 8px 0 0;
-        margin-bottom: 0;
-    }
-    
-    .streamlit-expanderContent .stTabs [data-baseweb="tab"] {
-        padding: 0.5rem 1rem;
-        font-size: 13px;
-        background: transparent;
-        border-radius: 6px;
-    }
-    
-    .streamlit-expanderContent .stTabs [aria-selected="true"] {
-        background: #667eea;
-        color: white;
-        border-bottom: none;
-    }
-    
-    /* Images */
-    .streamlit-expanderContent img {
-        border-radius: 8px;
-        border: 1px solid #333;
-        margin: 1rem 0;
-    }
-    
-    /* Text area */
-    .stTextArea textarea {
-        background: #1a1a1a !important;
-        color: #ccc !important;
-        border: 1px solid #333 !important;
-        border-radius: 8px !important;
-        font-family: 'Monaco', 'Menlo', monospace !important;
-        font-size: 12px !important;
-    }
-    
-    /* JSON viewer */
-    .stJson {
-        background: #1a1a1a !important;
-        border: 1px solid #333 !important;
-        border-radius: 8px !important;
-    }
-    
-    /* Alerts */
-    .stAlert {
-        border-radius: 8px;
-        border: none;
-        font-size: 14px;
-        background: #222;
-        border: 1px solid #444;
-        color: #fff;
-    }
-    
-    /* Text colors */
-    .text-muted {
-        color: #888;
-        font-size: 13px;
-    }
-    
-    /* Metric labels */
-    .stMetric label {
-        color: #888 !important;
-        font-size: 12px !important;
-    }
-    
-    .stMetric [data-testid="stMetricValue"] {
-        color: #fff !important;
-        font-size: 24px !important;
-    }
-    
-    /* Delete button style */
-    .delete-btn {
-        background: rgba(248, 113, 113, 0.2) !important;
-        color: #f87171 !important;
-        border: 1px solid #f87171 !important;
-    }
-    
-    .delete-btn:hover {
-        background: rgba(248, 113, 113, 0.3) !important;
-        box-shadow: 0 4px 12px rgba(248, 113, 113, 0.3) !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Clean CSS with good sidebar, kept in static/app.css and read once per process.
+# Inlined rather than linked: Streamlit's static serving sends .css as
+# text/plain with nosniff, which browsers refuse to apply as a stylesheet
+@st.cache_resource
+def load_app_css() -> str:
+    return (Path(__file__).parent / "static" / "app.css").read_text(encoding="utf-8")
+
+st.markdown(f"<style>{load_app_css()}</style>", unsafe_allow_html=True)
 
 from core.config import Config
-from core.processor import document_processor
-from core.adaptive_query import adaptive_query_engine
 from core.export import export_manager
-from storage.database import db_manager, Document, SearchHistory
+from storage.database import db_manager, Document, DocumentView, SearchHistory
+
+# Heavy modules (OCR models, LLM clients) load on first use so the shell paints first
+@st.cache_resource(show_spinner="Loading OCR engine...")
+def get_document_processor():
+    from core.processor import document_processor
+    document_processor.ocr.start_page_pool()  # workers load their models in the background
+    return document_processor
+
+@st.cache_resource(show_spinner="Loading query engine...")
+def get_query_engine():
+    from core import adaptive_query
+    return adaptive_query.get_query_engine()
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
@@ -601,70 +59,379 @@ if "suggested_questions" not in st.session_state:
         "Monthly breakdown"
     ]
 
-def load_documents():
-    session = db_manager.get_session()
-    try:
-        return session.query(Document)\
+if "docs_version" not in st.session_state:
+    st.session_state.docs_version = 0
+
+if "pending_deletes" not in st.session_state:
+    st.session_state.pending_deletes = set()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_documents(version):
+    """Load non-archived documents; `version` is the cache key bumped on mutation"""
+    with db_manager.session_scope() as session:
+        rows = session.query(*DocumentView.columns())\
             .filter(Document.is_archived == False)\
             .order_by(Document.processed_at.desc())\
             .all()
-    finally:
-        session.close()
+        return _to_views(rows)
+
+def _to_views(rows):
+    """Wrap projected rows as DocumentViews, formatting all display dates in one vectorized call"""
+    dates = pd.to_datetime(pd.Series([row.processed_at for row in rows], dtype=object))\
+        .dt.strftime("%b %d, %Y")\
+        .fillna("N/A")
+    return [DocumentView(*row, date_str) for row, date_str in zip(rows, dates)]
+
+# Library sort options -> SQL ORDER BY (NULLs sort as the old Python keys did)
+_LIBRARY_SORTS = {
+    "Newest first": Document.processed_at.desc(),
+    "Oldest first": Document.processed_at.asc(),
+    "Name A-Z": Document.original_filename.asc(),
+    "Quality ↓": func.coalesce(Document.ocr_confidence, 0).desc(),
+}
+LIBRARY_PAGE_SIZE = 50
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_library_page(version, f_type, sort, page, page_size=LIBRARY_PAGE_SIZE):
+    """One page of the Library listing with filter, order and LIMIT/OFFSET pushed into SQL"""
+    with db_manager.session_scope() as session:
+        query = session.query(*DocumentView.columns()).filter(Document.is_archived == False)
+        if f_type != "All":
+            query = query.filter(Document.document_type == f_type)
+        rows = query.order_by(_LIBRARY_SORTS[sort], Document.id.desc())\
+            .limit(page_size)\
+            .offset((page - 1) * page_size)\
+            .all()
+        return tuple(_to_views(rows))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_type_count(version, f_type):
+    """Number of non-archived documents of one type"""
+    with db_manager.session_scope() as session:
+        return session.query(func.count(Document.id))\
+            .filter(Document.is_archived == False, Document.document_type == f_type)\
+            .scalar() or 0
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_doc_types(version):
+    """Sorted distinct document types, shared by the Query and Library filters"""
+    return tuple(sorted({d.document_type for d in load_documents(version) if d.document_type}))
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_doc_stats(version):
+    """Return (total, completed, avg_quality_pct) computed in a single SQL query"""
+    with db_manager.session_scope() as session:
+        total, completed, avg_conf = session.query(
+            func.count(Document.id),
+            func.sum(case((Document.status == "completed", 1), else_=0)),
+            func.avg(func.coalesce(Document.ocr_confidence, 0))
+        ).filter(Document.is_archived == False).one()
+        return total or 0, completed or 0, (avg_conf or 0) * 100
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_ocr_text(doc_id):
+    """Load a document's raw OCR text on demand (excluded from load_documents)"""
+    with db_manager.session_scope() as session:
+        return session.query(Document.ocr_text).filter(Document.id == doc_id).scalar()
+
+THUMB_DIR = Config.CACHE_DIR / "thumbs"
+THUMB_WIDTH = 400
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_pdf_thumb(path, mtime):
+    """Return (WebP thumbnail of page 1, page count); rendered once per file version and kept on disk"""
+    key = hashlib.sha1(f"{path}:{mtime}".encode()).hexdigest()
+    for cached in THUMB_DIR.glob(f"{key}-*.webp"):
+        return cached.read_bytes(), int(cached.stem.rsplit("-", 1)[1])
+    
+    import fitz
+    with fitz.open(path) as pdf_doc:
+        pix = pdf_doc[0].get_pixmap(matrix=fitz.Identity)
+        page_count = len(pdf_doc)
+    
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    img.thumbnail((THUMB_WIDTH, THUMB_WIDTH * 2))
+    buf = io.BytesIO()
+    img.save(buf, "WEBP", quality=80)
+    
+    THUMB_DIR.mkdir(parents=True, exist_ok=True)
+    (THUMB_DIR / f"{key}-{page_count}.webp").write_bytes(buf.getvalue())
+    return buf.getvalue(), page_count
+
+@st.cache_data(ttl=15, show_spinner=False)
+def load_analytics(version):
+    """Analytics tab aggregates (see DatabaseManager.get_analytics_stats), cached per documents version"""
+    return db_manager.get_analytics_stats()
+
+def invalidate_documents():
+    """Force the next load_documents()/load_doc_stats() call to hit the database"""
+    st.session_state.docs_version += 1
+    db_manager.bump_documents_version()
+    load_documents.clear()
+    load_library_page.clear()
+    load_type_count.clear()
+    load_doc_types.clear()
+    load_analytics.clear()
+    load_doc_stats.clear()
+
+def history_version():
+    """Cheap token that changes whenever search history rows are added or removed"""
+    with db_manager.session_scope() as session:
+        return tuple(session.query(
+            func.max(SearchHistory.created_at),
+            func.count(SearchHistory.id)
+        ).one())
+
+@st.cache_data(show_spinner=False)
+def load_history(version, limit=10):
+    """Load the most recent search history as a DataFrame keyed on history_version()"""
+    with db_manager.session_scope() as session:
+        rows = session.query(SearchHistory)\
+            .with_entities(
+                SearchHistory.id,
+                SearchHistory.query,
+                SearchHistory.response,
+                SearchHistory.created_at
+            )\
+            .order_by(SearchHistory.created_at.desc(), SearchHistory.id.desc())\
+            .limit(limit)\
+            .all()
+        return pd.DataFrame(
+            [tuple(r) for r in rows],
+            columns=["id", "query", "response", "created_at"]
+        )
 
-def delete_document(doc_id):
-    """Delete a document (soft delete)"""
-    session = db_manager.get_session()
+def _unlink_quietly(path):
+    """Best-effort removal of a document's original file"""
     try:
-        doc = session.query(Document).filter(Document.id == doc_id).first()
-        if doc:
-            doc.is_archived = True
-            session.commit()
-            
-            # Try to delete physical file
-            if doc.file_path and Path(doc.file_path).exists():
-                try:
-                    Path(doc.file_path).unlink()
-                except:
-                    pass
-            
-            return True
+        Path(path).unlink(missing_ok=True)
+    except OSError:
+        pass
+
+def delete_documents(doc_ids):
+    """Soft delete documents in one UPDATE, then remove their files; returns the number archived"""
+    try:
+        with db_manager.session_scope() as session:
+            paths = [p for (p,) in session.query(Document.file_path).filter(Document.id.in_(doc_ids)) if p]
+            count = session.execute(
+                update(Document).where(Document.id.in_(doc_ids)).values(is_archived=True)
+            ).rowcount
+        invalidate_documents()
+        
+        # Try to delete physical files
+        with ThreadPoolExecutor(max_workers=Config.UPLOAD_WORKERS) as executor:
+            list(executor.map(_unlink_quietly, paths))
+        
+        return count
     except Exception as e:
-        st.error(f"Error deleting document: {e}")
-        return False
+        st.error(f"Error deleting documents: {e}")
+        return 0
+
+def toggle_pending_delete(doc_id):
+    """Checkbox callback: add or remove a document from the pending deletes"""
+    st.session_state.pending_deletes ^= {doc_id}
+
+def process_uploads(files, progress, status_text):
+    """Process uploaded files concurrently, updating progress as each one finishes"""
+    jobs = []
+    for f in files:
+        # Create temp file and close it before processing
+        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(f.name).suffix) as tmp:
+            f.seek(0)
+            shutil.copyfileobj(f, tmp, length=1024 * 1024)
+            jobs.append((tmp.name, f.name))
+    
+    try:
+        processor = get_document_processor()
+        with ThreadPoolExecutor(max_workers=min(Config.UPLOAD_WORKERS, len(jobs))) as executor:
+            futures = {
+                executor.submit(processor.process_document, tmp_path, name): name
+                for tmp_path, name in jobs
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                future.result()
+                status_text.text(f"Processed {i}/{len(jobs)}: {futures[future][:30]}")
+                progress.progress(i / len(jobs))
     finally:
-        session.close()
+        # Clean up temp files
+        for tmp_path, _ in jobs:
+            try:
+                Path(tmp_path).unlink()
+            except:
+                pass
+
+_QUALITY_LEVELS = ((90, "success"), (70, "warning"))
+
+_STATUS_DISPLAY = {
+    "completed": ('<span class="status-dot status-success"></span>Ready', "success"),
+    "processing": ('<span class="status-dot status-processing"></span>Processing', "warning")
+}
+_STATUS_FAILED = ('<span class="status-dot status-failed"></span>Failed', "danger")
+
+_DOC_ICONS = {
+    "invoice": "🧾",
+    "receipt": "🧾",
+    "quote": "📝",
+    "purchase_order": "📋",
+    "bill": "💵",
+    "statement": "📊",
+    "lease": "📄",
+    "contract": "📜"
+}
+# Ready-made preview tiles for render_doc_card()
+_DOC_ICON_HTML = {k: f'<div class="doc-preview">{v}</div>' for k, v in _DOC_ICONS.items()}
+_DEFAULT_PREVIEW = '<div class="doc-preview">📄</div>'
 
 def get_quality_indicator(confidence):
     if not confidence:
         return "N/A", "secondary"
     pct = confidence * 100
-    if pct >= 90:
-        return f"{pct:.0f}%", "success"
-    elif pct >= 70:
-        return f"{pct:.0f}%", "warning"
-    else:
-        return f"{pct:.0f}%", "danger"
+    for threshold, level in _QUALITY_LEVELS:
+        if pct >= threshold:
+            return f"{pct:.0f}%", level
+    return f"{pct:.0f}%", "danger"
 
 def get_status_display(doc):
-    if doc.status == "completed":
-        return '<span class="status-dot status-success"></span>Ready', "success"
-    elif doc.status == "processing":
-        return '<span class="status-dot status-processing"></span>Processing', "warning"
-    else:
-        return '<span class="status-dot status-failed"></span>Failed', "danger"
+    return _STATUS_DISPLAY.get(doc.status, _STATUS_FAILED)
 
 def get_doc_icon(doc_type):
-    icons = {
-        "invoice": "🧾",
-        "receipt": "🧾",
-        "quote": "📝",
-        "purchase_order": "📋",
-        "bill": "💵",
-        "statement": "📊",
-        "lease": "📄",
-        "contract": "📜"
-    }
-    return icons.get(doc_type, "📄")
+    return _DOC_ICONS.get(doc_type, "📄")
+
+def render_doc_card(doc):
+    """Build the full Library card (preview, name, badges) as one HTML string"""
+    status_html, status_class = get_status_display(doc)
+    quality_text, quality_class = get_quality_indicator(doc.ocr_confidence)
+    
+    return (
+        f'<div class="doc-item">'
+        f'{_DOC_ICON_HTML.get(doc.document_type, _DEFAULT_PREVIEW)}'
+        f'<div class="doc-content">'
+        f'<div class="doc-name">{doc.original_filename}</div>'
+        f'<div class="doc-meta">'
+        f'<span class="badge badge-{status_class}">{status_html}</span>'
+        f'<span class="badge badge-info">{doc.document_type or "unknown"}</span>'
+        f'<span class="badge badge-{quality_class}">{quality_text}</span>'
+        f'<span class="text-muted">{doc.processed_at_str}</span>'
+        f'</div></div></div>'
+    )
+
+@st.fragment
+def render_doc_row(doc):
+    """One Library row; its widgets rerun only this fragment, not the whole app"""
+    with st.container():
+        col_content, col_actions = st.columns([7, 1])
+        
+        with col_content:
+            st.markdown(render_doc_card(doc), unsafe_allow_html=True)
+        
+        with col_actions:
+            # Mark for deletion; applied in bulk by "Delete selected"
+            st.checkbox(
+                "🗑️",
+                value=doc.id in st.session_state.pending_deletes,
+                key=f"sel_{doc.id}",
+                help="Select for deletion",
+                on_change=toggle_pending_delete,
+                args=(doc.id,)
+            )
+        
+        # Expander for preview
+        with st.expander("📄 View Details", expanded=False):
+            preview_tab, data_tab = st.tabs(["Preview", "Data"])
+            
+            with preview_tab:
+                if doc.file_path and Path(doc.file_path).exists():
+                    file_ext = Path(doc.file_path).suffix.lower()
+                    
+                    if file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
+                        st.image(doc.file_path, width="stretch")
+                    
+                    elif file_ext == '.pdf':
+                        try:
+                            img_bytes, page_count = load_pdf_thumb(doc.file_path, os.path.getmtime(doc.file_path))
+                            st.image(img_bytes, width=THUMB_WIDTH)
+                            
+                            if page_count > 1:
+                                st.caption(f"📄 Showing page 1 of {page_count}")
+                        except Exception as e:
+                            st.warning("PDF preview unavailable")
+                    
+                    else:
+                        st.info("Preview not available for this file type")
+                else:
+                    st.warning("Original file not found")
+            
+            with data_tab:
+                if doc.extracted_data:
+                    st.json(doc.extracted_data)
+                else:
+                    st.info("No data extracted")
+                
+                if doc.has_ocr_text:
+                    if st.toggle("📝 OCR Text", key=f"ocr_{doc.id}"):
+                        st.text_area(
+                            "Raw OCR output",
+                            load_ocr_text(doc.id),
+                            height=200,
+                            disabled=True,
+                            label_visibility="collapsed"
+                        )
+
+@st.fragment
+def render_history():
+    """Recent chat history; selecting or deleting entries reruns only this fragment"""
+    # Get chat history from database (one table element, cached until history changes)
+    history = load_history(history_version())
+    
+    if not history.empty:
+        table = pd.DataFrame({
+            "Question": history["query"].str.slice(0, 40),
+            "When": history["created_at"].dt.strftime("%b %d, %H:%M")
+        })
+        event = st.dataframe(
+            table,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="history_table",
+            width="stretch"
+        )
+        
+        # Details for the selected history item
+        selected = [i for i in event.selection.rows if i < len(history)]
+        if selected:
+            entry = history.iloc[selected[0]]
+            response = entry["response"] or ""
+            
+            st.markdown(f"**Question:**")
+            st.text(entry["query"])
+            
+            st.markdown(f"**Answer:**")
+            st.markdown(response[:200] + "..." if len(response) > 200 else response)
+            
+            st.caption(f"🕐 {table['When'].iloc[selected[0]]}")
+            
+            # Delete button
+            if st.button("🗑️ Delete", key=f"del_hist_{entry['id']}", width="stretch"):
+                try:
+                    with db_manager.session_scope() as session:
+                        session.execute(delete(SearchHistory).where(SearchHistory.id == int(entry["id"])))
+                    st.success("Deleted!")
+                    st.rerun(scope="fragment")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+        
+        # Clear all button
+        if st.button("🗑️ Clear All History", key="clear_all_hist", width="stretch"):
+            try:
+                with db_manager.session_scope() as session:
+                    session.execute(delete(SearchHistory))
+                st.success("History cleared!")
+                st.rerun(scope="fragment")
+            except Exception as e:
+                st.error(f"Error: {e}")
+    else:
+        st.info("No chat history yet")
 
 def render_sidebar():
     """Render comprehensive sidebar with chat history"""
@@ -694,25 +461,11 @@ def render_sidebar():
                 progress = st.progress(0)
                 status_text = st.empty()
                 
-                for i, f in enumerate(files):
-                    status_text.text(f"{i+1}/{len(files)}: {f.name[:20]}...")
-                    
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(f.name).suffix) as tmp:
-                        tmp.write(f.getbuffer())
-                        tmp_path = tmp.name
-                    
-                    try:
-                        document_processor.process_document(tmp_path, f.name)
-                    finally:
-                        try:
-                            Path(tmp_path).unlink()
-                        except:
-                            pass
-                    
-                    progress.progress((i + 1) / len(files))
+                process_uploads(files, progress, status_text)
                 
                 progress.empty()
                 status_text.empty()
+                invalidate_documents()
                 st.success("✓ Uploaded!")
                 st.rerun()
         
@@ -721,65 +474,21 @@ def render_sidebar():
         # Chat History Section
         st.markdown("### 💬 Chat History")
         
-        # Get chat history from database
-        session = db_manager.get_session()
-        try:
-            history = session.query(SearchHistory)\
-                .order_by(SearchHistory.created_at.desc())\
-                .limit(10)\
-                .all()
-            
-            if history:
-                for entry in history:
-                    # Create expandable for each history item
-                    with st.expander(f"🔍 {entry.query[:40]}...", expanded=False):
-                        st.markdown(f"**Question:**")
-                        st.text(entry.query)
-                        
-                        st.markdown(f"**Answer:**")
-                        st.markdown(entry.response[:200] + "..." if len(entry.response) > 200 else entry.response)
-                        
-                        st.caption(f"🕐 {entry.created_at.strftime('%b %d, %H:%M')}")
-                        
-                        # Delete button
-                        if st.button("🗑️ Delete", key=f"del_hist_{entry.id}", width="stretch"):
-                            try:
-                                session.delete(entry)
-                                session.commit()
-                                st.success("Deleted!")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Error: {e}")
-                
-                # Clear all button
-                if st.button("🗑️ Clear All History", key="clear_all_hist", width="stretch"):
-                    try:
-                        session.query(SearchHistory).delete()
-                        session.commit()
-                        st.success("History cleared!")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error: {e}")
-            else:
-                st.info("No chat history yet")
-        finally:
-            session.close()
+        render_history()
         
         st.markdown("---")
         
         # Quick Stats
         st.markdown("### 📊 Stats")
-        docs = load_documents()
+        total, completed, avg_q = load_doc_stats(st.session_state.docs_version)
         
-        if docs:
+        if total:
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("Docs", len(docs))
+                st.metric("Docs", total)
             with col2:
-                completed = sum(1 for d in docs if d.status == "completed")
                 st.metric("Ready", completed)
             
-            avg_q = sum(d.ocr_confidence or 0 for d in docs) / len(docs) * 100 if docs else 0
             st.metric("Quality", f"{avg_q:.0f}%")
         else:
             st.info("No documents")
@@ -802,13 +511,11 @@ def main():
     # Render sidebar FIRST to ensure it shows
     render_sidebar()
     
-    docs = load_documents()
+    docs = load_documents(st.session_state.docs_version)
+    total, completed, avg_quality = load_doc_stats(st.session_state.docs_version)
     
     # Header
     if docs:
-        completed = sum(1 for d in docs if d.status == "completed")
-        avg_quality = sum(d.ocr_confidence or 0 for d in docs) / len(docs) * 100 if docs else 0
-        
         st.markdown(f"""
         <div class="app-header">
             <div>
@@ -817,7 +524,7 @@ def main():
             </div>
             <div class="quick-stats">
                 <div class="stat-item">
-                    <span class="stat-num">{len(docs)}</span>
+                    <span class="stat-num">{total}</span>
                     <span class="stat-label">Documents</span>
                 </div>
                 <div class="stat-item">
@@ -858,28 +565,11 @@ def main():
                     progress = st.progress(0)
                     status_text = st.empty()
                     
-                    for i, f in enumerate(uploaded_files):
-                        status_text.text(f"Processing {i+1}/{len(uploaded_files)}: {f.name}")
-                        
-                        # Create temp file and close it before processing
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(f.name).suffix) as tmp:
-                            tmp.write(f.getbuffer())
-                            tmp_path = tmp.name
-                        # File is now closed and can be accessed
-                        
-                        try:
-                            document_processor.process_document(tmp_path, f.name)
-                        finally:
-                            # Clean up temp file
-                            try:
-                                Path(tmp_path).unlink()
-                            except:
-                                pass
-                        
-                        progress.progress((i + 1) / len(uploaded_files))
+                    process_uploads(uploaded_files, progress, status_text)
                     
                     progress.empty()
                     status_text.empty()
+                    invalidate_documents()
                     st.success(f"✓ Processed {len(uploaded_files)} documents")
                     st.rerun()
     else:
@@ -889,7 +579,7 @@ def main():
         with tab1:
             col1, col2 = st.columns([4, 1])
             with col1:
-                doc_types = ["All documents"] + sorted(list(set(d.document_type for d in docs if d.document_type)))
+                doc_types = ["All documents", *load_doc_types(st.session_state.docs_version)]
                 selected = st.selectbox("Query scope", doc_types, label_visibility="collapsed", key="chat_filter")
             with col2:
                 if st.button("Clear", width="stretch"):
@@ -897,16 +587,14 @@ def main():
                     st.rerun()
             
             if not st.session_state.chat_history:
-                st.markdown('<div class="text-muted mb-1">Quick queries:</div>', unsafe_allow_html=True)
-                cols = st.columns(4)
-                for i, suggestion in enumerate(st.session_state.suggested_questions):
-                    with cols[i % 4]:
-                        if st.button(suggestion, key=f"sug_{i}", width="stretch"):
-                            st.session_state.chat_history.append({"role": "user", "content": suggestion})
-                            with st.spinner("Analyzing..."):
-                                result = adaptive_query_engine.query(suggestion, document_type=None if selected == "All documents" else selected)
-                                st.session_state.chat_history.append({"role": "assistant", "content": result["answer"]})
-                            st.rerun()
+                # All chips in one element instead of a column container per button
+                suggestion = st.pills("Quick queries:", st.session_state.suggested_questions, key="sug_pick")
+                if suggestion:
+                    st.session_state.chat_history.append({"role": "user", "content": suggestion})
+                    with st.spinner("Analyzing..."):
+                        result = get_query_engine().query(suggestion, document_type=None if selected == "All documents" else selected)
+                        st.session_state.chat_history.append({"role": "assistant", "content": result["answer"]})
+                    st.rerun()
             
             for msg in st.session_state.chat_history:
                 with st.chat_message(msg["role"]):
@@ -916,124 +604,56 @@ def main():
                 st.session_state.chat_history.append({"role": "user", "content": question})
                 with st.chat_message("user"):
                     st.markdown(question)
+                # Stream the answer as it is generated; already on screen, so no rerun needed
                 with st.chat_message("assistant"):
-                    with st.spinner("Thinking..."):
-                        result = adaptive_query_engine.query(question, document_type=None if selected == "All documents" else selected)
-                        st.markdown(result["answer"])
-                st.session_state.chat_history.append({"role": "assistant", "content": result["answer"]})
-                st.rerun()
+                    answer = st.write_stream(
+                        get_query_engine().query_stream(question, document_type=None if selected == "All documents" else selected)
+                    )
+                st.session_state.chat_history.append({"role": "assistant", "content": answer})
         
         # TAB 2: Library with Preview & Delete
         with tab2:
             col1, col2, col3 = st.columns([2, 2, 1])
             with col1:
-                types = ["All"] + sorted(list(set(d.document_type for d in docs if d.document_type)))
+                types = ["All", *load_doc_types(st.session_state.docs_version)]
                 f_type = st.selectbox("Filter by type", types, key="lib_filter", label_visibility="visible")
             with col2:
-                sort_opts = ["Newest first", "Oldest first", "Name A-Z", "Quality ↓"]
-                sort = st.selectbox("Sort by", sort_opts, key="lib_sort", label_visibility="visible")
+                sort = st.selectbox("Sort by", list(_LIBRARY_SORTS), key="lib_sort", label_visibility="visible")
+            matching = total if f_type == "All" else load_type_count(st.session_state.docs_version, f_type)
+            pages = max(1, math.ceil(matching / LIBRARY_PAGE_SIZE))
+            if st.session_state.get("lib_page", 1) > pages:
+                st.session_state.lib_page = pages
             with col3:
-                st.metric("Total", len(docs))
+                page = st.number_input("Page", 1, pages, key="lib_page")
             
-            filtered = docs if f_type == "All" else [d for d in docs if d.document_type == f_type]
-            if "Newest" in sort:
-                filtered = sorted(filtered, key=lambda d: d.processed_at or datetime.min, reverse=True)
-            elif "Oldest" in sort:
-                filtered = sorted(filtered, key=lambda d: d.processed_at or datetime.min)
-            elif "Name" in sort:
-                filtered = sorted(filtered, key=lambda d: d.original_filename)
-            else:
-                filtered = sorted(filtered, key=lambda d: d.ocr_confidence or 0, reverse=True)
+            filtered = load_library_page(st.session_state.docs_version, f_type, sort, page)
+            first = (page - 1) * LIBRARY_PAGE_SIZE
             
-            st.markdown(f'<div class="text-muted mb-2">Showing {len(filtered)} documents</div>', unsafe_allow_html=True)
+            st.markdown(
+                f'<div class="text-muted mb-2">Showing {first + 1 if filtered else 0}-{first + len(filtered)} of {matching} documents</div>',
+                unsafe_allow_html=True
+            )
+            
+            if st.button("🗑️ Delete selected", key="lib_delete_selected"):
+                pending = st.session_state.pending_deletes
+                if pending:
+                    deleted = delete_documents(list(pending))
+                    st.session_state.pending_deletes = set()
+                    st.success(f"✓ Deleted {deleted} documents")
+                    st.rerun()
+                else:
+                    st.info("Select documents to delete first")
             
             for doc in filtered:
-                with st.container():
-                    col_preview, col_content, col_actions = st.columns([1, 6, 1])
-                    
-                    with col_preview:
-                        icon = get_doc_icon(doc.document_type)
-                        st.markdown(f'<div class="doc-preview">{icon}</div>', unsafe_allow_html=True)
-                    
-                    with col_content:
-                        st.markdown(f'<div class="doc-name">{doc.original_filename}</div>', unsafe_allow_html=True)
-                        
-                        status_html, status_class = get_status_display(doc)
-                        quality_text, quality_class = get_quality_indicator(doc.ocr_confidence)
-                        date_str = doc.processed_at.strftime("%b %d, %Y") if doc.processed_at else "N/A"
-                        
-                        st.markdown(f"""
-                        <div class="doc-meta">
-                            <span class="badge badge-{status_class}">{status_html}</span>
-                            <span class="badge badge-info">{doc.document_type or 'unknown'}</span>
-                            <span class="badge badge-{quality_class}">{quality_text}</span>
-                            <span class="text-muted">{date_str}</span>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    
-                    with col_actions:
-                        # Simple delete button
-                        if st.button("🗑️", key=f"del_{doc.id}", help="Delete document"):
-                            if delete_document(doc.id):
-                                st.success(f"✓ Deleted {doc.original_filename}")
-                                st.rerun()
-                    
-                    # Expander for preview
-                    with st.expander("📄 View Details", expanded=False):
-                        preview_tab, data_tab = st.tabs(["Preview", "Data"])
-                        
-                        with preview_tab:
-                            if doc.file_path and Path(doc.file_path).exists():
-                                file_ext = Path(doc.file_path).suffix.lower()
-                                
-                                if file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
-                                    st.image(doc.file_path, width="stretch")
-                                
-                                elif file_ext == '.pdf':
-                                    try:
-                                        import fitz
-                                        pdf_doc = fitz.open(doc.file_path)
-                                        page = pdf_doc[0]
-                                        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                                        img_bytes = pix.tobytes("png")
-                                        st.image(img_bytes, width="stretch")
-                                        
-                                        if len(pdf_doc) > 1:
-                                            st.caption(f"📄 Showing page 1 of {len(pdf_doc)}")
-                                        
-                                        pdf_doc.close()
-                                    except Exception as e:
-                                        st.warning("PDF preview unavailable")
-                                
-                                else:
-                                    st.info("Preview not available for this file type")
-                            else:
-                                st.warning("Original file not found")
-                        
-                        with data_tab:
-                            if doc.extracted_data:
-                                st.json(doc.extracted_data)
-                            else:
-                                st.info("No data extracted")
-                            
-                            if doc.ocr_text:
-                                with st.expander("📝 OCR Text", expanded=False):
-                                    st.text_area(
-                                        "Raw OCR output",
-                                        doc.ocr_text,
-                                        height=200,
-                                        disabled=True,
-                                        label_visibility="collapsed"
-                                    )
+                render_doc_row(doc)
         
         # TAB 3: Analytics
         with tab3:
             col1, col2, col3, col4 = st.columns(4)
             
-            completed = sum(1 for d in docs if d.status == "completed")
-            processing = sum(1 for d in docs if d.status == "processing")
-            failed = sum(1 for d in docs if d.status == "failed")
-            avg_quality = sum(d.ocr_confidence or 0 for d in docs) / len(docs) * 100 if docs else 0
+            stats = load_analytics(st.session_state.docs_version)
+            completed, processing, failed = stats["completed"], stats["processing"], stats["failed"]
+            avg_quality = stats["avg_quality"]
             
             with col1:
                 indicator = "✓ All processed" if completed == len(docs) else f"⏳ {processing} processing"
@@ -1067,7 +687,7 @@ def main():
                 """, unsafe_allow_html=True)
             
             with col4:
-                types_count = len(set(d.document_type for d in docs if d.document_type))
+                types_count = stats["types_count"]
                 st.markdown(f"""
                 <div class="stat-card">
                     <div class="stat-label">Types</div>
@@ -1083,8 +703,7 @@ def main():
                 if failed > 0:
                     st.warning(f"**{failed} documents failed** - Review and reprocess")
                 if avg_quality < 70:
-                    low_quality = [d for d in docs if d.ocr_confidence and d.ocr_confidence < 0.7]
-                    st.warning(f"**{len(low_quality)} documents have low quality** - Consider re-scanning")
+                    st.warning(f"**{len(stats['low_quality_ids'])} documents have low quality** - Consider re-scanning")
             
             st.markdown("### Export Data")
             col1, col2 = st.columns(2)
@@ -1102,7 +721,10 @@ def main():
 if __name__ == "__main__":
     try:
         Config.validate()
-        main()
+        # One thread-local session serves every DB hit of this rerun,
+        # including the query engine's (nested scopes reuse it)
+        with db_manager.session_scope():
+            main()
     except Exception as e:
         st.error(f"Configuration error: {e}")
         st.info("Please set your API keys in the .env file")
\ No newline at end of file
@@ -2,148 +2,148 @@
 DocuVault - Adaptive Query Engine
 Changes expert personality based on query type
 """
+import asyncio
 import json
+import re
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from collections import Counter
+from functools import cache, lru_cache
+from itertools import chain
+from typing import Iterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from openai import OpenAI
-from anthropic import Anthropic
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
 from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from core import async_runner, history_writer
 from core.config import Config
-from storage.database import db_manager, Document, SearchHistory
+from core.llm_cache import llm_cache
+from storage.database import db_manager, Document
 
 
-class AdaptiveQueryEngine:
-    """Adaptive query engine that changes personality based on question type"""
-    
-    def __init__(self, provider: str = "openai"):
-        """Initialize adaptive query engine"""
-        self.provider = provider
-        
-        if provider == "openai":
-            if not Config.OPENAI_API_KEY:
-                raise ValueError("OPENAI_API_KEY not configured")
-            self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
-            self.model = "gpt-4o"
-            
-        elif provider == "anthropic":
-            if not Config.ANTHROPIC_API_KEY:
-                raise ValueError("ANTHROPIC_API_KEY not configured")
-            self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
-            self.model = "claude-3-5-sonnet-20241022"
-            
-        logger.info(f"Adaptive Query Engine initialized: {provider} / {self.model}")
-    
-    def get_documents(
-        self, 
-        document_ids: Optional[List[int]] = None,
-        document_type: Optional[str] = None,
-        limit: Optional[int] = None
-    ) -> List[Document]:
-        """Retrieve documents from database"""
-        session = db_manager.get_session()
-        
-        try:
-            query = session.query(Document).filter(
-                Document.status == "completed",
-                Document.is_archived == False
-            )
-            
-            if document_ids:
-                query = query.filter(Document.id.in_(document_ids))
-            
-            if document_type:
-                query = query.filter(Document.document_type == document_type)
-            
-            query = query.order_by(Document.processed_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            return query.all()
-            
-        finally:
-            session.close()
-    
-    def build_context(self, documents: List[Document]) -> str:
-        """Build context from documents"""
-        if not documents:
-            return "No documents available."
-        
-        context_parts = []
-        
-        # Summary
-        context_parts.append(f"=== SUMMARY ===")
-        context_parts.append(f"Total documents: {len(documents)}")
-        
-        doc_types = {}
-        for doc in documents:
-            doc_type = doc.document_type or "unknown"
-            doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-        context_parts.append(f"Document types: {', '.join(f'{k}={v}' for k, v in doc_types.items())}")
-        context_parts.append("")
-        
-        # Documents
-        context_parts.append("=== DOCUMENTS ===")
-        for i, doc in enumerate(documents, 1):
-            context_parts.append(f"\n--- Document {i} ---")
-            context_parts.append(f"Filename: {doc.original_filename}")
-            context_parts.append(f"Type: {doc.document_type or 'unknown'}")
-            context_parts.append(f"Date: {doc.processed_at.strftime('%Y-%m-%d') if doc.processed_at else 'N/A'}")
-            context_parts.append(f"OCR Confidence: {doc.ocr_confidence * 100:.0f}%" if doc.ocr_confidence else "N/A")
-            
-            if doc.extracted_data:
-                context_parts.append("\nExtracted Data:")
-                context_parts.append(json.dumps(doc.extracted_data, indent=2, ensure_ascii=False))
-        
-        return "\n".join(context_parts)
+# Query type keywords, in priority order. Keywords are substrings (stems like
+# 'compar' or 'vérif' must match inflected forms).
+_QUERY_TYPE_KEYWORDS = (
+    # Calculator
+    ("calculator", ['combien', 'total', 'somme', 'calcul', 'moyenne', 'pourcentage', '%', 'sum', 'calculate', 'average', 'count']),
+    # Comparison
+    ("analyst", ['compar', 'versus', 'vs', 'différence', 'plus grand', 'plus petit', 'meilleur', 'compare', 'difference']),
+    # Search/List
+    ("finder", ['liste', 'montre', 'affiche', 'tous', 'quels', 'show', 'list', 'display', 'all', 'find', 'search']),
+    # Analysis/Insight
+    ("analyst", ['analys', 'tendance', 'insight', 'recommand', 'conseil', 'suggest', 'trend', 'pattern', 'overview']),
+    # Financial Advisory
+    ("advisor", ['budget', 'dépense', 'économ', 'optimis', 'réduire', 'coût', 'spend', 'save', 'cost', 'expensive']),
+    # Audit/Compliance
+    ("auditor", ['manque', 'manquant', 'erreur', 'problème', 'vérif', 'audit', 'missing', 'error', 'check', 'validate', 'issue']),
+    # Forecasting
+    ("forecaster", ['prévision', 'futur', 'projection', 'estim', 'forecast', 'predict', 'future', 'will', 'next']),
+)
+
+# All groups compiled into one automaton, matched at every offset via a
+# zero-width lookahead so overlapping keywords are all seen in one pass.
+_QUERY_TYPES = tuple(query_type for query_type, _ in _QUERY_TYPE_KEYWORDS)
+_QUERY_TYPE_PRIORITY = {query_type: i for i, query_type in reversed(list(enumerate(_QUERY_TYPES)))}
+_QUERY_TYPE_RE = re.compile("(?=" + "|".join(
+    "(" + "|".join(map(re.escape, keywords)) + ")"
+    for _, keywords in _QUERY_TYPE_KEYWORDS
+) + ")")
+
+
+# Columns used to build query context; ocr_text is deliberately left out.
+# Display values are formatted by SQLite rather than per document in Python.
+_CONTEXT_COLUMNS = (
+    Document.id,
+    Document.original_filename,
+    Document.document_type,
+    Document.processed_at,
+    Document.ocr_confidence,
+    Document.extracted_data,
+    func.strftime("%Y-%m-%d", Document.processed_at).label("processed_date"),
+    (Document.ocr_confidence * 100).label("ocr_pct"),
+)
+# Completion budget per query type: short answers don't need a 2000-token ceiling
+_MAX_TOKENS = {
+    "calculator": 200,
+    "finder": 600,
+    "auditor": 1000,
+    "forecaster": 1500,
+    "analyst": 1500,
+    "advisor": 1500,
+    "assistant": 1000,
+}
+
+_DOC_CACHE_TTL = 30  # seconds
+_DOC_CACHE_SIZE = 32
+_CONTEXT_CACHE_SIZE = 64
+
+_SUMMARY_TMPL = "=== SUMMARY ===\nTotal documents: {total}\nDocument types: {types}\n\n=== DOCUMENTS ==="
+_DOC_TMPL = "\n--- Document {i} ---\nFilename: {filename}\nType: {type}\nDate: {date}\n{confidence}{extracted}"
+
+# Top-level extracted_data fields sent to the LLM per query type (None = everything)
+FIELD_WHITELIST: Dict[str, Optional[tuple]] = {
+    "calculator": ("document_number", "dates", "vendor", "amounts"),
+    "analyst": ("document_number", "dates", "vendor", "customer", "items", "amounts"),
+    "finder": ("document_number", "reference_number", "po_number", "dates", "vendor", "customer", "amounts"),
+    "advisor": ("dates", "vendor", "items", "amounts", "payment"),
+    "auditor": None,  # Needs the full record to spot missing or inconsistent fields
+    "forecaster": ("dates", "vendor", "amounts"),
+}
+DEFAULT_FIELDS = ("document_number", "dates", "vendor", "customer", "items", "amounts", "payment", "notes")
+
+# (document id, processed_at, query_type) -> compact JSON; reprocessing changes the key
+_EXTRACTED_JSON: Dict[tuple, str] = {}
+_EXTRACTED_JSON_SIZE = 1024
+# Shared by the Streamlit script threads, the get_documents worker threads and the loop
+_EXTRACTED_JSON_LOCK = threading.Lock()
+
+
+def _extracted_json(doc: Row, query_type: str) -> str:
+    """Compact JSON of the extracted fields relevant to query_type, encoded once per document version"""
+    key = (doc.id, doc.processed_at, query_type)
+    with _EXTRACTED_JSON_LOCK:
+        text = _EXTRACTED_JSON.get(key)
+    if text is None:
+        data = doc.extracted_data
+        fields = FIELD_WHITELIST.get(query_type, DEFAULT_FIELDS)
+        if fields and isinstance(data, dict):
+            data = {k: data[k] for k in fields if k in data}
+        if ORJSON_AVAILABLE:
+            text = orjson.dumps(data, default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        else:
+            text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+        with _EXTRACTED_JSON_LOCK:
+            if key not in _EXTRACTED_JSON and len(_EXTRACTED_JSON) >= _EXTRACTED_JSON_SIZE:
+                _EXTRACTED_JSON.pop(next(iter(_EXTRACTED_JSON), None), None)
+            _EXTRACTED_JSON[key] = text
+    return text
+
+
+@lru_cache(maxsize=256)
+def _detect_query_type(q: str) -> str:
+    """
+    Query type for an already lower-cased question
     
-    def detect_query_type(self, question: str) -> str:
-        """
-        Detect the type of query to adapt personality
-        
-        Returns:
-            Query type: calculator, analyst, finder, advisor, auditor, forecaster, assistant
-        """
-        q = question.lower()
-        
-        # Calculator
-        if any(w in q for w in ['combien', 'total', 'somme', 'calcul', 'moyenne', 'pourcentage', '%', 'sum', 'calculate', 'average', 'count']):
-            return "calculator"
-        
-        # Comparison
-        if any(w in q for w in ['compar', 'versus', 'vs', 'différence', 'plus grand', 'plus petit', 'meilleur', 'compare', 'difference']):
-            return "analyst"
-        
-        # Search/List
-        if any(w in q for w in ['liste', 'montre', 'affiche', 'tous', 'quels', 'show', 'list', 'display', 'all', 'find', 'search']):
-            return "finder"
-        
-        # Analysis/Insight
-        if any(w in q for w in ['analys', 'tendance', 'insight', 'recommand', 'conseil', 'suggest', 'trend', 'pattern', 'overview']):
-            return "analyst"
-        
-        # Financial Advisory
-        if any(w in q for w in ['budget', 'dépense', 'économ', 'optimis', 'réduire', 'coût', 'spend', 'save', 'cost', 'expensive']):
-            return "advisor"
-        
-        # Audit/Compliance
-        if any(w in q for w in ['manque', 'manquant', 'erreur', 'problème', 'vérif', 'audit', 'missing', 'error', 'check', 'validate', 'issue']):
-            return "auditor"
-        
-        # Forecasting
-        if any(w in q for w in ['prévision', 'futur', 'projection', 'estim', 'forecast', 'predict', 'future', 'will', 'next']):
-            return "forecaster"
-        
-        # Default
+    The type with the most keyword hits wins; ties go to the type listed
+    first in _QUERY_TYPE_KEYWORDS.
+    """
+    hits = Counter(_QUERY_TYPES[match.lastindex - 1] for match in _QUERY_TYPE_RE.finditer(q))
+    if not hits:
         return "assistant"
-    
-    def get_system_prompt(self, query_type: str) -> str:
-        """Get system prompt based on query type"""
-        
-        prompts = {
-            "calculator": """You are a Financial Calculator - precise, clear, and direct.
+    return min(hits, key=lambda query_type: (-hits[query_type], _QUERY_TYPE_PRIORITY[query_type]))
+
+
+_SYSTEM_PROMPTS = {
+    "calculator": """You are a Financial Calculator - precise, clear, and direct.
 
 Your role:
 - Calculate totals, sums, averages, percentages
@@ -155,8 +155,8 @@ Response format:
 - Lead with the answer/number
 - Show brief calculation if needed
 - Keep it short and clear""",
-            
-            "analyst": """You are a Business Analyst - insightful and strategic.
+    
+    "analyst": """You are a Business Analyst - insightful and strategic.
 
 Your role:
 - Analyze patterns and trends
@@ -169,8 +169,8 @@ Response format:
 - Data tables when useful
 - Key insights highlighted
 - Brief recommendations if relevant""",
-            
-            "finder": """You are a Document Finder - organized and efficient.
+    
+    "finder": """You are a Document Finder - organized and efficient.
 
 Your role:
 - List relevant documents clearly
@@ -183,8 +183,8 @@ Response format:
 - Key info for each item
 - Easy to scan
 - No extra commentary""",
-            
-            "advisor": """You are a Financial Advisor - practical and strategic.
+    
+    "advisor": """You are a Financial Advisor - practical and strategic.
 
 Your role:
 - Analyze spending patterns
@@ -197,8 +197,8 @@ Response format:
 - Opportunities identified
 - Specific recommendations
 - Expected benefits""",
-            
-            "auditor": """You are an Auditor - meticulous and thorough.
+    
+    "auditor": """You are an Auditor - meticulous and thorough.
 
 Your role:
 - Check for missing information
@@ -211,8 +211,8 @@ Response format:
 - Details for each issue
 - Severity or impact
 - Recommended corrections""",
-            
-            "forecaster": """You are a Financial Forecaster - analytical and forward-thinking.
+    
+    "forecaster": """You are a Financial Forecaster - analytical and forward-thinking.
 
 Your role:
 - Analyze historical patterns
@@ -225,8 +225,8 @@ Response format:
 - Projection/forecast
 - Key assumptions
 - Confidence level or range""",
-            
-            "assistant": """You are Q.Invoice AI - intelligent, helpful, and adaptive.
+    
+    "assistant": """You are Q.Invoice AI - intelligent, helpful, and adaptive.
 
 Your role:
 - Understand user intent
@@ -238,9 +238,141 @@ Guidelines:
 - Simple question → Simple answer
 - Complex question → Detailed response
 - Always be helpful and clear"""
-        }
+}
+
+
+class AdaptiveQueryEngine:
+    """Adaptive query engine that changes personality based on question type"""
+    
+    def __init__(self, provider: str = "openai"):
+        """Initialize adaptive query engine"""
+        self.provider = provider
         
-        return prompts.get(query_type, prompts["assistant"])
+        if provider == "openai":
+            if not Config.OPENAI_API_KEY:
+                raise ValueError("OPENAI_API_KEY not configured")
+            self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            self.aclient = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
+            self.model = "gpt-4o"
+            
+        elif provider == "anthropic":
+            if not Config.ANTHROPIC_API_KEY:
+                raise ValueError("ANTHROPIC_API_KEY not configured")
+            self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+            self.aclient = AsyncAnthropic(api_key=Config.ANTHROPIC_API_KEY)
+            self.model = "claude-3-5-sonnet-20241022"
+            
+        # (documents_version, ids, type, limit) -> (expires_at, rows); insertion ordered
+        self._doc_cache: Dict[tuple, tuple] = {}
+        self._doc_cache_lock = threading.Lock()
+        # (documents_version, ids, max processed_at, query_type) -> context string
+        self._context_cache: Dict[tuple, str] = {}
+        
+        logger.info(f"Adaptive Query Engine initialized: {provider} / {self.model}")
+    
+    def get_documents(
+        self, 
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Row]:
+        """
+        Retrieve documents from database
+        
+        Returns lightweight rows with only the columns build_context() and
+        query() read (no OCR text), cached briefly per filter and
+        invalidated whenever db_manager.documents_version changes.
+        """
+        key = (db_manager.documents_version, tuple(document_ids or ()), document_type, limit)
+        now = time.monotonic()
+        
+        with self._doc_cache_lock:
+            cached = self._doc_cache.get(key)
+            if cached and cached[0] > now:
+                return cached[1]
+        
+        stmt = select(*_CONTEXT_COLUMNS).where(
+            Document.status == "completed",
+            Document.is_archived == False
+        )
+        
+        if document_ids:
+            stmt = stmt.where(Document.id.in_(document_ids))
+        
+        if document_type:
+            stmt = stmt.where(Document.document_type == document_type)
+        
+        stmt = stmt.order_by(Document.processed_at.desc())
+        
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        with db_manager.session_scope() as session:
+            documents = session.execute(stmt).all()
+        
+        with self._doc_cache_lock:
+            self._doc_cache.pop(key, None)
+            self._doc_cache[key] = (now + _DOC_CACHE_TTL, documents)
+            # Evict oldest entries (including any for stale versions)
+            while len(self._doc_cache) > _DOC_CACHE_SIZE:
+                self._doc_cache.pop(next(iter(self._doc_cache)))
+        
+        return documents
+    
+    def build_context(self, documents: List[Row], query_type: str = "assistant") -> str:
+        """Build context from documents, keeping only the fields query_type needs"""
+        if not documents:
+            return "No documents available."
+        
+        # Same documents (in the same order) at the same version -> same context
+        key = (
+            db_manager.documents_version,
+            tuple(doc.id for doc in documents),
+            max((doc.processed_at for doc in documents if doc.processed_at), default=None),
+            query_type
+        )
+        with self._doc_cache_lock:
+            context = self._context_cache.get(key)
+        if context is None:
+            context = self._render_context(documents, query_type)
+            with self._doc_cache_lock:
+                self._context_cache[key] = context
+                while len(self._context_cache) > _CONTEXT_CACHE_SIZE:
+                    self._context_cache.pop(next(iter(self._context_cache)))
+        return context
+    
+    def _render_context(self, documents: List[Row], query_type: str) -> str:
+        """Format the context string for build_context()"""
+        doc_types = Counter(doc.document_type or "unknown" for doc in documents)
+        
+        summary = _SUMMARY_TMPL.format(
+            total=len(documents),
+            types=", ".join(f"{k}={v}" for k, v in doc_types.items())
+        )
+        return "\n".join(chain((summary,), (
+            _DOC_TMPL.format(
+                i=i,
+                filename=doc.original_filename,
+                type=doc.document_type or "unknown",
+                date=doc.processed_date or "N/A",
+                confidence=f"OCR Confidence: {doc.ocr_pct:.0f}%" if doc.ocr_confidence else "N/A",
+                extracted=f"\n\nExtracted Data:\n{_extracted_json(doc, query_type)}" if doc.extracted_data else ""
+            )
+            for i, doc in enumerate(documents, 1)
+        )))
+    
+    def detect_query_type(self, question: str) -> str:
+        """
+        Detect the type of query to adapt personality
+        
+        Returns:
+            Query type: calculator, analyst, finder, advisor, auditor, forecaster, assistant
+        """
+        return _detect_query_type(question.lower())
+    
+    def get_system_prompt(self, query_type: str) -> str:
+        """Get system prompt based on query type"""
+        return _SYSTEM_PROMPTS.get(query_type, _SYSTEM_PROMPTS["assistant"])
     
     def build_user_prompt(self, question: str, context: str) -> str:
         """Build user prompt"""
@@ -252,38 +384,123 @@ USER QUESTION:
 
 Respond according to your role. Be helpful, clear, and precise. Match your response style to the question - don't add unnecessary sections like "Analysis" or "Recommendations" unless they're relevant to what the user asked."""
     
-    def call_llm(self, system_prompt: str, user_prompt: str) -> str:
-        """Call LLM with adaptive prompts"""
+    def prepare_prompts(
+        self,
+        question: str,
+        documents: List[Row],
+        query_type: Optional[str] = None
+    ) -> Tuple[str, str, str]:
+        """Detect the query type (unless given) and build (query_type, system_prompt, user_prompt)"""
+        # Detect query type
+        if query_type is None:
+            query_type = self.detect_query_type(question)
+        logger.info("Query type detected: {}", query_type)
+        
+        # Build context
+        context = self.build_context(documents, query_type)
+        
+        # Get adaptive prompts
+        return query_type, self.get_system_prompt(query_type), self.build_user_prompt(question, context)
+    
+    def call_llm_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        query_type: str = "assistant",
+        force_refresh: bool = False
+    ) -> Iterator[str]:
+        """Call LLM with adaptive prompts, yielding text as it is generated"""
+        max_tokens = _MAX_TOKENS.get(query_type, _MAX_TOKENS["assistant"])
+        key = llm_cache.make_key(self.provider, self.model, str(max_tokens), system_prompt, user_prompt)
+        if not force_refresh:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                logger.info("LLM cache hit")
+                yield cached
+                return
+        
+        parts = []
+        if self.provider == "openai":
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.2,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    text = chunk.choices[0].delta.content or ""
+                    parts.append(text)
+                    yield text
+        
+        else:  # anthropic
+            combined_prompt = f"{system_prompt}\n\n{user_prompt}"
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=0.2,
+                messages=[{"role": "user", "content": combined_prompt}]
+            ) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    yield text
+        
+        # Only complete answers are cached
+        llm_cache.set(key, "".join(parts))
+    
+    async def acall_llm(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        query_type: str = "assistant",
+        force_refresh: bool = False
+    ) -> str:
+        """Call LLM with adaptive prompts (answers are cached by request content)"""
+        max_tokens = _MAX_TOKENS.get(query_type, _MAX_TOKENS["assistant"])
+        key = llm_cache.make_key(self.provider, self.model, str(max_tokens), system_prompt, user_prompt)
+        if not force_refresh:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                logger.info("LLM cache hit")
+                return cached
         
         if self.provider == "openai":
-            response = self.client.chat.completions.create(
+            response = await self.aclient.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.2,  # Low temperature for consistency
-                max_tokens=2000
+                max_tokens=max_tokens
             )
-            return response.choices[0].message.content or ""
+            answer = response.choices[0].message.content or ""
         
         else:  # anthropic
             # Anthropic doesn't have system messages, so prepend to user message
             combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-            response = self.client.messages.create(
+            response = await self.aclient.messages.create(
                 model=self.model,
-                max_tokens=2000,
+                max_tokens=max_tokens,
                 temperature=0.2,
                 messages=[{"role": "user", "content": combined_prompt}]
             )
-            return response.content[0].text
+            answer = response.content[0].text
+        
+        llm_cache.set(key, answer)
+        return answer
     
-    def query(
+    async def aquery(
         self, 
         question: str,
         document_ids: Optional[List[int]] = None,
         document_type: Optional[str] = None,
-        limit: int = 50
+        limit: int = 50,
+        force_refresh: bool = False
     ) -> Dict[str, Any]:
         """
         Query documents with adaptive personality
@@ -293,6 +510,7 @@ Respond according to your role. Be helpful, clear, and precise. Match your respo
             document_ids: Specific documents to query
             document_type: Filter by document type
             limit: Maximum documents to consider
+            force_refresh: Bypass the LLM answer cache
             
         Returns:
             Dict with answer, query_type, documents, and metadata
@@ -300,8 +518,11 @@ Respond according to your role. Be helpful, clear, and precise. Match your respo
         start_time = time.time()
         
         try:
-            # Get documents
-            documents = self.get_documents(document_ids, document_type, limit)
+            # The blocking SQLite fetch runs on a worker thread (with its own
+            # session scope) so it never stalls the shared event loop; detection
+            # is cached keyword matching and stays inline
+            query_type = self.detect_query_type(question)
+            documents = await asyncio.to_thread(self.get_documents, document_ids, document_type, limit)
             
             if not documents:
                 return {
@@ -312,28 +533,20 @@ Respond according to your role. Be helpful, clear, and precise. Match your respo
                     "error": "no_documents"
                 }
             
-            # Detect query type
-            query_type = self.detect_query_type(question)
-            logger.info(f"Query type detected: {query_type}")
-            
-            # Build context
-            context = self.build_context(documents)
-            
-            # Get adaptive prompts
-            system_prompt = self.get_system_prompt(query_type)
-            user_prompt = self.build_user_prompt(question, context)
+            query_type, system_prompt, user_prompt = self.prepare_prompts(question, documents, query_type)
             
             # Call LLM
-            answer = self.call_llm(system_prompt, user_prompt)
+            answer = await self.acall_llm(system_prompt, user_prompt, query_type, force_refresh)
             
             execution_time = time.time() - start_time
             
-            # Save to history
+            # Save to history (queued, written in batches off the query path)
             self.save_to_history(question, answer, [doc.id for doc in documents], execution_time)
             
+            # Deferred formatting: only interpolated if the record is emitted
             logger.success(
-                f"Query completed: type={query_type}, docs={len(documents)}, "
-                f"time={execution_time:.2f}s"
+                "Query completed: type={}, docs={}, time={:.2f}s",
+                query_type, len(documents), execution_time
             )
             
             return {
@@ -354,24 +567,73 @@ Respond according to your role. Be helpful, clear, and precise. Match your respo
                 "error": str(e)
             }
     
-    def save_to_history(self, query: str, response: str, document_ids: List[int], execution_time: float = 0):
-        """Save query to search history"""
-        session = db_manager.get_session()
+    def query(
+        self, 
+        question: str,
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 50,
+        force_refresh: bool = False
+    ) -> Dict[str, Any]:
+        """Synchronous wrapper around aquery() for Streamlit callers"""
+        # Shared loop: self.aclient's connections belong to the loop that opened them
+        return async_runner.run(self.aquery(question, document_ids, document_type, limit, force_refresh))
+    
+    def query_stream(
+        self, 
+        question: str,
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 50,
+        force_refresh: bool = False
+    ) -> Iterator[str]:
+        """
+        Query documents with adaptive personality, streaming the answer
+        
+        Yields answer text chunks (suitable for st.write_stream); the full
+        answer is saved to history once the stream completes.
+        """
+        start_time = time.time()
         
         try:
-            history_entry = SearchHistory(
-                query=query,
-                response=response,
-                document_ids=document_ids,
-                execution_time=execution_time
+            query_type = self.detect_query_type(question)
+            documents = self.get_documents(document_ids, document_type, limit)
+            
+            if not documents:
+                yield "Aucun document trouvé. Veuillez d'abord uploader et traiter des documents."
+                return
+            
+            query_type, system_prompt, user_prompt = self.prepare_prompts(question, documents, query_type)
+            
+            parts = []
+            for text in self.call_llm_stream(system_prompt, user_prompt, query_type, force_refresh):
+                parts.append(text)
+                yield text
+            
+            execution_time = time.time() - start_time
+            self.save_to_history(question, "".join(parts), [doc.id for doc in documents], execution_time)
+            
+            logger.success(
+                "Streamed query completed: type={}, docs={}, time={:.2f}s",
+                query_type, len(documents), execution_time
             )
-            session.add(history_entry)
-            session.commit()
+            
         except Exception as e:
-            logger.error(f"Failed to save search history: {e}")
-        finally:
-            session.close()
+            logger.error(f"Query failed: {e}")
+            yield f"Erreur lors de l'exécution de la requête: {str(e)}"
+    
+    def query_many(self, questions: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """Answer several questions concurrently; results are in input order"""
+        async def run():
+            return await asyncio.gather(*(self.aquery(q, **kwargs) for q in questions))
+        return async_runner.run(run())
+    
+    def save_to_history(self, query: str, response: str, document_ids: List[int], execution_time: float = 0):
+        """Save query to search history"""
+        history_writer.save(query, response, document_ids, execution_time)
 
 
-# Global instance
-adaptive_query_engine = AdaptiveQueryEngine()
\ No newline at end of file
+@cache
+def get_query_engine(provider: str = "openai") -> AdaptiveQueryEngine:
+    """Shared engine per provider, created on first use (defers LLM client setup)"""
+    return AdaptiveQueryEngine(provider)
\ No newline at end of file
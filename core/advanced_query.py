@@ -2,143 +2,53 @@
 DocuVault - Advanced Query Engine
 Intelligent document search with analytics, calculations, and insights
 """
+import asyncio
+import hashlib
+import io
 import json
+import random
+import threading
 import time
-from typing import List, Dict, Any, Optional
+import weakref
+from collections import Counter
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
-from openai import OpenAI
-from anthropic import Anthropic
+import anthropic
+import openai
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
 from loguru import logger
+from sqlalchemy import func, select, tuple_, update, Select
+from sqlalchemy.engine import Row
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+from core import async_runner, history_writer
 from core.config import Config
+from core.llm_cache import llm_cache
+from core.semantic_cache import semantic_cache
 from storage.database import db_manager, Document, SearchHistory
 
 
-class AdvancedQueryEngine:
-    """Advanced query engine with analytical capabilities"""
-    
-    def __init__(self, provider: str = "openai"):
-        """
-        Initialize advanced query engine
-        
-        Args:
-            provider: "openai" or "anthropic"
-        """
-        self.provider = provider
-        
-        if provider == "openai":
-            if not Config.OPENAI_API_KEY:
-                raise ValueError("OPENAI_API_KEY not configured")
-            self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
-            self.model = "gpt-4o"  # Using GPT-4o for better analysis
-            
-        elif provider == "anthropic":
-            if not Config.ANTHROPIC_API_KEY:
-                raise ValueError("ANTHROPIC_API_KEY not configured")
-            self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
-            self.model = "claude-3-5-sonnet-20241022"
-            
-        logger.info(f"Advanced Query Engine initialized: {provider} / {self.model}")
-    
-    def get_documents(
-        self, 
-        document_ids: Optional[List[int]] = None,
-        document_type: Optional[str] = None,
-        limit: Optional[int] = None
-    ) -> List[Document]:
-        """
-        Retrieve documents from database
-        
-        Args:
-            document_ids: Specific document IDs to retrieve
-            document_type: Filter by document type
-            limit: Maximum number of documents
-            
-        Returns:
-            List of Document records
-        """
-        session = db_manager.get_session()
-        
-        try:
-            query = session.query(Document).filter(
-                Document.status == "completed",
-                Document.is_archived == False
-            )
-            
-            if document_ids:
-                query = query.filter(Document.id.in_(document_ids))
-            
-            if document_type:
-                query = query.filter(Document.document_type == document_type)
-            
-            query = query.order_by(Document.processed_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            return query.all()
-            
-        finally:
-            session.close()
-    
-    def build_advanced_context(self, documents: List[Document]) -> str:
-        """
-        Build enriched context from documents for advanced analysis
-        
-        Args:
-            documents: List of Document records
-            
-        Returns:
-            Formatted context string with analytical metadata
-        """
-        if not documents:
-            return "No documents available."
-        
-        context_parts = []
-        
-        # Summary statistics
-        context_parts.append("=== DOCUMENT SUMMARY ===")
-        context_parts.append(f"Total documents: {len(documents)}")
-        
-        doc_types = {}
-        for doc in documents:
-            doc_type = doc.document_type or "unknown"
-            doc_types[doc_type] = doc_types.get(doc_type, 0) + 1
-        
-        context_parts.append(f"Document types: {json.dumps(doc_types)}")
-        context_parts.append("")
-        
-        # Individual documents with full data
-        context_parts.append("=== DOCUMENTS DATA ===")
-        
-        for i, doc in enumerate(documents, 1):
-            context_parts.append(f"\n[DOCUMENT {i}]")
-            context_parts.append(f"ID: {doc.id}")
-            context_parts.append(f"Filename: {doc.original_filename}")
-            context_parts.append(f"Type: {doc.document_type}")
-            context_parts.append(f"Processed: {doc.processed_at}")
-            context_parts.append(f"OCR Confidence: {doc.ocr_confidence:.2%}" if doc.ocr_confidence else "OCR Confidence: N/A")
-            
-            if doc.extracted_data:
-                context_parts.append(f"\nExtracted Data:")
-                context_parts.append(json.dumps(doc.extracted_data, indent=2, ensure_ascii=False))
-            
-            context_parts.append("")
-        
-        return "\n".join(context_parts)
-    
-    def build_advanced_prompt(self, question: str, context: str) -> str:
-        """
-        Build advanced analysis prompt
-        
-        Args:
-            question: User's question
-            context: Document context
-            
-        Returns:
-            Formatted prompt for advanced analysis
-        """
-        prompt = f"""You are DocuVault AI Assistant, an intelligent financial document analyst with advanced capabilities.
+MAX_TOKENS = 3000  # More tokens for detailed analysis
+PROMPT_VERSION = "4"  # Bump when prompts change so cached answers are not reused
+
+# Static role, capabilities, data reference and examples: sent first and
+# byte-identical on every request so OpenAI/Anthropic prompt caching can reuse
+# the prefix. Both providers only cache prefixes of at least 1024 tokens, so the
+# reference sections keep even SYSTEM_PROMPT_MINI above that minimum
+SYSTEM_PROMPT = """You are DocuVault AI Assistant, an intelligent financial document analyst with advanced capabilities.
 
 Your role is to:
 1. **Analyze documents thoroughly** - Extract insights, patterns, and trends
@@ -168,6 +78,60 @@ INSTRUCTIONS:
 7. **Make recommendations** - Suggest actions based on the data
 8. **Be proactive** - Anticipate related questions
 
+DOCUMENT CONTEXT FORMAT:
+The user message starts with a DOCUMENT SUMMARY (total document count and a count per document type) followed by DOCUMENTS DATA, newest first. Each document block reads:
+- [DOCUMENT n] - position in the list, used only to refer to the block
+- ID - DocuVault database id; cite it when the user may want to open the document
+- Filename - original upload name
+- Type - document type detected at extraction
+- Processed - when OCR and extraction ran
+- OCR Confidence - average OCR confidence; below 80% treat figures as uncertain and mention it
+- Extracted Data - the structured JSON described below
+When the context is large, the oldest documents may be listed on one line each under "MORE DOCUMENTS (data omitted to fit the context budget)". Their data was NOT provided: count them, but never invent their amounts, and say that totals cover only the documents whose data is shown.
+
+EXTRACTED DATA FIELDS (every field may be null or missing):
+- document_type: invoice, receipt, quote, estimate, purchase_order, delivery_note, credit_note, statement, contract, lease, bill or unknown
+- document_number, reference_number, po_number: identifiers as printed on the document
+- dates: issue_date, due_date, delivery_date, payment_date (YYYY-MM-DD when it could be parsed, otherwise as printed)
+- vendor / customer: name, email, phone, tax_id and address (street, city, state, postal_code, country); the vendor is the seller, the customer the buyer
+- items: line items with description, quantity, unit_price, amount, tax and discount
+- amounts: subtotal, tax, discount, shipping, total, paid, due and currency (ISO code such as EUR or USD)
+- payment: method (cash, card, transfer...), card_last_four, transaction_id, bank_account
+- notes, terms: free text such as payment terms or penalties
+- confidence_score: extraction confidence between 0 and 1
+Amounts are strings in the document's own format: "1,500.00", "1 500,00" and "1500" are all numbers, so normalise the decimal and thousands separators before calculating.
+
+DOCUMENT TYPES:
+- invoice / bill (facture): an amount owed to the vendor; counts as spending
+- receipt (reçu, ticket): proof of a payment already made; counts as spending
+- credit_note (avoir): a refund or correction that cancels part of an earlier invoice
+- quote / estimate (devis): a proposed price, not yet owed
+- purchase_order (bon de commande): an order sent to the vendor, usually followed by an invoice with the same po_number
+- delivery_note (bon de livraison): goods delivered; may carry no amounts at all
+- statement (relevé): a summary of several operations; do not add it to the invoices it lists
+- contract / lease (contrat, bail): recurring commitments; read terms and notes for the period and renewal
+- unknown: the type could not be detected; use the fields that are present and say the type is uncertain
+
+CALCULATION RULES:
+1. Use amounts.total for totals; fall back to subtotal + tax - discount + shipping, then to the sum of item amounts, and say which fallback you used
+2. Subtotal is before tax (HT), total includes tax (TTC); never add a tax figure to a total that already includes it
+3. Never add amounts in different currencies together: give one total per currency
+4. Credit notes (credit_note) reduce spending: subtract them from the vendor's total
+5. Quotes, estimates and purchase orders are commitments, not spending: report them separately from invoices, receipts and bills
+6. A document is overdue when due_date is in the past and amounts.due is non-zero or no payment_date is set
+7. Two documents with the same vendor and document_number are probably duplicates: count them once and flag them
+8. Round money to two decimals and percentages to one; state the number of documents behind every total or average
+9. When a period is asked for, use issue_date, falling back to the Processed date, and say so
+10. If the data cannot answer the question, say exactly what is missing instead of guessing
+
+RESPONSE FORMAT:
+- Answer in the language of the question (most users write in French)
+- Lead with the direct answer, then the supporting detail
+- Use a markdown table for rankings and comparisons of three or more rows, bullet points otherwise
+- Format money with its currency symbol or code, e.g. 1,500.00€ or 1,500.00 USD
+- Mark insights with 💡, warnings with ⚠️ and overall analyses with 📊
+- Keep answers focused: a few short sections, not every field of every document
+
 EXAMPLES OF GOOD RESPONSES:
 
 Question: "Combien j'ai dépensé en total ?"
@@ -214,34 +178,342 @@ Tendances:
 1. Régulariser le paiement TechCorp rapidement
 2. Ajouter les numéros PO manquants
 3. Considérer un contrat annuel avec TechCorp pour réduire les coûts"
+"""
 
-AVAILABLE DOCUMENTS CONTEXT:
+# Small document sets: same instructions and reference without the worked
+# examples, which would otherwise dwarf the context
+SYSTEM_PROMPT_MINI = SYSTEM_PROMPT[:SYSTEM_PROMPT.index("EXAMPLES OF GOOD RESPONSES:")].rstrip() + "\n"
+MINI_PROMPT_MAX_DOCUMENTS = 2
+
+_PROMPT_CACHE_KEYS = {
+    prompt: hashlib.md5(prompt.encode()).hexdigest()[:8]
+    for prompt in (SYSTEM_PROMPT, SYSTEM_PROMPT_MINI)
+}
+
+
+def system_prompt_for(num_documents: int) -> str:
+    """System prompt sized to the number of documents in the context"""
+    return SYSTEM_PROMPT_MINI if num_documents <= MINI_PROMPT_MAX_DOCUMENTS else SYSTEM_PROMPT
+
+# User turn: the only per-request part of the prompt
+_PROMPT_TMPL = """AVAILABLE DOCUMENTS CONTEXT:
 {context}
 
 USER QUESTION:
 {question}
 
 Provide a comprehensive, analytical, and helpful response. Don't just list facts - analyze, calculate, aggregate, and recommend!"""
+
+# Columns read by build_advanced_context() and query(); ocr_text is left out
+_CONTEXT_COLUMNS = (
+    Document.id,
+    Document.original_filename,
+    Document.document_type,
+    Document.processed_at,
+    Document.ocr_confidence,
+    Document.extracted_data,
+)
+
+
+@lru_cache(maxsize=None)
+def _encoder(model: str):
+    """
+    tiktoken encoding for model (o200k_base for models tiktoken does not know)
+    
+    None when no encoding can be loaded (e.g. its BPE file cannot be
+    downloaded), in which case counts fall back to the estimate.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except ValueError:
+            # tiktoken < 0.7 predates o200k_base; close enough for budgeting
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Token count of text for model; ~4 characters per token without tiktoken"""
+    encoder = _encoder(model) if TIKTOKEN_AVAILABLE else None
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+
+def _dumps_indented(data: Any) -> str:
+    """JSON with 2-space indentation (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+class RateLimiter:
+    """Token bucket over requests and tokens per minute, shared by all event loops"""
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self, tokens: int) -> float:
+        """Take capacity for one request, or return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+            
+            tokens = min(tokens, self.tokens_per_minute)
+            if self._requests >= 1 and self._tokens >= tokens:
+                self._requests -= 1
+                self._tokens -= tokens
+                return 0.0
+            
+            return max(
+                (1 - self._requests) * 60 / self.requests_per_minute,
+                (tokens - self._tokens) * 60 / self.tokens_per_minute
+            )
+    
+    async def acquire(self, tokens: int):
+        """Wait until a request of the given token cost fits in the budget"""
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+    
+    def wait(self, tokens: int):
+        """Blocking acquire() for synchronous (streaming) callers"""
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+class AdvancedQueryEngine:
+    """Advanced query engine with analytical capabilities"""
+    
+    def __init__(self, provider: str = "openai"):
+        """
+        Initialize advanced query engine
+        
+        Args:
+            provider: "openai" or "anthropic"
+        """
+        self.provider = provider
+        
+        if provider == "openai":
+            if not Config.OPENAI_API_KEY:
+                raise ValueError("OPENAI_API_KEY not configured")
+            # Retries are handled by _create() so they respect the shared rate limit
+            self.client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, max_retries=0)
+            self.sync_client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            self.model = "gpt-4o"  # Using GPT-4o for better analysis
+            
+        elif provider == "anthropic":
+            if not Config.ANTHROPIC_API_KEY:
+                raise ValueError("ANTHROPIC_API_KEY not configured")
+            self.client = AsyncAnthropic(api_key=Config.ANTHROPIC_API_KEY, max_retries=0)
+            self.sync_client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+            self.model = "claude-3-5-sonnet-20241022"
         
-        return prompt
+        self.rate_limiter = RateLimiter(Config.LLM_REQUESTS_PER_MINUTE, Config.LLM_TOKENS_PER_MINUTE)
+        # One semaphore per event loop (asyncio primitives cannot cross loops)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        # Batch API answers are written back by a background poller while any are queued
+        self._poller: Optional[threading.Thread] = None
+        self._poller_lock = threading.Lock()
+        if provider == "openai":
+            self.start_batch_poller()  # Picks up batches queued by a previous run
+            
+        logger.info(f"Advanced Query Engine initialized: {provider} / {self.model}")
     
-    def call_llm(self, prompt: str) -> str:
+    def _documents_stmt(
+        self,
+        document_ids: Optional[List[int]],
+        document_type: Optional[str],
+        limit: Optional[int]
+    ) -> Select:
+        """Context columns of the completed documents matching the filters, newest first"""
+        stmt = select(*_CONTEXT_COLUMNS).where(
+            Document.status == "completed",
+            Document.is_archived == False
+        )
+        
+        if document_ids:
+            stmt = stmt.where(Document.id.in_(document_ids))
+        
+        if document_type:
+            stmt = stmt.where(Document.document_type == document_type)
+        
+        stmt = stmt.order_by(Document.processed_at.desc())
+        
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        return stmt
+    
+    def get_documents(
+        self, 
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Row]:
         """
-        Call LLM for advanced query
+        Retrieve documents from database
         
         Args:
-            prompt: Query prompt
+            document_ids: Specific document IDs to retrieve
+            document_type: Filter by document type
+            limit: Maximum number of documents
             
         Returns:
-            LLM response
+            Lightweight rows with the context columns (no OCR text)
+        """
+        with db_manager.session_scope() as session:
+            return session.execute(self._documents_stmt(document_ids, document_type, limit)).all()
+    
+    def get_type_counts(
+        self, 
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Count the documents get_documents() returns per type, in SQL
+        
+        Args:
+            document_ids: Specific document IDs to retrieve
+            document_type: Filter by document type
+            limit: Maximum number of documents
+            
+        Returns:
+            Dict of document type ("unknown" when unset) to count
+        """
+        docs = self._documents_stmt(document_ids, document_type, limit).subquery()
+        doc_type = func.coalesce(func.nullif(docs.c.document_type, ""), "unknown")
+        stmt = select(doc_type, func.count()).group_by(doc_type).order_by(func.count().desc(), doc_type)
+        
+        with db_manager.session_scope() as session:
+            return dict(session.execute(stmt).all())
+    
+    def build_advanced_context(self, documents: List[Row], type_counts: Optional[Dict[str, int]] = None) -> str:
+        """
+        Build enriched context from documents for advanced analysis
+        
+        Args:
+            documents: Rows from get_documents()
+            type_counts: Precomputed get_type_counts() for the same documents
+            
+        Returns:
+            Formatted context string with analytical metadata
+        """
+        if not documents:
+            return "No documents available."
+        
+        buf = io.StringIO()
+        w = buf.write
+        
+        # Summary statistics
+        w("=== DOCUMENT SUMMARY ===\n")
+        w(f"Total documents: {len(documents)}\n")
+        
+        if type_counts is None:
+            type_counts = dict(Counter(doc.document_type or "unknown" for doc in documents))
+        
+        w(f"Document types: {json.dumps(type_counts)}\n\n")
+        
+        # Individual documents with full data
+        w("=== DOCUMENTS DATA ===\n")
+        
+        # Documents come newest first; once the token budget is spent the
+        # remaining ones are listed on one line each without their data
+        budget = Config.LLM_CONTEXT_TOKEN_BUDGET
+        omitted = 0
+        
+        for i, doc in enumerate(documents, 1):
+            if omitted:
+                w(f"[DOCUMENT {i}] ID: {doc.id} | {doc.original_filename} | {doc.document_type} | {doc.processed_at}\n")
+                omitted += 1
+                continue
+            
+            block = "".join((
+                "\n" if i > 1 else "",
+                f"\n[DOCUMENT {i}]\n",
+                f"ID: {doc.id}\n",
+                f"Filename: {doc.original_filename}\n",
+                f"Type: {doc.document_type}\n",
+                f"Processed: {doc.processed_at}\n",
+                f"OCR Confidence: {doc.ocr_confidence:.2%}\n" if doc.ocr_confidence else "OCR Confidence: N/A\n",
+                f"\nExtracted Data:\n{_dumps_indented(doc.extracted_data)}\n" if doc.extracted_data else ""
+            ))
+            
+            budget -= count_tokens(block, self.model)
+            if budget < 0 and i > 1:
+                w(f"\n=== {len(documents) - i + 1} MORE DOCUMENTS (data omitted to fit the context budget) ===\n")
+                w(f"[DOCUMENT {i}] ID: {doc.id} | {doc.original_filename} | {doc.document_type} | {doc.processed_at}\n")
+                omitted = 1
+                continue
+            
+            w(block)
+        
+        if omitted:
+            logger.info(f"Advanced context: data omitted for {omitted}/{len(documents)} documents")
+        
+        return buf.getvalue()
+    
+    def build_advanced_prompt(self, question: str, context: str) -> str:
         """
+        Build advanced analysis prompt (user turn)
+        
+        The static instructions live in SYSTEM_PROMPT so the provider can
+        cache them as a shared prefix; only the context and question vary.
+        
+        Args:
+            question: User's question
+            context: Document context
+            
+        Returns:
+            Formatted prompt for advanced analysis
+        """
+        return _PROMPT_TMPL.format_map({"context": context, "question": question})
+    
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Concurrency limit for the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(Config.LLM_MAX_CONCURRENCY)
+        return semaphore
+    
+    async def _create(self, prompt: str, system_prompt: str) -> str:
+        """Send one completion request"""
         if self.provider == "openai":
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are DocuVault AI Assistant, an intelligent document analyst. You provide detailed analysis, calculations, insights, and recommendations - not just literal answers."
+                        "content": system_prompt
                     },
                     {
                         "role": "user",
@@ -249,15 +521,17 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
                     }
                 ],
                 temperature=0.3,  # Slightly higher for more natural responses
-                max_tokens=3000   # More tokens for detailed analysis
+                max_tokens=MAX_TOKENS,
+                extra_body={"prompt_cache_key": _PROMPT_CACHE_KEYS.get(system_prompt)}
             )
             return response.choices[0].message.content or ""
         
         else:  # anthropic
-            response = self.client.messages.create(
+            response = await self.client.messages.create(
                 model=self.model,
-                max_tokens=3000,
+                max_tokens=MAX_TOKENS,
                 temperature=0.3,
+                system=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
                 messages=[
                     {
                         "role": "user",
@@ -267,7 +541,93 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
             )
             return response.content[0].text
     
-    def query(
+    async def acall_llm(self, prompt: str, system_prompt: str = SYSTEM_PROMPT) -> str:
+        """
+        Call LLM for advanced query
+        
+        Requests are bounded by Config.LLM_MAX_CONCURRENCY and the shared
+        rate limiter, and retried with exponential backoff on rate limits
+        and server errors.
+        
+        Args:
+            prompt: Query prompt
+            system_prompt: Static instructions (see system_prompt_for())
+            
+        Returns:
+            LLM response
+        """
+        # Rough budget: ~4 characters per prompt token plus the full completion
+        tokens = (len(system_prompt) + len(prompt)) // 4 + MAX_TOKENS
+        
+        async with self._semaphore():
+            for attempt in range(1, Config.LLM_MAX_ATTEMPTS + 1):
+                await self.rate_limiter.acquire(tokens)
+                try:
+                    return await self._create(prompt, system_prompt)
+                except Exception as e:
+                    if attempt == Config.LLM_MAX_ATTEMPTS or not _is_retryable(e):
+                        raise
+                    delay = min(2 ** attempt, 60) * (0.5 + random.random() / 2)
+                    logger.warning(f"LLM request failed ({e}), retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+    
+    def call_llm(self, prompt: str, system_prompt: str = SYSTEM_PROMPT) -> str:
+        """Synchronous wrapper around acall_llm() (on the shared loop, where self.client's connections live)"""
+        return async_runner.run(self.acall_llm(prompt, system_prompt))
+    
+    def stream_llm(self, prompt: str, system_prompt: str = SYSTEM_PROMPT) -> Iterator[str]:
+        """
+        Call LLM for advanced query, yielding text as it is generated
+        
+        Args:
+            prompt: Query prompt
+            system_prompt: Static instructions (see system_prompt_for())
+            
+        Yields:
+            Answer text chunks
+        """
+        self.rate_limiter.wait((len(system_prompt) + len(prompt)) // 4 + MAX_TOKENS)
+        
+        if self.provider == "openai":
+            stream = self.sync_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=MAX_TOKENS,
+                extra_body={"prompt_cache_key": _PROMPT_CACHE_KEYS.get(system_prompt)},
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        
+        else:  # anthropic
+            with self.sync_client.messages.stream(
+                model=self.model,
+                max_tokens=MAX_TOKENS,
+                temperature=0.3,
+                system=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                yield from stream.text_stream
+    
+    def _cache_keys(self, question: str, documents: List[Row]) -> Tuple[str, str]:
+        """
+        Answer cache keys: (context key, exact question key)
+        
+        The context key covers the prompt version, model and exact document
+        set; reprocessing a document changes its processed_at, and so the keys.
+        """
+        context_key = llm_cache.make_key(
+            "advanced", PROMPT_VERSION, self.provider, self.model,
+            json.dumps(sorted((doc.id, str(doc.processed_at)) for doc in documents))
+        )
+        return context_key, llm_cache.make_key(context_key, " ".join(question.lower().split()))
+    
+    async def aquery(
         self, 
         question: str,
         document_ids: Optional[List[int]] = None,
@@ -289,8 +649,9 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
         start_time = time.time()
         
         try:
-            # Get relevant documents
-            documents = self.get_documents(document_ids, document_type, limit)
+            # Get relevant documents (blocking SQLite work runs on a worker
+            # thread, keeping the shared event loop free for other queries)
+            documents = await asyncio.to_thread(self.get_documents, document_ids, document_type, limit)
             
             if not documents:
                 return {
@@ -300,15 +661,35 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
                     "error": "no_documents"
                 }
             
-            # Build enriched context
-            context = self.build_advanced_context(documents)
+            context_key, cache_key = self._cache_keys(question, documents)
+            answer = llm_cache.get(cache_key)
+            if answer is not None:
+                logger.info("LLM cache hit")
             
-            # Build advanced prompt
-            prompt = self.build_advanced_prompt(question, context)
+            # Exact miss: look for a re-phrasing of an earlier question on the same documents
+            embedding = None
+            if answer is None and semantic_cache.enabled:
+                embedding = await semantic_cache.aembed(question)
+                if embedding is not None:
+                    answer = semantic_cache.get(context_key, embedding)
+                    if answer is not None:
+                        logger.info("Semantic cache hit")
+                        llm_cache.set(cache_key, answer)
             
-            # Call LLM for analysis
-            logger.info(f"Analyzing {len(documents)} documents: '{question}'")
-            answer = self.call_llm(prompt)
+            if answer is None:
+                # Build enriched context
+                type_counts = await asyncio.to_thread(self.get_type_counts, document_ids, document_type, limit)
+                context = self.build_advanced_context(documents, type_counts)
+                
+                # Build advanced prompt
+                prompt = self.build_advanced_prompt(question, context)
+                
+                # Call LLM for analysis
+                logger.info(f"Analyzing {len(documents)} documents: '{question}'")
+                answer = await self.acall_llm(prompt, system_prompt_for(len(documents)))
+                llm_cache.set(cache_key, answer)
+                if embedding is not None:
+                    semantic_cache.set(context_key, embedding, answer)
             
             execution_time = time.time() - start_time
             
@@ -345,6 +726,256 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
                 "error": str(e)
             }
     
+    def query(
+        self, 
+        question: str,
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """Synchronous wrapper around aquery() (on the shared loop, where self.client's connections live)"""
+        return async_runner.run(self.aquery(question, document_ids, document_type, limit))
+    
+    def query_stream(
+        self, 
+        question: str,
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 50
+    ) -> Iterator[str]:
+        """
+        Query documents with advanced analytical capabilities, streaming the answer
+        
+        Yields answer text chunks (suitable for st.write_stream); the full
+        answer is cached and saved to history once the stream completes.
+        """
+        start_time = time.time()
+        
+        try:
+            documents = self.get_documents(document_ids, document_type, limit)
+            
+            if not documents:
+                yield "Aucun document trouvé. Veuillez d'abord uploader et traiter des documents."
+                return
+            
+            context_key, cache_key = self._cache_keys(question, documents)
+            answer = llm_cache.get(cache_key)
+            if answer is not None:
+                logger.info("LLM cache hit")
+            
+            # Same semantic fallback as aquery(); the embedding call runs on the shared loop
+            embedding = None
+            if answer is None and semantic_cache.enabled:
+                embedding = async_runner.run(semantic_cache.aembed(question))
+                if embedding is not None:
+                    answer = semantic_cache.get(context_key, embedding)
+                    if answer is not None:
+                        logger.info("Semantic cache hit")
+                        llm_cache.set(cache_key, answer)
+            
+            if answer is not None:
+                yield answer
+            else:
+                type_counts = self.get_type_counts(document_ids, document_type, limit)
+                prompt = self.build_advanced_prompt(question, self.build_advanced_context(documents, type_counts))
+                
+                logger.info(f"Analyzing {len(documents)} documents: '{question}'")
+                parts = []
+                for text in self.stream_llm(prompt, system_prompt_for(len(documents))):
+                    parts.append(text)
+                    yield text
+                
+                # Only complete answers are cached
+                answer = "".join(parts)
+                llm_cache.set(cache_key, answer)
+                if embedding is not None:
+                    semantic_cache.set(context_key, embedding, answer)
+            
+            execution_time = time.time() - start_time
+            self._save_to_history(question, answer, [doc.id for doc in documents], execution_time)
+            
+            logger.success(f"Streamed query completed in {execution_time:.2f}s")
+            
+        except Exception as e:
+            logger.error(f"Query failed: {e}")
+            yield f"Erreur lors du traitement de la requête: {str(e)}"
+    
+    def query_many(self, questions: List[str], **kwargs) -> List[Dict[str, Any]]:
+        """
+        Answer several questions concurrently
+        
+        Args:
+            questions: User questions
+            **kwargs: Filters passed to aquery() for every question
+            
+        Returns:
+            One query() result per question, in input order
+        """
+        async def run():
+            return await asyncio.gather(*(self.aquery(q, **kwargs) for q in questions))
+        return async_runner.run(run())
+    
+    def submit_batch(
+        self,
+        questions: List[str],
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 50
+    ) -> str:
+        """
+        Queue questions on the OpenAI Batch API (half price, answered within 24h)
+        
+        Each question gets a SearchHistory row with status "queued"; the
+        batch poller fills in the answers as the batch completes.
+        
+        Args:
+            questions: User questions, all asked over the same documents
+            document_ids: Specific documents to query
+            document_type: Filter by document type
+            limit: Maximum documents to consider
+            
+        Returns:
+            OpenAI batch ID
+        """
+        if self.provider != "openai":
+            raise ValueError("Batch queries require the OpenAI provider")
+        
+        documents = self.get_documents(document_ids, document_type, limit)
+        if not documents:
+            raise ValueError("No completed documents found to query")
+        
+        type_counts = self.get_type_counts(document_ids, document_type, limit)
+        context = self.build_advanced_context(documents, type_counts)
+        used_ids = [doc.id for doc in documents]
+        
+        with db_manager.session_scope() as session:
+            entries = [
+                SearchHistory(query=question, document_ids=used_ids, status="queued")
+                for question in questions
+            ]
+            session.add_all(entries)
+            session.flush()
+            
+            # custom_id is the history row the answer belongs to
+            lines = io.BytesIO()
+            for entry in entries:
+                lines.write(json.dumps({
+                    "custom_id": str(entry.id),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.model,
+                        "messages": [
+                            {"role": "system", "content": system_prompt_for(len(documents))},
+                            {"role": "user", "content": self.build_advanced_prompt(entry.query, context)}
+                        ],
+                        "temperature": 0.3,
+                        "max_tokens": MAX_TOKENS
+                    }
+                }, ensure_ascii=False).encode("utf-8") + b"\n")
+            
+            batch_file = self.sync_client.files.create(file=("batch.jsonl", lines.getvalue()), purpose="batch")
+            batch = self.sync_client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            for entry in entries:
+                entry.batch_id = batch.id
+        
+        logger.info(f"Submitted batch {batch.id}: {len(questions)} questions over {len(documents)} documents")
+        self.start_batch_poller()
+        
+        return batch.id
+    
+    def poll_batches(self) -> int:
+        """
+        Write back the answers of finished batches
+        
+        Returns:
+            Number of history entries answered
+        """
+        with db_manager.session_scope() as session:
+            batch_ids = session.execute(
+                select(SearchHistory.batch_id).where(SearchHistory.status == "queued").distinct()
+            ).scalars().all()
+        
+        answered = 0
+        for batch_id in batch_ids:
+            try:
+                batch = self.sync_client.batches.retrieve(batch_id)
+            except Exception as e:
+                logger.warning(f"Failed to retrieve batch {batch_id}: {e}")
+                continue
+            
+            if batch.status in ("failed", "expired", "cancelled"):
+                logger.error(f"Batch {batch_id} {batch.status}")
+                with db_manager.session_scope() as session:
+                    session.execute(
+                        update(SearchHistory)
+                        .where(SearchHistory.batch_id == batch_id, SearchHistory.status == "queued")
+                        .values(status="failed")
+                    )
+                continue
+            
+            if batch.status != "completed":
+                continue
+            
+            answers = {}
+            if batch.output_file_id:
+                for line in self.sync_client.files.content(batch.output_file_id).text.splitlines():
+                    result = json.loads(line)
+                    body = (result.get("response") or {}).get("body") or {}
+                    if body.get("choices"):
+                        answers[int(result["custom_id"])] = body["choices"][0]["message"]["content"] or ""
+            
+            with db_manager.session_scope() as session:
+                entries = session.query(SearchHistory).filter(
+                    SearchHistory.batch_id == batch_id,
+                    SearchHistory.status == "queued"
+                )
+                for entry in entries:
+                    if entry.id in answers:
+                        entry.response = answers[entry.id]
+                        entry.status = "completed"
+                        answered += 1
+                    else:
+                        entry.status = "failed"
+            
+            logger.success(f"Batch {batch_id} completed: {len(answers)} answers")
+        
+        return answered
+    
+    def _queued_batch_count(self) -> int:
+        """Search history entries still waiting for a batch answer"""
+        with db_manager.session_scope() as session:
+            return session.execute(
+                select(func.count(SearchHistory.id)).where(SearchHistory.status == "queued")
+            ).scalar_one()
+    
+    def start_batch_poller(self):
+        """Run poll_batches() every BATCH_POLL_INTERVAL seconds until nothing is queued"""
+        with self._poller_lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll_until_done, name="batch-poller", daemon=True)
+                self._poller.start()
+    
+    def _poll_until_done(self):
+        """Poller thread body; exits (and can be restarted) once no entry is queued"""
+        while True:
+            try:
+                with self._poller_lock:
+                    # Checked under the lock so a concurrent submit_batch either
+                    # sees this poller running or starts a new one
+                    if not self._queued_batch_count():
+                        self._poller = None
+                        return
+                time.sleep(Config.BATCH_POLL_INTERVAL)
+                self.poll_batches()
+            except Exception as e:
+                logger.error(f"Batch polling failed: {e}")
+                time.sleep(Config.BATCH_POLL_INTERVAL)
+    
     def _save_to_history(
         self, 
         query: str, 
@@ -352,40 +983,52 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
         document_ids: List[int],
         execution_time: float
     ):
-        """Save query to search history"""
-        session = db_manager.get_session()
-        
-        try:
-            history = SearchHistory(
-                query=query,
-                response=response,
-                document_ids=document_ids,
-                execution_time=execution_time
-            )
-            session.add(history)
-            session.commit()
-        except Exception as e:
-            logger.warning(f"Failed to save search history: {e}")
-        finally:
-            session.close()
+        """Save query to search history (queued, written in batches off the query path)"""
+        history_writer.save(query, response, document_ids, execution_time)
     
-    def get_search_history(self, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_search_history(
+        self,
+        limit: int = 20,
+        before: Optional[Tuple[Union[datetime, str], int]] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Get recent search history
+        Get recent search history, newest first
+        
+        Pages are keyset-based: pass the (created_at, id) of the last record
+        of the previous page as `before` to get the next one, which is an
+        index seek however deep the page is.
         
         Args:
             limit: Maximum number of records
+            before: Cursor from the previous page (created_at as returned,
+                    ISO text, or a datetime), or None for the first page
             
         Returns:
             List of search history records
         """
-        session = db_manager.get_session()
+        stmt = select(
+            SearchHistory.id,
+            SearchHistory.query,
+            SearchHistory.response,
+            SearchHistory.document_ids,
+            SearchHistory.created_at,
+            SearchHistory.execution_time
+        )
         
-        try:
-            history = session.query(SearchHistory)\
-                .order_by(SearchHistory.created_at.desc())\
-                .limit(limit)\
-                .all()
+        if before:
+            created_at, last_id = before
+            if isinstance(created_at, str):
+                # Records carry ISO text; bind a datetime so SQLite compares
+                # it in the stored format rather than as 'T'-separated text
+                created_at = datetime.fromisoformat(created_at)
+            stmt = stmt.where(
+                tuple_(SearchHistory.created_at, SearchHistory.id) < tuple_(created_at, last_id)
+            )
+        
+        stmt = stmt.order_by(SearchHistory.created_at.desc(), SearchHistory.id.desc())
+        
+        with db_manager.session_scope() as session:
+            rows = session.execute(stmt.limit(limit)).all()
             
             return [
                 {
@@ -396,19 +1039,31 @@ Provide a comprehensive, analytical, and helpful response. Don't just list facts
                     "created_at": h.created_at.isoformat(),
                     "execution_time": h.execution_time
                 }
-                for h in history
+                for h in rows
             ]
-        finally:
-            session.close()
 
 
-# Global advanced query engine
-try:
-    advanced_query_engine = AdvancedQueryEngine(provider="openai")
-except Exception as e:
-    logger.warning(f"Failed to initialize OpenAI query engine: {e}")
-    try:
-        advanced_query_engine = AdvancedQueryEngine(provider="anthropic")
-    except Exception as e2:
-        logger.error(f"Failed to initialize any query engine: {e2}")
-        advanced_query_engine = None
\ No newline at end of file
+# provider -> engine; only successful constructions are kept, so a failed
+# setup (e.g. missing API key) is retried on the next call
+_query_engines: Dict[str, AdvancedQueryEngine] = {}
+_query_engines_lock = threading.Lock()
+
+
+def get_query_engine(provider: str = "openai") -> Optional[AdvancedQueryEngine]:
+    """Shared engine, created on first use; falls back to the other provider if unavailable"""
+    fallback = "anthropic" if provider == "openai" else "openai"
+    with _query_engines_lock:
+        engine = _query_engines.get(provider)
+        if engine is not None:
+            return engine
+        try:
+            engine = AdvancedQueryEngine(provider=provider)
+        except Exception as e:
+            logger.warning(f"Failed to initialize {provider} query engine: {e}")
+            try:
+                engine = AdvancedQueryEngine(provider=fallback)
+            except Exception as e2:
+                logger.error(f"Failed to initialize any query engine: {e2}")
+                return None
+        _query_engines[provider] = engine
+        return engine
@@ -3,6 +3,7 @@ DocuVault - Configuration Module
 Centralized configuration management
 """
 import os
+import sys
 from pathlib import Path
 from typing import Optional
 from dotenv import load_dotenv
@@ -24,39 +25,78 @@ class Config:
     UPLOADS_DIR = STORAGE_DIR / "uploads"
     EXPORTS_DIR = STORAGE_DIR / "exports"
     CACHE_DIR = STORAGE_DIR / "cache"
+    LOGS_DIR = BASE_DIR / "logs"
     DB_PATH = STORAGE_DIR / "docuvault.db"
+    # Transient PDF page images: tmpfs (RAM) when available, no disk I/O
+    OCR_SCRATCH_DIR = Path("/dev/shm/docuvault") if Path("/dev/shm").is_dir() else CACHE_DIR / "pdf_pages"
     
     # API Keys
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
     ANTHROPIC_API_KEY: Optional[str] = os.getenv("ANTHROPIC_API_KEY")
     
+    # Shared LLM answer cache (optional; local SQLite cache when unset)
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL")
+    
     # LLM Settings
     DEFAULT_LLM_MODEL = "gpt-4o-mini"
     FALLBACK_LLM_MODEL = "gpt-3.5-turbo"
     LLM_TEMPERATURE = 0
     LLM_MAX_TOKENS = 4096
+    LLM_CACHE_ENABLED = True  # Reuse extractions / answers for identical OCR text and questions
+    LLM_CACHE_TTL = 86400  # seconds an identical request reuses a cached answer
+    LLM_MAX_CONCURRENCY = 8  # In-flight requests per batch of questions
+    LLM_REQUESTS_PER_MINUTE = 500
+    LLM_TOKENS_PER_MINUTE = 200_000
+    LLM_MAX_ATTEMPTS = 5  # Tries per request on rate limits / server errors
+    BATCH_POLL_INTERVAL = 300  # seconds between checks on queued OpenAI Batch API jobs
+    LLM_CONTEXT_TOKEN_BUDGET = 12_000  # Input tokens of full document data per advanced query
+    SEMANTIC_CACHE_MODEL = "text-embedding-3-small"
+    SEMANTIC_CACHE_THRESHOLD = 0.95  # Cosine similarity for re-phrased questions to share an answer
+    SEMANTIC_CACHE_SIZE = 2000
     
     # OCR Settings
     OCR_LANGUAGE = "en"
     OCR_USE_GPU = False
     OCR_CONFIDENCE_THRESHOLD = 0.5
+    OCR_USE_ANGLE_CLS = True  # Text angle classifier for rotated image uploads (never needed for PDF pages)
+    OCR_THRESHOLD_METHOD = "adaptive"  # Preprocessing binarization: "adaptive" (OpenCV) or "integral"
+    OCR_HEAVY_DENOISE = False  # Non-local means denoising in preprocessing (slow; a 3x3 Gaussian otherwise)
+    # Recognition batch: on CPU the batch runs sequentially anyway, and larger
+    # batches only make Paddle allocate extra memory arena chunks
+    OCR_REC_BATCH_NUM = 6 if OCR_USE_GPU else 1
+    # Worker processes for multi-page PDFs (~4 cores per Paddle process; 1 = in-process)
+    OCR_PAGE_WORKERS = 1 if OCR_USE_GPU else max(1, (os.cpu_count() or 1) // 4)
+    OCR_MAX_BATCH_PAGES = 4  # PDF pages rendered and OCR'd per engine lock hold (bounds page arrays in memory)
+    OCR_ENGINE_MAX_CALLS = 200  # Rebuild the engine after this many calls (Paddle memory growth)
     
     # Document Processing
     MAX_FILE_SIZE_MB = 50
     SUPPORTED_FORMATS = ["png", "jpg", "jpeg", "pdf", "tiff"]
     BATCH_SIZE = 10
+    COPY_BUFSIZE = 1 << 20  # 1 MiB chunks when storing uploads without sendfile
+    UPLOAD_WORKERS = 4  # Concurrent documents processed per upload
+    OCR_WORKERS = 2  # process_batch OCR stage (inference itself is serialized)
+    LLM_WORKERS = 8  # process_batch LLM extraction stage (network-bound)
+    LLM_BATCH_SIZE = 4  # OCR'd documents sent per extraction request in process_batch
     
     # Database
     DB_ECHO = False
+    DB_POOL_SIZE = 10
+    DB_MAX_OVERFLOW = 20
+    DB_POOL_RECYCLE = 1800  # seconds before a pooled connection is replaced
     
     # Logging
     LOG_LEVEL = "INFO"
     LOG_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>"
+    LOG_FILE = LOGS_DIR / "app.log"
+    LOG_ROTATION = "10 MB"
+    
+    _initialized = False
     
     @classmethod
     def setup_directories(cls):
         """Create necessary directories"""
-        for directory in [cls.STORAGE_DIR, cls.UPLOADS_DIR, cls.EXPORTS_DIR, cls.CACHE_DIR]:
+        for directory in [cls.STORAGE_DIR, cls.UPLOADS_DIR, cls.EXPORTS_DIR, cls.CACHE_DIR, cls.OCR_SCRATCH_DIR, cls.LOGS_DIR]:
             directory.mkdir(parents=True, exist_ok=True)
     
     @classmethod
@@ -74,15 +114,30 @@ class Config:
     
     @classmethod
     def initialize(cls):
-        """Initialize configuration"""
+        """Initialize configuration (once per process)"""
+        if cls._initialized:
+            return
+        cls._initialized = True
+        
         cls.setup_directories()
-        logger.remove()
-        logger.add(
-            lambda msg: print(msg, end=""),
-            format=cls.LOG_FORMAT,
-            level=cls.LOG_LEVEL,
-            colorize=True
-        )
+        # enqueue=True: records are formatted and written by loguru's background
+        # worker, so logging never blocks the calling (e.g. query) thread
+        logger.configure(handlers=[
+            {
+                "sink": sys.stderr,
+                "format": cls.LOG_FORMAT,
+                "level": cls.LOG_LEVEL,
+                "colorize": True,
+                "enqueue": True
+            },
+            {
+                "sink": cls.LOG_FILE,
+                "level": cls.LOG_LEVEL,
+                "rotation": cls.LOG_ROTATION,
+                "serialize": True,
+                "enqueue": True
+            }
+        ])
         logger.info(f"{cls.PROJECT_NAME} v{cls.VERSION} initialized")
 
 
@@ -6,13 +6,66 @@ import json
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime
-import pandas as pd
+import xlsxwriter
 from loguru import logger
+from sqlalchemy import func, select
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from core.config import Config
 from storage.database import db_manager, Document
 
 
+# Summary sheet fields taken from extracted_data: (column, dotted path)
+SUMMARY_SCHEMA = [
+    ("Document Number", "document_number"),
+    ("Issue Date", "dates.issue_date"),
+    ("Due Date", "dates.due_date"),
+    ("Vendor Name", "vendor.name"),
+    ("Vendor Email", "vendor.email"),
+    ("Customer Name", "customer.name"),
+    ("Subtotal", "amounts.subtotal"),
+    ("Tax", "amounts.tax"),
+    ("Total", "amounts.total"),
+    ("Currency", "amounts.currency"),
+]
+SUMMARY_COLUMNS = ["ID", "Filename", "Document Type", "Processed Date", "OCR Confidence"] + [
+    column for column, _ in SUMMARY_SCHEMA
+]
+ITEM_COLUMNS = ["Document ID", "Filename", "Description", "Quantity", "Unit Price", "Amount"]
+
+
+def _dig(data, path: str, default="N/A"):
+    """Follow a dotted path through nested dicts; missing, non-dict or empty values give default"""
+    for key in path.split("."):
+        data = data.get(key) if isinstance(data, dict) else None
+    return data or default
+
+
+def _cell(value):
+    """Excel-writable value (nested JSON is written as its string form)"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _dumps(obj, pretty: bool) -> bytes:
+    """Serialize one JSON value to UTF-8 (orjson when available)"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return orjson.dumps(obj, option=(option | orjson.OPT_INDENT_2) if pretty else option)
+    return json.dumps(
+        obj,
+        indent=2 if pretty else None,
+        separators=None if pretty else (",", ":"),
+        ensure_ascii=False
+    ).encode("utf-8")
+
+
 class ExportManager:
     """Export documents to various formats"""
     
@@ -37,65 +90,78 @@ class ExportManager:
         Returns:
             Path to exported file
         """
-        session = db_manager.get_session()
+        columns = [
+            Document.id,
+            Document.original_filename,
+            Document.file_type,
+            Document.document_type,
+            Document.uploaded_at,
+            Document.processed_at,
+            Document.extracted_data,
+            Document.ocr_confidence,
+            Document.tags
+        ]
+        if include_ocr:
+            columns.append(Document.ocr_text)
         
-        try:
-            # Query documents
-            query = session.query(Document).filter(Document.status == "completed")
-            
-            if document_ids:
-                query = query.filter(Document.id.in_(document_ids))
+        completed = [Document.status == "completed"]
+        if document_ids:
+            completed.append(Document.id.in_(document_ids))
+        
+        # Generate filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"docuvault_export_{timestamp}.json"
+        filepath = self.export_dir / filename
+        
+        with db_manager.session_scope() as session:
+            total = session.execute(
+                select(func.count(Document.id)).where(*completed)
+            ).scalar_one()
+            rows = session.execute(
+                select(*columns).where(*completed).execution_options(yield_per=256)
+            )
             
-            documents = query.all()
+            # Stream one document at a time instead of building the whole export
+            newline = b"\n  " if pretty else b""  # Line break + indent inside the top-level object
+            colon = b": " if pretty else b":"
+            item_newline = newline + b"  " if pretty else b""
             
-            # Build export data
-            export_data = {
-                "export_info": {
+            with open(filepath, 'wb') as f:
+                export_info = {
                     "timestamp": datetime.now().isoformat(),
-                    "total_documents": len(documents),
+                    "total_documents": total,
                     "include_ocr": include_ocr
-                },
-                "documents": []
-            }
-            
-            for doc in documents:
-                doc_data = {
-                    "id": doc.id,
-                    "filename": doc.original_filename,
-                    "file_type": doc.file_type,
-                    "document_type": doc.document_type,
-                    "uploaded_at": doc.uploaded_at.isoformat() if doc.uploaded_at else None,
-                    "processed_at": doc.processed_at.isoformat() if doc.processed_at else None,
-                    "extracted_data": doc.extracted_data,
-                    "ocr_confidence": doc.ocr_confidence,
-                    "tags": doc.tags
                 }
+                f.write(b'{' + newline + b'"export_info"' + colon)
+                f.write(_dumps(export_info, pretty).replace(b"\n", newline))
+                f.write(b',' + newline + b'"documents"' + colon + b'[')
                 
-                if include_ocr and doc.ocr_text:
-                    doc_data["ocr_text"] = doc.ocr_text
+                written = 0
+                for doc in rows:
+                    doc_data = {
+                        "id": doc.id,
+                        "filename": doc.original_filename,
+                        "file_type": doc.file_type,
+                        "document_type": doc.document_type,
+                        "uploaded_at": doc.uploaded_at.isoformat() if doc.uploaded_at else None,
+                        "processed_at": doc.processed_at.isoformat() if doc.processed_at else None,
+                        "extracted_data": doc.extracted_data,
+                        "ocr_confidence": doc.ocr_confidence,
+                        "tags": doc.tags
+                    }
+                    
+                    if include_ocr and doc.ocr_text:
+                        doc_data["ocr_text"] = doc.ocr_text
+                    
+                    f.write((b',' if written else b'') + item_newline)
+                    f.write(_dumps(doc_data, pretty).replace(b"\n", item_newline))
+                    written += 1
                 
-                export_data["documents"].append(doc_data)
-            
-            # Generate filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"docuvault_export_{timestamp}.json"
-            filepath = self.export_dir / filename
-            
-            # Write JSON
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(
-                    export_data, 
-                    f, 
-                    indent=2 if pretty else None,
-                    ensure_ascii=False
-                )
-            
-            logger.success(f"Exported {len(documents)} documents to: {filename}")
-            
-            return str(filepath)
-            
-        finally:
-            session.close()
+                f.write((newline if written else b'') + b']' + (b'\n' if pretty else b'') + b'}')
+        
+        logger.success(f"Exported {written} documents to: {filename}")
+        
+        return str(filepath)
     
     def export_to_excel(
         self, 
@@ -110,145 +176,82 @@ class ExportManager:
         Returns:
             Path to exported file
         """
-        session = db_manager.get_session()
-        
         try:
-            # Query documents
-            query = session.query(Document).filter(Document.status == "completed")
-            
-            if document_ids:
-                query = query.filter(Document.id.in_(document_ids))
-            
-            documents = query.all()
-            
-            # Check if there are any documents
-            if not documents:
-                logger.warning("No completed documents found to export")
-                raise ValueError("No completed documents found to export")
-            
-            # Prepare data for different sheets
-            summary_data = []
-            items_data = []
-            
-            for doc in documents:
-                # Summary sheet - Initialize with safe defaults
-                summary_row = {
-                    "ID": doc.id,
-                    "Filename": doc.original_filename or "Unknown",
-                    "Document Type": doc.document_type or "unknown",
-                    "Processed Date": doc.processed_at.strftime("%Y-%m-%d %H:%M") if doc.processed_at else "N/A",
-                    "OCR Confidence": f"{(doc.ocr_confidence or 0.0) * 100:.1f}%"
-                }
+            with db_manager.session_scope() as session:
+                # Query only the columns the sheets use (no OCR text)
+                stmt = select(
+                    Document.id,
+                    Document.original_filename,
+                    Document.document_type,
+                    Document.processed_at,
+                    Document.ocr_confidence,
+                    Document.extracted_data
+                ).where(Document.status == "completed")
+                
+                if document_ids:
+                    stmt = stmt.where(Document.id.in_(document_ids))
+                
+                # Create Excel file with multiple sheets
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"docuvault_export_{timestamp}.xlsx"
+                filepath = self.export_dir / filename
                 
-                # Extract key fields with comprehensive safety checks
-                if doc.extracted_data and isinstance(doc.extracted_data, dict):
+                # constant_memory: each row is flushed to disk as soon as the next
+                # one starts, so memory stays flat however many documents there are
+                workbook = xlsxwriter.Workbook(str(filepath), {'constant_memory': True})
+                header_format = workbook.add_format({'bold': True, 'border': 1})
+                summary_sheet = workbook.add_worksheet('Documents')
+                items_sheet = workbook.add_worksheet('Line Items')
+                summary_sheet.write_row(0, 0, SUMMARY_COLUMNS, header_format)
+                items_sheet.write_row(0, 0, ITEM_COLUMNS, header_format)
+                doc_count = 0
+                item_count = 0
+                
+                for doc in session.execute(stmt.execution_options(yield_per=256)):
                     data = doc.extracted_data
                     
-                    # Document number
-                    summary_row["Document Number"] = data.get("document_number") or "N/A"
-                    
-                    # Dates - Handle None and check if dict
-                    dates = data.get("dates")
-                    if dates and isinstance(dates, dict):
-                        summary_row["Issue Date"] = dates.get("issue_date") or "N/A"
-                        summary_row["Due Date"] = dates.get("due_date") or "N/A"
-                    else:
-                        summary_row["Issue Date"] = "N/A"
-                        summary_row["Due Date"] = "N/A"
-                    
-                    # Vendor - Handle None and check if dict
-                    vendor = data.get("vendor")
-                    if vendor and isinstance(vendor, dict):
-                        summary_row["Vendor Name"] = vendor.get("name") or "N/A"
-                        summary_row["Vendor Email"] = vendor.get("email") or "N/A"
-                    else:
-                        summary_row["Vendor Name"] = "N/A"
-                        summary_row["Vendor Email"] = "N/A"
-                    
-                    # Customer - Handle None and check if dict
-                    customer = data.get("customer")
-                    if customer and isinstance(customer, dict):
-                        summary_row["Customer Name"] = customer.get("name") or "N/A"
-                    else:
-                        summary_row["Customer Name"] = "N/A"
-                    
-                    # Amounts - Handle None and check if dict
-                    amounts = data.get("amounts")
-                    if amounts and isinstance(amounts, dict):
-                        summary_row["Subtotal"] = amounts.get("subtotal") or "N/A"
-                        summary_row["Tax"] = amounts.get("tax") or "N/A"
-                        summary_row["Total"] = amounts.get("total") or "N/A"
-                        summary_row["Currency"] = amounts.get("currency") or "N/A"
-                    else:
-                        summary_row["Subtotal"] = "N/A"
-                        summary_row["Tax"] = "N/A"
-                        summary_row["Total"] = "N/A"
-                        summary_row["Currency"] = "N/A"
+                    # Summary sheet
+                    doc_count += 1
+                    summary_sheet.write_row(doc_count, 0, [
+                        doc.id,
+                        doc.original_filename or "Unknown",
+                        doc.document_type or "unknown",
+                        doc.processed_at.strftime("%Y-%m-%d %H:%M") if doc.processed_at else "N/A",
+                        f"{(doc.ocr_confidence or 0.0) * 100:.1f}%"
+                    ] + [_cell(_dig(data, path)) for _, path in SUMMARY_SCHEMA])
                     
                     # Items - Handle None, empty lists, and check if list
-                    items = data.get("items")
+                    items = data.get("items") if isinstance(data, dict) else None
                     if items and isinstance(items, list):
                         for item in items:
                             if item and isinstance(item, dict):
-                                items_data.append({
-                                    "Document ID": doc.id,
-                                    "Filename": doc.original_filename or "Unknown",
-                                    "Description": item.get("description") or "N/A",
-                                    "Quantity": item.get("quantity") if item.get("quantity") is not None else "N/A",
-                                    "Unit Price": item.get("unit_price") or "N/A",
-                                    "Amount": item.get("amount") or "N/A"
-                                })
-                else:
-                    # No extracted data - fill with N/A
-                    summary_row.update({
-                        "Document Number": "N/A",
-                        "Issue Date": "N/A",
-                        "Due Date": "N/A",
-                        "Vendor Name": "N/A",
-                        "Vendor Email": "N/A",
-                        "Customer Name": "N/A",
-                        "Subtotal": "N/A",
-                        "Tax": "N/A",
-                        "Total": "N/A",
-                        "Currency": "N/A"
-                    })
+                                item_count += 1
+                                items_sheet.write_row(item_count, 0, [_cell(v) for v in (
+                                    doc.id,
+                                    doc.original_filename or "Unknown",
+                                    item.get("description") or "N/A",
+                                    item.get("quantity") if item.get("quantity") is not None else "N/A",
+                                    item.get("unit_price") or "N/A",
+                                    item.get("amount") or "N/A"
+                                )])
                 
-                summary_data.append(summary_row)
-            
-            # Create Excel file with multiple sheets
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"docuvault_export_{timestamp}.xlsx"
-            filepath = self.export_dir / filename
-            
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                # Summary sheet - always create
-                df_summary = pd.DataFrame(summary_data)
-                df_summary.to_excel(writer, sheet_name='Documents', index=False)
+                workbook.close()
                 
-                # Items sheet - create even if empty
-                if items_data:
-                    df_items = pd.DataFrame(items_data)
-                    df_items.to_excel(writer, sheet_name='Line Items', index=False)
-                else:
-                    # Create empty items sheet with headers
-                    df_empty = pd.DataFrame(columns=[
-                        "Document ID", "Filename", "Description", 
-                        "Quantity", "Unit Price", "Amount"
-                    ])
-                    df_empty.to_excel(writer, sheet_name='Line Items', index=False)
-            
-            logger.success(f"Exported {len(documents)} documents to Excel: {filename}")
-            
-            return str(filepath)
+                # Check if there are any documents
+                if not doc_count:
+                    filepath.unlink(missing_ok=True)
+                    logger.warning("No completed documents found to export")
+                    raise ValueError("No completed documents found to export")
+                
+                logger.success(f"Exported {doc_count} documents to Excel: {filename}")
+                
+                return str(filepath)
             
         except Exception as e:
             logger.error(f"Excel export failed: {e}")
             import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
-            
-        finally:
-            session.close()
     
     def export_single_document(
         self, 
@@ -267,9 +270,7 @@ class ExportManager:
         Returns:
             Path to exported file
         """
-        session = db_manager.get_session()
-        
-        try:
+        with db_manager.session_scope() as session:
             doc = session.query(Document).filter(Document.id == document_id).first()
             
             if not doc:
@@ -294,8 +295,8 @@ class ExportManager:
                 if include_ocr and doc.ocr_text:
                     export_data["ocr_text"] = doc.ocr_text
                 
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(export_data, f, indent=2, ensure_ascii=False)
+                with open(filepath, 'wb') as f:
+                    f.write(_dumps(export_data, pretty=True))
             
             else:  # txt
                 filename = f"{base_name}_{timestamp}.txt"
@@ -310,7 +311,7 @@ class ExportManager:
                     f.write("="*50 + "\n\n")
                     
                     if doc.extracted_data:
-                        f.write(json.dumps(doc.extracted_data, indent=2, ensure_ascii=False))
+                        f.write(_dumps(doc.extracted_data, pretty=True).decode("utf-8"))
                     
                     if include_ocr and doc.ocr_text:
                         f.write("\n\n" + "="*50 + "\n")
@@ -322,8 +323,6 @@ class ExportManager:
             
             return str(filepath)
             
-        finally:
-            session.close()
 
 
 # Global export manager
@@ -0,0 +1,80 @@
+"""
+DocuVault - History Writer
+Batched background persistence of search history
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from storage.database import db_manager, SearchHistory
+
+
+MAX_BATCH = 256
+MAX_WAIT = 0.5  # seconds to keep collecting after the first entry arrives
+
+_history_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10_000)
+_STOP = None  # Sentinel: flush and exit
+
+
+def _drain(q: queue.Queue, max_n: int, max_wait: float) -> List[Optional[Dict[str, Any]]]:
+    """Block for one entry, then gather more until max_n or max_wait elapses"""
+    batch = [q.get()]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_n and batch[-1] is not _STOP:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(q.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch: List[Dict[str, Any]]):
+    """Insert a batch of history rows in one transaction"""
+    try:
+        with db_manager.session_scope() as session:
+            session.bulk_insert_mappings(SearchHistory, batch)
+    except Exception as e:
+        logger.error(f"Failed to save {len(batch)} search history entries: {e}")
+
+
+def _run():
+    """Writer thread: persist batches until the stop sentinel is seen"""
+    while True:
+        batch = _drain(_history_queue, MAX_BATCH, MAX_WAIT)
+        entries = [entry for entry in batch if entry is not _STOP]
+        if entries:
+            _write(entries)
+        if batch[-1] is _STOP:
+            return
+
+
+def save(query: str, response: str, document_ids: List[int], execution_time: float = 0):
+    """Queue a search history entry; never blocks the caller"""
+    try:
+        _history_queue.put_nowait({
+            "query": query,
+            "response": response,
+            "document_ids": document_ids,
+            "execution_time": execution_time,
+            "created_at": datetime.utcnow()
+        })
+    except queue.Full:
+        logger.warning("Search history queue full, dropping entry")
+
+
+def shutdown(timeout: float = 5.0):
+    """Stop the writer after persisting everything queued so far"""
+    _history_queue.put(_STOP)
+    _writer.join(timeout)
+
+
+_writer = threading.Thread(target=_run, name="history-writer", daemon=True)
+_writer.start()
+atexit.register(shutdown)
@@ -0,0 +1,121 @@
+"""
+DocuVault - LLM Cache
+Content-addressed cache of LLM answers
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from loguru import logger
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+from core.config import Config
+
+
+class LLMCache:
+    """SQLite-backed answer cache keyed by a SHA-256 of the full request"""
+
+    def __init__(self, path: Path = Config.CACHE_DIR / "llm_cache.db", ttl: int = Config.LLM_CACHE_TTL):
+        """
+        Initialize LLM cache
+
+        Args:
+            path: SQLite database file
+            ttl: Default entry lifetime in seconds
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash request parts (provider, model, prompts...) into a cache key"""
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer, or None if missing or expired"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT answer FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+        return row[0] if row else None
+
+    def set(self, key: str, answer: str, ttl: Optional[int] = None):
+        """Store an answer for ttl seconds (default: self.ttl)"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, answer, expires_at) VALUES (?, ?, ?)",
+                    (key, answer, time.time() + (ttl or self.ttl))
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+
+class RedisLLMCache(LLMCache):
+    """Redis-backed answer cache shared by every app process"""
+
+    PREFIX = "docuvault:llm:"
+
+    def __init__(self, url: str, ttl: int = Config.LLM_CACHE_TTL):
+        """
+        Initialize Redis LLM cache
+
+        Args:
+            url: Redis connection URL
+            ttl: Default entry lifetime in seconds
+        """
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer, or None if missing, expired or Redis is unreachable"""
+        try:
+            return self._redis.get(self.PREFIX + key)
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    def set(self, key: str, answer: str, ttl: Optional[int] = None):
+        """Store an answer for ttl seconds (default: self.ttl)"""
+        try:
+            self._redis.setex(self.PREFIX + key, ttl or self.ttl, answer)
+        except redis.RedisError as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def clear(self):
+        """Drop every cached answer"""
+        keys = list(self._redis.scan_iter(match=self.PREFIX + "*", count=500))
+        if keys:
+            self._redis.delete(*keys)
+
+
+# Global LLM cache
+if Config.REDIS_URL and REDIS_AVAILABLE:
+    llm_cache: LLMCache = RedisLLMCache(Config.REDIS_URL)
+else:
+    llm_cache = LLMCache()
@@ -2,19 +2,26 @@
 DocuVault - Document Processor
 Orchestrates OCR and LLM extraction pipeline
 """
+import asyncio
+import os
+import sys
 import time
 import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 from loguru import logger
 
 from core.config import Config
 from extraction.ocr import ocr_engine
 from extraction.llm_extractor import llm_extractor
+from extraction.schema import ExtractedDocument
 from storage.database import db_manager, Document
 
 
+OCRResult = Tuple[str, float, float]  # (OCR text, confidence, processing time)
+
 class DocumentProcessor:
     """Process documents through OCR and LLM extraction pipeline"""
     
@@ -60,7 +67,7 @@ class DocumentProcessor:
         
         return True
     
-    def save_file(self, source_path: str, original_filename: str) -> tuple[str, str]:
+    def save_file(self, source_path: str, original_filename: str) -> tuple[str, str, int, str]:
         """
         Save uploaded file to storage
         
@@ -69,20 +76,27 @@ class DocumentProcessor:
             original_filename: Original filename
             
         Returns:
-            Tuple of (saved_path, unique_filename)
+            Tuple of (saved_path, unique_filename, size_bytes, file_type)
         """
         # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_ext = Path(original_filename).suffix
+        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        file_type = Path(original_filename).suffix.lower().lstrip('.')
         unique_filename = f"{timestamp}_{original_filename}"
         
         # Save to uploads directory
         dest_path = Config.UPLOADS_DIR / unique_filename
-        shutil.copy2(source_path, dest_path)
+        if sys.platform.startswith("linux"):
+            # In-kernel os.sendfile, no user-space buffer
+            shutil.copyfile(source_path, dest_path)
+        else:
+            with open(source_path, "rb") as src, open(dest_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=Config.COPY_BUFSIZE)
+        shutil.copystat(source_path, dest_path)
+        size_bytes = os.stat(dest_path).st_size
         
         logger.info(f"File saved: {unique_filename}")
         
-        return str(dest_path), unique_filename
+        return str(dest_path), unique_filename, size_bytes, file_type
     
     def process_document(
         self, 
@@ -101,86 +115,210 @@ class DocumentProcessor:
         Returns:
             Document database record or None if failed
         """
+        doc, ocr = self._ocr_stage(file_path, original_filename)
+        if not ocr:
+            return doc
+        return self._llm_stage(doc, ocr, document_type_hint)
+    
+    def _ocr_stage(
+        self, 
+        file_path: str, 
+        original_filename: str
+    ) -> Tuple[Optional[Document], Optional[OCRResult]]:
+        """
+        Pipeline stage 1: validate, store, create the record and run OCR
+        
+        The OCR results are not written here: _llm_stage() stores them with
+        the extraction, so a processed document costs two commits (insert,
+        final update).
+        
+        Returns:
+            (record, (OCR text, confidence, OCR time)); the OCR result is
+            None if OCR failed (record marked failed), and both are None if
+            the file was rejected or processing crashed
+        """
         logger.info(f"Processing document: {original_filename}")
         
         # Validate file
         if not self.validate_file(file_path):
-            return None
+            return None, None
         
         # Create database record
-        session = db_manager.get_session()
+        with db_manager.session_scope() as session:
+            try:
+                # Save file
+                saved_path, unique_filename, file_size, file_type = self.save_file(file_path, original_filename)
+                
+                # Create DB entry
+                doc = Document(
+                    filename=unique_filename,
+                    original_filename=original_filename,
+                    file_path=saved_path,
+                    file_size=file_size,
+                    file_type=file_type,
+                    status="processing"
+                )
+                
+                session.add(doc)
+                session.commit()
+                
+                # Step 1: OCR Extraction
+                logger.info(f"Step 1/2: OCR extraction for doc_id={doc.id}")
+                ocr_text, ocr_confidence, ocr_metadata = self.ocr.extract_with_fallback(saved_path)
+                
+                if not ocr_text:
+                    logger.error(f"OCR failed for doc_id={doc.id}")
+                    doc.status = "failed"
+                    session.commit()
+                    return doc, None
+                
+                return doc, (ocr_text, ocr_confidence, ocr_metadata.get("processing_time", 0))
+                
+            except Exception as e:
+                logger.error(f"Document processing failed: {e}")
+                if 'doc' in locals():
+                    doc.status = "failed"
+                    session.commit()
+                return None, None
+                
+            finally:
+                db_manager.bump_documents_version()
+    
+    def _llm_stage(
+        self, 
+        doc: Document, 
+        ocr: OCRResult, 
+        document_type_hint: Optional[str] = None,
+        extraction: Optional[Tuple[ExtractedDocument, float]] = None
+    ) -> Optional[Document]:
+        """
+        Pipeline stage 2: structured LLM extraction of an OCR'd record
         
-        try:
-            # Save file
-            saved_path, unique_filename = self.save_file(file_path, original_filename)
-            
-            # Create DB entry
-            doc = Document(
-                filename=unique_filename,
-                original_filename=original_filename,
-                file_path=saved_path,
-                file_size=Path(saved_path).stat().st_size,
-                file_type=Path(saved_path).suffix.lower().lstrip('.'),
-                status="processing"
-            )
-            
-            session.add(doc)
-            session.commit()
-            
-            # Step 1: OCR Extraction
-            logger.info(f"Step 1/2: OCR extraction for doc_id={doc.id}")
-            ocr_text, ocr_confidence, ocr_metadata = self.ocr.extract_with_fallback(saved_path)
+        OCR results, extraction and status are written in a single commit.
+        
+        Args:
+            ocr: (OCR text, confidence, OCR time) from _ocr_stage()
+            extraction: (ExtractedDocument, llm_time) already produced by a
+                batched call; the LLM is only called when this is None
+        
+        Returns:
+            Completed record, or None if extraction failed (record marked failed)
+        """
+        with db_manager.session_scope() as session:
+            # The record may come from another thread's session
+            doc = session.get(Document, doc.id)
+            doc.ocr_text, doc.ocr_confidence, doc.ocr_processing_time = ocr
             
-            if not ocr_text:
-                logger.error(f"OCR failed for doc_id={doc.id}")
-                doc.status = "failed"
+            try:
+                # Step 2: LLM Extraction
+                if self.llm:
+                    logger.info(f"Step 2/2: LLM extraction for doc_id={doc.id}")
+                    extracted_doc, llm_time = extraction or self.llm.extract_with_retry(
+                        doc.ocr_text, 
+                        document_type_hint
+                    )
+                    
+                    # Update extraction results
+                    doc.document_type = extracted_doc.document_type
+                    doc.extracted_data = extracted_doc.model_dump(mode='json')
+                    doc.llm_model = self.llm.model
+                    doc.llm_processing_time = llm_time
+                else:
+                    logger.warning("LLM extractor not available, skipping structured extraction")
+                    doc.document_type = "unknown"
+                
+                # Mark as completed
+                doc.status = "completed"
+                doc.processed_at = datetime.utcnow()
                 session.commit()
-                return doc
-            
-            # Update OCR results
-            doc.ocr_text = ocr_text
-            doc.ocr_confidence = ocr_confidence
-            doc.ocr_processing_time = ocr_metadata.get("processing_time", 0)
-            session.commit()
-            
-            # Step 2: LLM Extraction
-            if self.llm:
-                logger.info(f"Step 2/2: LLM extraction for doc_id={doc.id}")
-                extracted_doc, llm_time = self.llm.extract_with_retry(
-                    ocr_text, 
-                    document_type_hint
+                
+                logger.success(
+                    f"Document processed successfully: doc_id={doc.id}, "
+                    f"type={doc.document_type}"
                 )
                 
-                # Update extraction results
-                doc.document_type = extracted_doc.document_type
-                doc.extracted_data = extracted_doc.model_dump(mode='json')
-                doc.llm_model = self.llm.model
-                doc.llm_processing_time = llm_time
-            else:
-                logger.warning("LLM extractor not available, skipping structured extraction")
-                doc.document_type = "unknown"
-            
-            # Mark as completed
-            doc.status = "completed"
-            doc.processed_at = datetime.utcnow()
-            session.commit()
-            
-            logger.success(
-                f"Document processed successfully: doc_id={doc.id}, "
-                f"type={doc.document_type}"
-            )
-            
-            return doc
-            
-        except Exception as e:
-            logger.error(f"Document processing failed: {e}")
-            if 'doc' in locals():
+                return doc
+                
+            except Exception as e:
+                logger.error(f"Document processing failed: {e}")
                 doc.status = "failed"
                 session.commit()
-            return None
+                return None
+                
+            finally:
+                db_manager.bump_documents_version()
+    
+    def _llm_batch_stage(
+        self, 
+        staged: List[Tuple[Document, OCRResult]], 
+        document_type_hint: Optional[str] = None
+    ) -> List[Optional[Document]]:
+        """
+        Pipeline stage 2 for a group of OCR'd records, sharing one LLM call
+        
+        Returns:
+            One entry per (record, OCR result) pair, as from _llm_stage()
+        """
+        extractions: List[Optional[Tuple[ExtractedDocument, float]]] = [None] * len(staged)
+        if self.llm and len(staged) > 1:
+            try:
+                extractions = self.llm.extract_many([ocr[0] for _, ocr in staged], document_type_hint)
+            except Exception as e:
+                logger.error(f"Batched LLM extraction failed: {e}")
+        
+        return [
+            self._llm_stage(doc, ocr, document_type_hint, extraction)
+            for (doc, ocr), extraction in zip(staged, extractions)
+        ]
+    
+    def _process_batch_iter(
+        self, 
+        file_paths: list[tuple[str, str]],
+        document_type_hint: Optional[str] = None
+    ) -> Iterator[Tuple[int, Document]]:
+        """
+        Two-stage batch pipeline, yielding (input index, record) as each finishes
+        
+        OCR and LLM extraction run as two overlapping stages: every
+        Config.LLM_BATCH_SIZE OCR'd documents go to the LLM pool as one
+        extraction request, so network-bound extraction of one group
+        overlaps OCR of the next.
+        """
+        with ThreadPoolExecutor(max_workers=Config.OCR_WORKERS, thread_name_prefix="ocr") as ocr_pool, \
+                ThreadPoolExecutor(max_workers=Config.LLM_WORKERS, thread_name_prefix="llm") as llm_pool:
+            ocr_futures = {
+                ocr_pool.submit(self._ocr_stage, file_path, original_filename): i
+                for i, (file_path, original_filename) in enumerate(file_paths)
+            }
+            llm_futures = {}
+            staged: List[Tuple[Document, OCRResult]] = []
+            staged_indices: List[int] = []
             
-        finally:
-            session.close()
+            pending = set(ocr_futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in ocr_futures:
+                        i = ocr_futures.pop(future)
+                        doc, ocr = future.result()
+                        if ocr:
+                            staged.append((doc, ocr))
+                            staged_indices.append(i)
+                        elif doc:
+                            # OCR failed: the record is kept, as with process_document()
+                            yield i, doc
+                    else:
+                        for i, doc in zip(llm_futures.pop(future), future.result()):
+                            if doc:
+                                yield i, doc
+                
+                # Send full groups, and the remainder once OCR is done
+                while staged and (len(staged) >= Config.LLM_BATCH_SIZE or not ocr_futures):
+                    group = Config.LLM_BATCH_SIZE
+                    future = llm_pool.submit(self._llm_batch_stage, staged[:group], document_type_hint)
+                    llm_futures[future] = staged_indices[:group]
+                    pending.add(future)
+                    staged, staged_indices = staged[group:], staged_indices[group:]
     
     def process_batch(
         self, 
@@ -195,18 +333,87 @@ class DocumentProcessor:
             document_type_hint: Optional document type hint
             
         Returns:
-            List of processed Document records
+            List of processed Document records, in input order
         """
         logger.info(f"Processing batch of {len(file_paths)} documents")
         
-        results = []
-        for i, (file_path, original_filename) in enumerate(file_paths, 1):
-            logger.info(f"Processing {i}/{len(file_paths)}: {original_filename}")
+        results = dict(self._process_batch_iter(file_paths, document_type_hint))
+        results = [results[i] for i in sorted(results)]
+        logger.success(f"Batch processing completed: {len(results)}/{len(file_paths)} successful")
+        
+        return results
+    
+    def process_batch_iter(
+        self, 
+        file_paths: list[tuple[str, str]],
+        document_type_hint: Optional[str] = None
+    ) -> Iterator[Document]:
+        """
+        Process multiple documents in batch, yielding each record as it completes
+        
+        Same pipeline as process_batch(), but results arrive in completion
+        order and nothing is accumulated, so callers can stream them out.
+        Records are detached from their session with their attributes
+        loaded, so they stay usable after the session is gone.
+        
+        Args:
+            file_paths: List of (file_path, original_filename) tuples
+            document_type_hint: Optional document type hint
             
-            doc = self.process_document(file_path, original_filename, document_type_hint)
-            if doc:
-                results.append(doc)
+        Yields:
+            Processed Document records
+        """
+        logger.info(f"Processing batch of {len(file_paths)} documents")
+        
+        count = 0
+        for _, doc in self._process_batch_iter(file_paths, document_type_hint):
+            count += 1
+            yield doc
+        
+        logger.success(f"Batch processing completed: {count}/{len(file_paths)} successful")
+    
+    async def process_batch_async(
+        self, 
+        file_paths: list[tuple[str, str]],
+        document_type_hint: Optional[str] = None
+    ) -> list[Document]:
+        """
+        Process multiple documents in batch from an event loop
+        
+        OCR and database work run in worker threads; LLM extraction is
+        awaited on the async clients, at most Config.LLM_MAX_CONCURRENCY
+        requests at a time.
         
+        Args:
+            file_paths: List of (file_path, original_filename) tuples
+            document_type_hint: Optional document type hint
+            
+        Returns:
+            List of processed Document records, in input order
+        """
+        logger.info(f"Processing batch of {len(file_paths)} documents (async)")
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(Config.LLM_MAX_CONCURRENCY)
+        
+        with ThreadPoolExecutor(max_workers=Config.OCR_WORKERS, thread_name_prefix="ocr") as ocr_pool:
+            async def process_one(file_path: str, original_filename: str) -> Optional[Document]:
+                doc, ocr = await loop.run_in_executor(ocr_pool, self._ocr_stage, file_path, original_filename)
+                if not ocr:
+                    return doc
+                
+                extraction = None
+                if self.llm:
+                    async with semaphore:
+                        extraction = await self.llm.aextract_with_retry(ocr[0], document_type_hint)
+                return await asyncio.to_thread(self._llm_stage, doc, ocr, document_type_hint, extraction)
+            
+            results = await asyncio.gather(*(
+                process_one(file_path, original_filename)
+                for file_path, original_filename in file_paths
+            ))
+        
+        results = [doc for doc in results if doc]
         logger.success(f"Batch processing completed: {len(results)}/{len(file_paths)} successful")
         
         return results
@@ -221,9 +428,7 @@ class DocumentProcessor:
         Returns:
             Updated Document record or None
         """
-        session = db_manager.get_session()
-        
-        try:
+        with db_manager.session_scope() as session:
             doc = session.query(Document).filter(Document.id == doc_id).first()
             
             if not doc:
@@ -244,8 +449,6 @@ class DocumentProcessor:
                 doc.original_filename
             )
             
-        finally:
-            session.close()
 
 
 # Global processor instance
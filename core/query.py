@@ -4,16 +4,65 @@ Intelligent document search and question answering
 """
 import json
 import time
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Union
 from datetime import datetime
 from openai import OpenAI
 from anthropic import Anthropic
 from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from core import history_writer
 from core.config import Config
+from core.llm_cache import llm_cache
 from storage.database import db_manager, Document, SearchHistory
 
 
+OCR_SNIPPET_CHARS = 1000  # OCR text per document included in the prompt
+
+
+def _dumps_compact(data: Any) -> str:
+    """Single-line JSON: cheaper to build and fewer prompt tokens than indented"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=str).decode()
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+_HISTORY_COLUMNS = (
+    SearchHistory.id,
+    SearchHistory.query,
+    SearchHistory.response,
+    SearchHistory.document_ids,
+    SearchHistory.created_at,
+    SearchHistory.execution_time
+)
+
+_QUERY_PROMPT_TEMPLATE = """You are DocuVault AI, an intelligent document assistant. Your role is to answer questions about documents accurately and helpfully.
+
+INSTRUCTIONS:
+1. Answer ONLY based on the provided document data below
+2. Be specific - cite document IDs and filenames when relevant
+3. For financial questions, use exact amounts from the documents
+4. If information is not in the documents, clearly state "This information is not available in the documents"
+5. Format numbers and dates clearly
+6. For multiple documents, compare or aggregate data as requested
+7. Be concise but complete
+
+AVAILABLE DOCUMENTS:
+{context}
+
+USER QUESTION:
+{question}
+
+Provide a clear, accurate answer:"""
+
+
 class QueryEngine:
     """Query documents using natural language"""
     
@@ -44,8 +93,9 @@ class QueryEngine:
         self, 
         document_ids: Optional[List[int]] = None,
         document_type: Optional[str] = None,
-        limit: Optional[int] = None
-    ) -> List[Document]:
+        limit: Optional[int] = None,
+        snippet_only: bool = False
+    ) -> List[Union[Document, Row]]:
         """
         Retrieve documents from database
         
@@ -53,40 +103,53 @@ class QueryEngine:
             document_ids: Specific document IDs to retrieve
             document_type: Filter by document type
             limit: Maximum number of documents
+            snippet_only: Return rows of the prompt fields only, with the
+                OCR text truncated by the database (as ocr_snippet)
             
         Returns:
-            List of Document records
+            List of Document records (rows if snippet_only)
         """
-        session = db_manager.get_session()
-        
-        try:
-            query = session.query(Document).filter(
-                Document.status == "completed",
-                Document.is_archived == False
+        if snippet_only:
+            columns = (
+                Document.id,
+                Document.original_filename,
+                Document.document_type,
+                Document.processed_at,
+                Document.extracted_data,
+                func.substr(Document.ocr_text, 1, OCR_SNIPPET_CHARS).label("ocr_snippet")
             )
+        else:
+            columns = (Document,)
+        
+        # Served by ix_documents_status_archived_processed: an index range
+        # scan already in processed_at DESC order, stopping after limit rows
+        stmt = select(*columns).where(
+            Document.status == "completed",
+            Document.is_archived == False
+        )
+        
+        if document_ids:
+            stmt = stmt.where(Document.id.in_(document_ids))
+        
+        if document_type:
+            stmt = stmt.where(Document.document_type == document_type)
+        
+        stmt = stmt.order_by(Document.processed_at.desc())
+        
+        if limit:
+            stmt = stmt.limit(limit)
+        
+        with db_manager.session_scope() as session:
+            result = session.execute(stmt)
+            return result.all() if snippet_only else result.scalars().all()
             
-            if document_ids:
-                query = query.filter(Document.id.in_(document_ids))
-            
-            if document_type:
-                query = query.filter(Document.document_type == document_type)
-            
-            query = query.order_by(Document.processed_at.desc())
-            
-            if limit:
-                query = query.limit(limit)
-            
-            return query.all()
-            
-        finally:
-            session.close()
     
-    def build_context(self, documents: List[Document]) -> str:
+    def build_context(self, documents: List[Union[Document, Row]]) -> str:
         """
         Build context from documents for LLM
         
         Args:
-            documents: List of Document records
+            documents: List of Document records or get_documents(snippet_only=True) rows
             
         Returns:
             Formatted context string
@@ -105,11 +168,12 @@ class QueryEngine:
             
             if doc.extracted_data:
                 context_parts.append(f"Extracted Data:")
-                context_parts.append(json.dumps(doc.extracted_data, indent=2))
+                context_parts.append(_dumps_compact(doc.extracted_data))
             
-            if doc.ocr_text:
+            ocr_snippet = doc.ocr_snippet if hasattr(doc, "ocr_snippet") else (doc.ocr_text or "")[:OCR_SNIPPET_CHARS]
+            if ocr_snippet:
                 context_parts.append(f"OCR Text:")
-                context_parts.append(doc.ocr_text[:1000])  # Limit OCR text
+                context_parts.append(ocr_snippet)
             
             context_parts.append("")  # Blank line
         
@@ -126,26 +190,7 @@ class QueryEngine:
         Returns:
             Formatted prompt
         """
-        prompt = f"""You are DocuVault AI, an intelligent document assistant. Your role is to answer questions about documents accurately and helpfully.
-
-INSTRUCTIONS:
-1. Answer ONLY based on the provided document data below
-2. Be specific - cite document IDs and filenames when relevant
-3. For financial questions, use exact amounts from the documents
-4. If information is not in the documents, clearly state "This information is not available in the documents"
-5. Format numbers and dates clearly
-6. For multiple documents, compare or aggregate data as requested
-7. Be concise but complete
-
-AVAILABLE DOCUMENTS:
-{context}
-
-USER QUESTION:
-{question}
-
-Provide a clear, accurate answer:"""
-        
-        return prompt
+        return _QUERY_PROMPT_TEMPLATE.format(context=context, question=question)
     
     def call_llm(self, prompt: str) -> str:
         """
@@ -189,13 +234,67 @@ Provide a clear, accurate answer:"""
             )
             return response.content[0].text
     
+    def call_llm_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Call LLM for query, yielding text as it is generated
+        
+        Args:
+            prompt: Query prompt
+            
+        Yields:
+            Answer text chunks
+        """
+        if self.provider == "openai":
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a helpful document assistant. Answer questions accurately based only on provided documents."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=0,
+                max_tokens=2000,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        
+        else:  # anthropic
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=2000,
+                temperature=0,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            ) as stream:
+                yield from stream.text_stream
+    
+    def _cache_key(self, question: str, documents: List[Union[Document, Row]]) -> str:
+        """Same question on the same documents (reprocessing changes processed_at)"""
+        return llm_cache.make_key(
+            "query", self.provider, self.model,
+            json.dumps(sorted((doc.id, str(doc.processed_at)) for doc in documents)),
+            " ".join(question.lower().split())
+        )
+    
     def query(
         self, 
         question: str,
         document_ids: Optional[List[int]] = None,
         document_type: Optional[str] = None,
-        limit: int = 10
-    ) -> Dict[str, Any]:
+        limit: int = 10,
+        stream: bool = False
+    ) -> Union[Dict[str, Any], Iterator[str]]:
         """
         Query documents with natural language
         
@@ -204,15 +303,19 @@ Provide a clear, accurate answer:"""
             document_ids: Specific documents to query
             document_type: Filter by document type
             limit: Maximum documents to consider
+            stream: Return query_stream() instead, yielding the answer as it is generated
             
         Returns:
             Dict with answer, documents used, and metadata
         """
+        if stream:
+            return self.query_stream(question, document_ids, document_type, limit)
+        
         start_time = time.time()
         
         try:
             # Get relevant documents
-            documents = self.get_documents(document_ids, document_type, limit)
+            documents = self.get_documents(document_ids, document_type, limit, snippet_only=True)
             
             if not documents:
                 return {
@@ -222,15 +325,23 @@ Provide a clear, accurate answer:"""
                     "error": "no_documents"
                 }
             
-            # Build context
-            context = self.build_context(documents)
+            cache_key = self._cache_key(question, documents)
+            answer = llm_cache.get(cache_key) if Config.LLM_CACHE_ENABLED else None
             
-            # Build prompt
-            prompt = self.build_query_prompt(question, context)
-            
-            # Call LLM
-            logger.info(f"Querying {len(documents)} documents: '{question}'")
-            answer = self.call_llm(prompt)
+            if answer is not None:
+                logger.info("LLM cache hit")
+            else:
+                # Build context
+                context = self.build_context(documents)
+                
+                # Build prompt
+                prompt = self.build_query_prompt(question, context)
+                
+                # Call LLM
+                logger.info(f"Querying {len(documents)} documents: '{question}'")
+                answer = self.call_llm(prompt)
+                if Config.LLM_CACHE_ENABLED:
+                    llm_cache.set(cache_key, answer)
             
             execution_time = time.time() - start_time
             
@@ -267,6 +378,57 @@ Provide a clear, accurate answer:"""
                 "error": str(e)
             }
     
+    def query_stream(
+        self, 
+        question: str,
+        document_ids: Optional[List[int]] = None,
+        document_type: Optional[str] = None,
+        limit: int = 10
+    ) -> Iterator[str]:
+        """
+        Query documents with natural language, streaming the answer
+        
+        Yields answer text chunks (suitable for st.write_stream); the full
+        answer is cached and saved to history once the stream completes.
+        """
+        start_time = time.time()
+        
+        try:
+            documents = self.get_documents(document_ids, document_type, limit, snippet_only=True)
+            
+            if not documents:
+                yield "No documents found. Please upload and process documents first."
+                return
+            
+            cache_key = self._cache_key(question, documents)
+            answer = llm_cache.get(cache_key) if Config.LLM_CACHE_ENABLED else None
+            
+            if answer is not None:
+                logger.info("LLM cache hit")
+                yield answer
+            else:
+                prompt = self.build_query_prompt(question, self.build_context(documents))
+                
+                logger.info(f"Querying {len(documents)} documents: '{question}'")
+                parts = []
+                for text in self.call_llm_stream(prompt):
+                    parts.append(text)
+                    yield text
+                
+                # Only complete answers are cached
+                answer = "".join(parts)
+                if Config.LLM_CACHE_ENABLED:
+                    llm_cache.set(cache_key, answer)
+            
+            execution_time = time.time() - start_time
+            self._save_to_history(question, answer, [doc.id for doc in documents], execution_time)
+            
+            logger.success(f"Streamed query completed in {execution_time:.2f}s")
+            
+        except Exception as e:
+            logger.error(f"Query failed: {e}")
+            yield f"Error processing query: {str(e)}"
+    
     def _save_to_history(
         self, 
         query: str, 
@@ -275,21 +437,7 @@ Provide a clear, accurate answer:"""
         execution_time: float
     ):
         """Save query to search history"""
-        session = db_manager.get_session()
-        
-        try:
-            history = SearchHistory(
-                query=query,
-                response=response,
-                document_ids=document_ids,
-                execution_time=execution_time
-            )
-            session.add(history)
-            session.commit()
-        except Exception as e:
-            logger.warning(f"Failed to save search history: {e}")
-        finally:
-            session.close()
+        history_writer.save(query, response, document_ids, execution_time)
     
     def get_search_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """
@@ -301,13 +449,12 @@ Provide a clear, accurate answer:"""
         Returns:
             List of search history records
         """
-        session = db_manager.get_session()
+        # Plain rows: no ORM instances to build and track per entry
+        stmt = select(*_HISTORY_COLUMNS)\
+            .order_by(SearchHistory.created_at.desc(), SearchHistory.id.desc())
         
-        try:
-            history = session.query(SearchHistory)\
-                .order_by(SearchHistory.created_at.desc())\
-                .limit(limit)\
-                .all()
+        with db_manager.session_scope() as session:
+            rows = session.execute(stmt.limit(limit)).all()
             
             return [
                 {
@@ -318,10 +465,8 @@ Provide a clear, accurate answer:"""
                     "created_at": h.created_at.isoformat(),
                     "execution_time": h.execution_time
                 }
-                for h in history
+                for h in rows
             ]
-        finally:
-            session.close()
 
 
 # Global query engine
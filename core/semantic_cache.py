@@ -0,0 +1,122 @@
+"""
+DocuVault - Semantic Cache
+Reuse answers for re-phrased questions over the same documents
+"""
+import asyncio
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from openai import AsyncOpenAI
+from loguru import logger
+
+from core.config import Config
+
+
+class SemanticCache:
+    """
+    In-process embedding cache of LLM answers
+
+    Entries are partitioned by a context key (prompt version, model and the
+    exact document set), so a hit requires identical documents as well as a
+    question embedding within the cosine threshold.
+    """
+
+    def __init__(
+        self,
+        model: str = Config.SEMANTIC_CACHE_MODEL,
+        threshold: float = Config.SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = Config.LLM_CACHE_TTL,
+        max_entries: int = Config.SEMANTIC_CACHE_SIZE
+    ):
+        """
+        Initialize semantic cache
+
+        Args:
+            model: OpenAI embedding model
+            threshold: Minimum cosine similarity for a hit
+            ttl: Entry lifetime in seconds
+            max_entries: Entries kept across all contexts (oldest contexts evicted first)
+        """
+        self.model = model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.api_key = Config.OPENAI_API_KEY
+        # One client per event loop: an AsyncOpenAI connection pool is bound to
+        # the loop that opened it and fails on any other (e.g. a later asyncio.run)
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+        # context key -> [(unit embedding, answer, expires_at)]; insertion ordered
+        self._entries: Dict[str, List[Tuple[np.ndarray, str, float]]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Embeddings need an OpenAI key, whatever the answering provider"""
+        return self.api_key is not None
+    
+    def _client(self) -> AsyncOpenAI:
+        """Embedding client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = AsyncOpenAI(api_key=self.api_key)
+        return client
+
+    async def aembed(self, question: str) -> Optional[np.ndarray]:
+        """Unit-length embedding of a question, or None if embedding fails"""
+        try:
+            response = await self._client().embeddings.create(model=self.model, input=question)
+        except Exception as e:
+            logger.warning(f"Question embedding failed: {e}")
+            return None
+
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def get(self, context_key: str, embedding: np.ndarray) -> Optional[str]:
+        """Answer of the most similar live question for the same context, if close enough"""
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(context_key)
+            if not entries:
+                return None
+
+            live = [entry for entry in entries if entry[2] > now]
+            self._size -= len(entries) - len(live)
+            if not live:
+                del self._entries[context_key]
+                return None
+            self._entries[context_key] = live
+
+            scores = np.stack([entry[0] for entry in live]) @ embedding
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                return None
+            return live[best][1]
+
+    def set(self, context_key: str, embedding: np.ndarray, answer: str):
+        """Remember an answer for a question embedding under a context"""
+        with self._lock:
+            self._entries.setdefault(context_key, []).append((embedding, answer, time.time() + self.ttl))
+            self._size += 1
+
+            while self._size > self.max_entries:
+                oldest = next(iter(self._entries))
+                entries = self._entries[oldest]
+                entries.pop(0)
+                self._size -= 1
+                if not entries:
+                    del self._entries[oldest]
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# Global semantic cache
+semantic_cache = SemanticCache()
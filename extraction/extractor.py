@@ -1,47 +1,33 @@
-import os
 import json
-import re
-from dotenv import load_dotenv
 from jsonschema import validate
-from openai import OpenAI
 
-from ocr.paddle_ocr import run_ocr
 from extraction.schema import DOCUMENT_SCHEMA
 from extraction.normalizer import normalize_document
+from extraction.ocr import ocr_engine
+from extraction.llm_extractor import llm_extractor
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_json_decoder = json.JSONDecoder()
 
 
 def extract_json(text: str) -> dict:
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    if not match:
+    start = text.find("{")
+    if start == -1:
         raise ValueError("No JSON found in LLM output")
-    return json.loads(match.group())
+    return _json_decoder.raw_decode(text, start)[0]
 
 
 def extract_document(image_path: str) -> dict:
-    ocr_text = run_ocr(image_path)
+    # Shares the app's OCR engine, LLM client, prompt, cache and retries
+    if llm_extractor is None:
+        raise ValueError("No LLM extractor configured")
 
-    prompt = f"""
-You are an expert document parser.
+    ocr_text, *_ = ocr_engine.extract_with_fallback(image_path)
+    if not ocr_text:
+        raise ValueError("No text found by OCR")
 
-OCR TEXT:
-{ocr_text}
+    document, _ = llm_extractor.extract_with_retry(ocr_text)
 
-Return ONLY valid JSON.
-Use null when unknown.
-"""
-
-    response = client.responses.create(
-        model="gpt-4o-mini",
-        input=prompt
-    )
-
-    raw_text = response.output_text or ""
-    raw_json = extract_json(raw_text)
-
-    normalized = normalize_document(raw_json)
+    normalized = normalize_document(document)
     validate(instance=normalized, schema=DOCUMENT_SCHEMA)
 
     return normalized
@@ -2,19 +2,287 @@
 DocuVault - LLM Extractor
 Advanced document extraction using LLMs
 """
+import asyncio
 import json
+import random
 import re
 import time
-from typing import Dict, Any, Optional, Tuple
-from openai import OpenAI
-from anthropic import Anthropic
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import anthropic
+import openai
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
 from loguru import logger
 from pydantic import ValidationError
 
 from core.config import Config
+from core.llm_cache import llm_cache
 from extraction.schema import ExtractedDocument, DOCUMENT_SCHEMA
 
 
+_JSON_FENCE_RE = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL)
+_JSON_DECODER = json.JSONDecoder()
+
+_SCHEMA_EXAMPLE = {
+    "document_type": "invoice",
+    "document_number": "INV-001",
+    "dates": {
+        "issue_date": "2024-01-15",
+        "due_date": "2024-02-15"
+    },
+    "vendor": {
+        "name": "Acme Corp",
+        "email": "billing@acme.com",
+        "phone": "+1-555-0100"
+    },
+    "customer": {
+        "name": "Tech Solutions Inc"
+    },
+    "items": [
+        {
+            "description": "Consulting Services",
+            "quantity": 10,
+            "unit_price": "150.00",
+            "amount": "1500.00"
+        }
+    ],
+    "amounts": {
+        "subtotal": "1500.00",
+        "tax": "150.00",
+        "total": "1650.00",
+        "currency": "USD"
+    }
+}
+_SCHEMA_EXAMPLE_JSON = json.dumps(_SCHEMA_EXAMPLE, indent=2)
+
+# Rules and schema shared by the single and batched prompts
+_RULES_TEMPLATE = """RULES:
+1. Return ONLY valid JSON - no markdown, no explanations, no preamble
+2. Use null for missing/unknown fields
+3. Extract ALL dates in YYYY-MM-DD format
+4. For amounts, preserve the original format (e.g., "1,500.00" or "1500.00")
+5. Extract all line items with their details
+6. Identify document type: invoice, receipt, quote, purchase_order, bill, lease, etc.
+7. Extract both vendor (seller) and customer (buyer) information
+8. Include payment information if present
+9. Calculate or extract totals, subtotals, taxes
+10. Be thorough - capture ALL information present{type_hint}
+
+EXPECTED JSON SCHEMA:
+{schema}
+
+IMPORTANT:
+- "document_type" is REQUIRED
+- Extract ALL information visible in the document
+- For dates, try to parse into YYYY-MM-DD format
+- For items array, include every line item found
+- Preserve numerical precision in amounts"""
+
+# Every field of ExtractedDocument, with how to fill it
+_FIELD_REFERENCE = """FULL FIELD REFERENCE (any field not listed here is ignored):
+- document_type: invoice, receipt, quote, estimate, purchase_order, delivery_note, credit_note, statement, contract, lease, bill or unknown
+- document_number: the document's own number (Invoice No, Facture n°, Receipt #)
+- reference_number: any other reference printed on it (order, customer or contract reference)
+- po_number: the buyer's purchase order number, when quoted
+- dates.issue_date, dates.due_date, dates.delivery_date, dates.payment_date: YYYY-MM-DD; read DD/MM/YYYY for European documents and MM/DD/YYYY for US ones
+- vendor, customer: name, email, phone, tax_id (VAT number, SIRET, EIN...) and address with street, city, state, postal_code and country
+- items[]: description (required), quantity (a number), unit_price, amount, tax, discount
+- amounts: subtotal (before tax), tax, discount, shipping, total (tax included), paid, due, currency as an ISO code (EUR for €, USD for $, GBP for £)
+- payment: method (cash, card, transfer, check...), card_last_four, transaction_id, bank_account (IBAN or account number)
+- notes: free text worth keeping, such as a thank-you note or delivery instructions
+- terms: payment terms and penalties, e.g. "Net 30" or late payment interest
+- confidence_score: your confidence in the whole extraction, from 0 to 1; lower it for unreadable or ambiguous OCR
+
+OCR PITFALLS:
+- OCR often confuses O/0, l/1 and S/5 in numbers; use the line items and totals to check each other
+- A total printed twice (e.g. "Total" and "Net à payer") is one amount, not two
+- Page headers and footers repeat on every page; extract their content once
+- Do not guess a value that is not in the text; use null"""
+
+_WORKED_EXAMPLES = [
+    (
+        """FACTURE N° F-2024-0187
+Date : 03/09/2024    Échéance : 03/10/2024
+Imprimerie Martin SARL - 12 rue des Lilas, 69003 Lyon - SIRET 512 345 678 00021
+Client : Boulangerie Dupont, 4 place du Marché, 69001 Lyon
+Cartes de visite x500    0,08    40,00
+Flyers A5 x1000    0,12    120,00
+Total HT 160,00 €   TVA 20% 32,00 €   Total TTC 192,00 €
+Règlement par virement - IBAN FR76 3000 4000 0100 0012 3456 789
+Pénalités de retard : 3 fois le taux d'intérêt légal""",
+        {
+            "document_type": "invoice",
+            "document_number": "F-2024-0187",
+            "dates": {"issue_date": "2024-09-03", "due_date": "2024-10-03"},
+            "vendor": {
+                "name": "Imprimerie Martin SARL",
+                "tax_id": "512 345 678 00021",
+                "address": {"street": "12 rue des Lilas", "city": "Lyon", "postal_code": "69003", "country": "France"}
+            },
+            "customer": {
+                "name": "Boulangerie Dupont",
+                "address": {"street": "4 place du Marché", "city": "Lyon", "postal_code": "69001", "country": "France"}
+            },
+            "items": [
+                {"description": "Cartes de visite", "quantity": 500, "unit_price": "0,08", "amount": "40,00"},
+                {"description": "Flyers A5", "quantity": 1000, "unit_price": "0,12", "amount": "120,00"}
+            ],
+            "amounts": {"subtotal": "160,00", "tax": "32,00", "total": "192,00", "currency": "EUR"},
+            "payment": {"method": "transfer", "bank_account": "FR76 3000 4000 0100 0012 3456 789"},
+            "terms": "Pénalités de retard : 3 fois le taux d'intérêt légal",
+            "confidence_score": 0.95
+        }
+    ),
+    (
+        """TECHSTORE #042
+2024-11-18 14:32
+USB-C CABLE 2M        2 @ 9.99    19.98
+WIRELESS MOUSE                    24.50
+SUBTOTAL 44.48  TAX 8.25% 3.67
+TOTAL 48.15
+VISA ****4821  AUTH 839201
+THANK YOU FOR SHOPPING""",
+        {
+            "document_type": "receipt",
+            "dates": {"issue_date": "2024-11-18", "payment_date": "2024-11-18"},
+            "vendor": {"name": "TechStore"},
+            "items": [
+                {"description": "USB-C Cable 2M", "quantity": 2, "unit_price": "9.99", "amount": "19.98"},
+                {"description": "Wireless Mouse", "quantity": 1, "amount": "24.50"}
+            ],
+            "amounts": {"subtotal": "44.48", "tax": "3.67", "total": "48.15", "paid": "48.15", "currency": "USD"},
+            "payment": {"method": "card", "card_last_four": "4821", "transaction_id": "839201"},
+            "notes": "THANK YOU FOR SHOPPING",
+            "confidence_score": 0.9
+        }
+    ),
+]
+
+
+def _worked_examples() -> str:
+    """Worked examples section: OCR text and the expected JSON for each"""
+    return "WORKED EXAMPLES:\n\n" + "\n\n".join(
+        f"Example {i} OCR text:\n{ocr}\n\nExample {i} JSON:\n{json.dumps(expected, ensure_ascii=False)}"
+        for i, (ocr, expected) in enumerate(_WORKED_EXAMPLES, 1)
+    )
+
+
+# Single-document prompt: a static prefix (identical for every document,
+# so providers can cache it) followed by the per-document suffix. Prefixes
+# are only cached from 1024 tokens, which the field reference and worked
+# examples take this one past
+_PROMPT_PREFIX = """You are an expert document parser specialized in extracting structured data from invoices, receipts, and financial documents.
+
+TASK: Extract ALL relevant information from the OCR text below into a structured JSON format.
+
+""" + _RULES_TEMPLATE.format(type_hint="", schema=_SCHEMA_EXAMPLE_JSON) + "\n\n" + _FIELD_REFERENCE + "\n\n" + _worked_examples()
+
+_PROMPT_SUFFIX_TEMPLATE = """{type_hint}
+
+OCR TEXT:
+{ocr}
+
+Return the extracted data as JSON:"""
+
+_BATCHED_PROMPT_TEMPLATE = """You are an expert document parser specialized in extracting structured data from invoices, receipts, and financial documents.
+
+TASK: The input below is a JSON array of {n} separate documents, each with an "id" and its OCR text. Extract ALL relevant information from EACH document into a structured JSON format.
+
+{rules}
+
+OUTPUT:
+Return a JSON object {{"documents": [...]}} whose array has exactly {n} entries, one per input document, in the same order as the input ids. Never merge documents or carry data from one document into another.
+
+DOCUMENTS:
+{documents}
+
+Return the JSON object:"""
+
+_CORRECTION_NOTE = """
+
+NOTE: Your previous reply was not valid JSON matching the schema. Return ONLY the JSON object."""
+
+
+@lru_cache(maxsize=32)
+def _rules(document_type: Optional[str]) -> str:
+    """Prompt rules, with the document type hint if any (few distinct hints)"""
+    type_hint = f"\nDocument type hint: {document_type}" if document_type else ""
+    return _RULES_TEMPLATE.format(type_hint=type_hint, schema=_SCHEMA_EXAMPLE_JSON)
+
+
+def _strict_schema(node: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rewrite a pydantic JSON schema (in place) for OpenAI strict structured outputs
+    
+    Every object lists all its properties as required (optional ones stay
+    nullable) and forbids extra keys; defaults, titles, examples and
+    numeric bounds, which strict mode rejects, are dropped.
+    """
+    for key in ("default", "title", "example", "minimum", "maximum"):
+        node.pop(key, None)
+    
+    properties = node.get("properties")
+    if properties is not None:
+        node["required"] = list(properties)
+        node["additionalProperties"] = False
+        for child in properties.values():
+            _strict_schema(child)
+    
+    for child in node.get("$defs", {}).values():
+        _strict_schema(child)
+    for key in ("anyOf", "allOf"):
+        for child in node.get(key, []):
+            _strict_schema(child)
+    if isinstance(node.get("items"), dict):
+        _strict_schema(node["items"])
+    
+    return node
+
+
+_EXTRACTION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ExtractedDocument",
+        "schema": _strict_schema(ExtractedDocument.model_json_schema()),
+        "strict": True
+    }
+}
+
+
+def _anthropic_content(prompt: str, cached_prefix: Optional[str]) -> Any:
+    """User message content, with the static prefix as a cacheable first block"""
+    if not cached_prefix:
+        return prompt
+    return [
+        {"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": prompt}
+    ]
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors and dropped connections are worth retrying"""
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in (408, 409, 429) or status >= 500)
+
+
+def _retry_delay(error: Exception, attempt: int, corrected: bool) -> Optional[float]:
+    """
+    Seconds to wait before retrying after error, or None to give up
+    
+    Invalid JSON / schema (ValidationError is a ValueError) gets one
+    immediate retry with a correction note; transient API errors back off
+    exponentially with jitter; anything else fails at once.
+    """
+    if isinstance(error, ValueError):
+        return None if corrected else 0.0
+    if _is_retryable(error):
+        return min(2 ** attempt, 30) + random.random()
+    return None
+
+
 class LLMExtractor:
     """Extract structured data from OCR text using LLMs"""
     
@@ -31,12 +299,14 @@ class LLMExtractor:
             if not Config.OPENAI_API_KEY:
                 raise ValueError("OPENAI_API_KEY not configured")
             self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            self.aclient = AsyncOpenAI(api_key=Config.OPENAI_API_KEY)
             self.model = Config.DEFAULT_LLM_MODEL
             
         elif provider == "anthropic":
             if not Config.ANTHROPIC_API_KEY:
                 raise ValueError("ANTHROPIC_API_KEY not configured")
             self.client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+            self.aclient = AsyncAnthropic(api_key=Config.ANTHROPIC_API_KEY)
             self.model = "claude-3-5-sonnet-20241022"
             
         else:
@@ -44,7 +314,7 @@ class LLMExtractor:
         
         logger.info(f"LLM Extractor initialized: {provider} / {self.model}")
     
-    def build_extraction_prompt(self, ocr_text: str, document_type: Optional[str] = None) -> str:
+    def build_extraction_prompt(self, ocr_text: str, document_type: Optional[str] = None) -> Tuple[str, str]:
         """
         Build extraction prompt with schema
         
@@ -53,73 +323,28 @@ class LLMExtractor:
             document_type: Optional document type hint
             
         Returns:
-            Formatted prompt
+            (static prefix, document suffix); the prompt is their concatenation
         """
-        schema_example = {
-            "document_type": "invoice",
-            "document_number": "INV-001",
-            "dates": {
-                "issue_date": "2024-01-15",
-                "due_date": "2024-02-15"
-            },
-            "vendor": {
-                "name": "Acme Corp",
-                "email": "billing@acme.com",
-                "phone": "+1-555-0100"
-            },
-            "customer": {
-                "name": "Tech Solutions Inc"
-            },
-            "items": [
-                {
-                    "description": "Consulting Services",
-                    "quantity": 10,
-                    "unit_price": "150.00",
-                    "amount": "1500.00"
-                }
-            ],
-            "amounts": {
-                "subtotal": "1500.00",
-                "tax": "150.00",
-                "total": "1650.00",
-                "currency": "USD"
-            }
-        }
-        
-        type_hint = f"\nDocument type hint: {document_type}" if document_type else ""
-        
-        prompt = f"""You are an expert document parser specialized in extracting structured data from invoices, receipts, and financial documents.
-
-TASK: Extract ALL relevant information from the OCR text below into a structured JSON format.
-
-RULES:
-1. Return ONLY valid JSON - no markdown, no explanations, no preamble
-2. Use null for missing/unknown fields
-3. Extract ALL dates in YYYY-MM-DD format
-4. For amounts, preserve the original format (e.g., "1,500.00" or "1500.00")
-5. Extract all line items with their details
-6. Identify document type: invoice, receipt, quote, purchase_order, bill, lease, etc.
-7. Extract both vendor (seller) and customer (buyer) information
-8. Include payment information if present
-9. Calculate or extract totals, subtotals, taxes
-10. Be thorough - capture ALL information present{type_hint}
-
-EXPECTED JSON SCHEMA:
-{json.dumps(schema_example, indent=2)}
-
-IMPORTANT:
-- "document_type" is REQUIRED
-- Extract ALL information visible in the document
-- For dates, try to parse into YYYY-MM-DD format
-- For items array, include every line item found
-- Preserve numerical precision in amounts
-
-OCR TEXT:
-{ocr_text}
-
-Return the extracted data as JSON:"""
+        type_hint = f"\n\nDocument type hint: {document_type}" if document_type else ""
+        return _PROMPT_PREFIX, _PROMPT_SUFFIX_TEMPLATE.format(type_hint=type_hint, ocr=ocr_text)
+    
+    def build_batched_prompt(self, ocr_texts: List[str], document_type: Optional[str] = None) -> str:
+        """
+        Build one extraction prompt covering several documents
         
-        return prompt
+        Args:
+            ocr_texts: OCR extracted text of each document
+            document_type: Optional document type hint (shared by all documents)
+            
+        Returns:
+            Formatted prompt asking for {"documents": [...]} in input order
+        """
+        documents = [{"id": i, "ocr": text} for i, text in enumerate(ocr_texts)]
+        return _BATCHED_PROMPT_TEMPLATE.format(
+            n=len(ocr_texts),
+            rules=_rules(document_type),
+            documents=json.dumps(documents, ensure_ascii=False)
+        )
     
     def extract_json_from_response(self, text: str) -> Dict[str, Any]:
         """
@@ -132,19 +357,21 @@ Return the extracted data as JSON:"""
             Parsed JSON dict
         """
         # Try to find JSON in markdown code blocks
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+        json_match = _JSON_FENCE_RE.search(text)
         if json_match:
             return json.loads(json_match.group(1))
         
-        # Try to find raw JSON
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(0))
+        # Try to find raw JSON: decode the object starting at the first brace
+        # (single pass, string-aware, ignores any trailing text)
+        start = text.find("{")
+        if start != -1:
+            return _JSON_DECODER.raw_decode(text, start)[0]
         
         raise ValueError("No valid JSON found in LLM response")
     
-    def call_openai(self, prompt: str) -> str:
-        """Call OpenAI API"""
+    def call_openai(self, prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Call OpenAI API (response_format: JSON mode or a structured-output schema)"""
+        kwargs = {"response_format": response_format} if response_format else {}
         response = self.client.chat.completions.create(
             model=self.model,
             messages=[
@@ -158,27 +385,133 @@ Return the extracted data as JSON:"""
                 }
             ],
             temperature=Config.LLM_TEMPERATURE,
-            max_tokens=Config.LLM_MAX_TOKENS
+            max_tokens=Config.LLM_MAX_TOKENS,
+            **kwargs
         )
         
         return response.choices[0].message.content or ""
     
-    def call_anthropic(self, prompt: str) -> str:
-        """Call Anthropic API"""
+    def call_anthropic(self, prompt: str, cached_prefix: Optional[str] = None) -> str:
+        """Call Anthropic API (cached_prefix: static start of the prompt, marked for prompt caching)"""
         response = self.client.messages.create(
             model=self.model,
             max_tokens=Config.LLM_MAX_TOKENS,
             temperature=Config.LLM_TEMPERATURE,
             messages=[
+                {
+                    "role": "user",
+                    "content": _anthropic_content(prompt, cached_prefix)
+                }
+            ]
+        )
+        
+        return response.content[0].text
+    
+    async def acall_openai(self, prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Call OpenAI API without blocking the event loop"""
+        kwargs = {"response_format": response_format} if response_format else {}
+        response = await self.aclient.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a precise document extraction system. Return only valid JSON."
+                },
                 {
                     "role": "user",
                     "content": prompt
                 }
+            ],
+            temperature=Config.LLM_TEMPERATURE,
+            max_tokens=Config.LLM_MAX_TOKENS,
+            **kwargs
+        )
+        
+        return response.choices[0].message.content or ""
+    
+    async def acall_anthropic(self, prompt: str, cached_prefix: Optional[str] = None) -> str:
+        """Call Anthropic API without blocking the event loop"""
+        response = await self.aclient.messages.create(
+            model=self.model,
+            max_tokens=Config.LLM_MAX_TOKENS,
+            temperature=Config.LLM_TEMPERATURE,
+            messages=[
+                {
+                    "role": "user",
+                    "content": _anthropic_content(prompt, cached_prefix)
+                }
             ]
         )
         
         return response.content[0].text
     
+    def _cache_lookup(
+        self, 
+        ocr_text: str, 
+        document_type: Optional[str]
+    ) -> Tuple[str, Optional[ExtractedDocument]]:
+        """(cache key, cached extraction or None) for an OCR text"""
+        # Identical OCR text (reprocessing, duplicate scans) reuses the earlier extraction
+        cache_key = llm_cache.make_key("extract", self.model, document_type or "", ocr_text)
+        if Config.LLM_CACHE_ENABLED:
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Extraction cache hit")
+                return cache_key, ExtractedDocument.model_validate_json(cached)
+        return cache_key, None
+    
+    def _parse_response(
+        self, 
+        response_text: str, 
+        cache_key: str, 
+        start_time: float
+    ) -> Tuple[ExtractedDocument, float]:
+        """Validate an extraction reply and cache it; raises on invalid JSON or schema"""
+        if self.provider == "openai":
+            # Structured output: the reply is exactly the schema's JSON
+            document = ExtractedDocument.model_validate_json(response_text)
+        else:
+            document = ExtractedDocument.model_validate(self.extract_json_from_response(response_text))
+        # "unknown" results are not cached, so a later run can do better
+        if Config.LLM_CACHE_ENABLED and document.document_type != "unknown":
+            llm_cache.set(cache_key, document.model_dump_json())
+        
+        processing_time = time.monotonic() - start_time
+        
+        logger.success(
+            f"Extraction completed: type={document.document_type}, "
+            f"items={len(document.items)}, time={processing_time:.2f}s"
+        )
+        
+        return document, processing_time
+    
+    def _extract(
+        self, 
+        ocr_text: str, 
+        document_type: Optional[str] = None,
+        correction: bool = False
+    ) -> Tuple[ExtractedDocument, float]:
+        """extract() without its error handling: API and parse errors are raised"""
+        start_time = time.monotonic()
+        
+        cache_key, cached = self._cache_lookup(ocr_text, document_type)
+        if cached is not None:
+            return cached, time.monotonic() - start_time
+        
+        # Build prompt
+        prefix, suffix = self.build_extraction_prompt(ocr_text, document_type)
+        if correction:
+            suffix += _CORRECTION_NOTE
+        
+        # Call LLM (OpenAI caches a long enough identical prefix automatically)
+        logger.info(f"Calling {self.provider} for extraction...")
+        if self.provider == "openai":
+            response_text = self.call_openai(prefix + suffix, _EXTRACTION_RESPONSE_FORMAT)
+        else:
+            response_text = self.call_anthropic(suffix, cached_prefix=prefix)
+        
+        return self._parse_response(response_text, cache_key, start_time)
+    
     def extract(
         self, 
         ocr_text: str, 
@@ -194,43 +527,20 @@ Return the extracted data as JSON:"""
         Returns:
             Tuple of (ExtractedDocument, processing_time)
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
-            # Build prompt
-            prompt = self.build_extraction_prompt(ocr_text, document_type)
-            
-            # Call LLM
-            logger.info(f"Calling {self.provider} for extraction...")
-            if self.provider == "openai":
-                response_text = self.call_openai(prompt)
-            else:
-                response_text = self.call_anthropic(prompt)
-            
-            # Extract JSON
-            raw_json = self.extract_json_from_response(response_text)
-            
-            # Validate with Pydantic
-            document = ExtractedDocument(**raw_json)
-            
-            processing_time = time.time() - start_time
-            
-            logger.success(
-                f"Extraction completed: type={document.document_type}, "
-                f"items={len(document.items)}, time={processing_time:.2f}s"
-            )
-            
-            return document, processing_time
+            return self._extract(ocr_text, document_type)
             
         except ValidationError as e:
             logger.error(f"Validation error: {e}")
             # Return minimal valid document
-            processing_time = time.time() - start_time
+            processing_time = time.monotonic() - start_time
             return ExtractedDocument(document_type="unknown"), processing_time
             
         except Exception as e:
             logger.error(f"LLM extraction failed: {e}")
-            processing_time = time.time() - start_time
+            processing_time = time.monotonic() - start_time
             return ExtractedDocument(document_type="unknown"), processing_time
     
     def extract_with_retry(
@@ -242,6 +552,11 @@ Return the extracted data as JSON:"""
         """
         Extract with retry logic
         
+        Rate limits and transient API errors are retried with exponential
+        backoff, an invalid reply once with a correction note, and anything
+        else not at all. A reply that validates is returned as is, even
+        with document_type "unknown".
+        
         Args:
             ocr_text: OCR extracted text
             document_type: Optional document type hint
@@ -250,29 +565,167 @@ Return the extracted data as JSON:"""
         Returns:
             Tuple of (ExtractedDocument, total_processing_time)
         """
-        total_time = 0.0
+        start_time = time.monotonic()
+        corrected = False
         last_error = None
         
         for attempt in range(max_retries + 1):
             try:
-                document, processing_time = self.extract(ocr_text, document_type)
-                total_time += processing_time
+                document, _ = self._extract(ocr_text, document_type, correction=corrected)
+                return document, time.monotonic() - start_time
                 
-                # Check if extraction was successful
-                if document.document_type != "unknown":
-                    return document, total_time
-                
-                if attempt < max_retries:
-                    logger.warning(f"Attempt {attempt + 1} failed, retrying...")
-                    
             except Exception as e:
                 last_error = e
-                if attempt < max_retries:
-                    logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying...")
+                delay = _retry_delay(e, attempt, corrected)
+                if delay is None or attempt == max_retries:
+                    break
+                corrected = corrected or isinstance(e, ValueError)
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
         
         # All retries failed
         logger.error(f"All extraction attempts failed. Last error: {last_error}")
-        return ExtractedDocument(document_type="unknown"), total_time
+        return ExtractedDocument(document_type="unknown"), time.monotonic() - start_time
+    
+    async def _aextract(
+        self, 
+        ocr_text: str, 
+        document_type: Optional[str] = None,
+        correction: bool = False
+    ) -> Tuple[ExtractedDocument, float]:
+        """aextract() without its error handling: API and parse errors are raised"""
+        start_time = time.monotonic()
+        
+        # The cache is SQLite/Redis; keep its I/O off the event loop
+        cache_key, cached = await asyncio.to_thread(self._cache_lookup, ocr_text, document_type)
+        if cached is not None:
+            return cached, time.monotonic() - start_time
+        
+        prefix, suffix = self.build_extraction_prompt(ocr_text, document_type)
+        if correction:
+            suffix += _CORRECTION_NOTE
+        
+        logger.info(f"Calling {self.provider} for extraction...")
+        if self.provider == "openai":
+            response_text = await self.acall_openai(prefix + suffix, _EXTRACTION_RESPONSE_FORMAT)
+        else:
+            response_text = await self.acall_anthropic(suffix, cached_prefix=prefix)
+        
+        return await asyncio.to_thread(self._parse_response, response_text, cache_key, start_time)
+    
+    async def aextract(
+        self, 
+        ocr_text: str, 
+        document_type: Optional[str] = None
+    ) -> Tuple[ExtractedDocument, float]:
+        """
+        Async version of extract(): many documents can await the LLM concurrently
+        
+        Args:
+            ocr_text: OCR extracted text
+            document_type: Optional document type hint
+            
+        Returns:
+            Tuple of (ExtractedDocument, processing_time)
+        """
+        start_time = time.monotonic()
+        
+        try:
+            return await self._aextract(ocr_text, document_type)
+            
+        except ValidationError as e:
+            logger.error(f"Validation error: {e}")
+            return ExtractedDocument(document_type="unknown"), time.monotonic() - start_time
+            
+        except Exception as e:
+            logger.error(f"LLM extraction failed: {e}")
+            return ExtractedDocument(document_type="unknown"), time.monotonic() - start_time
+    
+    async def aextract_with_retry(
+        self, 
+        ocr_text: str, 
+        document_type: Optional[str] = None,
+        max_retries: int = 2
+    ) -> Tuple[ExtractedDocument, float]:
+        """Async version of extract_with_retry(), with the same retry policy"""
+        start_time = time.monotonic()
+        corrected = False
+        last_error = None
+        
+        for attempt in range(max_retries + 1):
+            try:
+                document, _ = await self._aextract(ocr_text, document_type, correction=corrected)
+                return document, time.monotonic() - start_time
+                
+            except Exception as e:
+                last_error = e
+                delay = _retry_delay(e, attempt, corrected)
+                if delay is None or attempt == max_retries:
+                    break
+                corrected = corrected or isinstance(e, ValueError)
+                logger.warning(f"Attempt {attempt + 1} failed: {e}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+        
+        logger.error(f"All extraction attempts failed. Last error: {last_error}")
+        return ExtractedDocument(document_type="unknown"), time.monotonic() - start_time
+    
+    def extract_many(
+        self, 
+        ocr_texts: List[str], 
+        document_type: Optional[str] = None
+    ) -> List[Tuple[ExtractedDocument, float]]:
+        """
+        Extract several documents with a single LLM call
+        
+        Falls back to extract_with_retry() for every document if the batched
+        reply cannot be parsed, and for any single entry that fails validation.
+        
+        Args:
+            ocr_texts: OCR extracted text of each document
+            document_type: Optional document type hint
+            
+        Returns:
+            List of (ExtractedDocument, processing_time), in input order;
+            the time of the shared call is split evenly between documents
+        """
+        if len(ocr_texts) == 1:
+            return [self.extract_with_retry(ocr_texts[0], document_type)]
+        
+        start_time = time.monotonic()
+        
+        try:
+            prompt = self.build_batched_prompt(ocr_texts, document_type)
+            
+            logger.info(f"Calling {self.provider} for batched extraction of {len(ocr_texts)} documents...")
+            if self.provider == "openai":
+                # JSON mode: the reply is the object itself, no regex needed
+                raw_json = json.loads(self.call_openai(prompt, {"type": "json_object"}))
+            else:
+                raw_json = self.extract_json_from_response(self.call_anthropic(prompt))
+            
+            entries = raw_json["documents"]
+            if len(entries) != len(ocr_texts):
+                raise ValueError(f"expected {len(ocr_texts)} documents, got {len(entries)}")
+                
+        except Exception as e:
+            logger.warning(f"Batched extraction failed ({e}), extracting documents one by one")
+            return [self.extract_with_retry(text, document_type) for text in ocr_texts]
+        
+        share = (time.monotonic() - start_time) / len(ocr_texts)
+        results = []
+        for text, entry in zip(ocr_texts, entries):
+            try:
+                document = ExtractedDocument.model_validate(entry)
+            except ValidationError as e:
+                logger.warning(f"Batched entry failed validation ({e}), extracting it alone")
+                document, retry_time = self.extract_with_retry(text, document_type)
+                results.append((document, share + retry_time))
+                continue
+            results.append((document, share))
+        
+        logger.success(f"Batched extraction completed: {len(ocr_texts)} documents, time={time.monotonic() - start_time:.2f}s")
+        
+        return results
 
 
 # Global extractor instance
@@ -1,22 +1,9 @@
-def enforce_object(data: dict, key: str):
-    if key not in data or data[key] is None:
-        data[key] = {}
-    return data
+from typing import Union
 
+from extraction.schema import ExtractedDocument
 
-def normalize_document(raw: dict) -> dict:
-    # Document type
-    raw.setdefault("document_type", "invoice")
 
-    # Enforce object structure
-    for field in ["dates", "parties", "amounts"]:
-        raw = enforce_object(raw, field)
-
-    # Parties
-    raw["parties"].setdefault("vendor", {})
-    raw["parties"].setdefault("customer", {})
-
-    # Items
-    raw.setdefault("items", [])
-
-    return raw
+def normalize_document(raw: Union[dict, ExtractedDocument]) -> dict:
+    # Model defaults fill missing objects (dates, amounts) and lists (items),
+    # and field types are coerced; an already validated model is not re-validated
+    return ExtractedDocument.model_validate(raw).model_dump(mode="json")
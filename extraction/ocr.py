@@ -2,9 +2,16 @@
 DocuVault - OCR Engine
 Robust OCR processing with PaddleOCR
 """
+import gc
+import multiprocessing
+import tempfile
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice, repeat
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, Any, Iterable, List
 from paddleocr import PaddleOCR
 from PIL import Image
 import cv2
@@ -12,6 +19,9 @@ import numpy as np
 from loguru import logger
 
 from core.config import Config
+from extraction._threshold import integral_threshold
+from extraction import ocr_worker
+from extraction.ocr_worker import PADDLE_OPTIONS, ocr_page, ocr_pdf_page
 from extraction.pdf_converter import pdf_converter
 
 
@@ -21,23 +31,108 @@ class OCREngine:
     def __init__(self):
         """Initialize OCR engine"""
         logger.info("Initializing PaddleOCR engine...")
-        self.engine = PaddleOCR(
-            lang=Config.OCR_LANGUAGE,
-            use_gpu=Config.OCR_USE_GPU,
-            show_log=False,
-            use_angle_cls=True,  # Enable text orientation detection
-            det_db_thresh=0.3,   # Detection threshold
-            det_db_box_thresh=0.5,  # Box threshold
-            rec_batch_num=6      # Batch size for recognition
-        )
+        self.engine = PaddleOCR(**PADDLE_OPTIONS)
+        # PaddleOCR predictors are not thread-safe; serialize inference calls
+        self._lock = threading.Lock()
+        # Paddle's memory grows with every call; rebuild the engine periodically
+        self._calls = 0
+        self._max_calls = Config.OCR_ENGINE_MAX_CALLS
+        # Multi-page PDFs: long-lived worker processes holding one engine each,
+        # started on first use (or up front by start_page_pool)
+        self._page_pool: Optional[ProcessPoolExecutor] = None
+        self._page_pool_lock = threading.Lock()
         logger.success("OCR engine initialized")
     
-    def preprocess_image(self, image_path: str) -> np.ndarray:
+    def _count_calls(self, n: int):
+        """Account for n upcoming engine calls, recycling the engine every _max_calls (lock held)"""
+        self._calls += n
+        if self._calls > self._max_calls:
+            logger.info(f"Recycling OCR engine after {self._max_calls} calls")
+            del self.engine
+            gc.collect()
+            self.engine = PaddleOCR(**PADDLE_OPTIONS)
+            self._calls = n
+    
+    def _run_ocr(self, image: Any, cls: bool = True) -> list:
+        """Serialized engine.ocr() call (cls: run the angle classifier, if loaded)"""
+        with self._lock:
+            self._count_calls(1)
+            return self.engine.ocr(image, cls=cls and Config.OCR_USE_ANGLE_CLS)
+    
+    def _run_ocr_pages(self, images: Iterable[Any], cls: bool = False) -> List[list]:
+        """
+        Serialized engine.ocr() over the pages of one document
+        
+        PaddleOCR only accepts a list of images without detection, so pages
+        are still recognised one by one, but back to back: the lock is taken
+        once per OCR_MAX_BATCH_PAGES pages instead of interleaving with
+        other documents' calls.
+        """
+        page_results = []
+        images = iter(images)
+        while True:
+            batch = list(islice(images, Config.OCR_MAX_BATCH_PAGES))
+            if not batch:
+                return page_results
+            with self._lock:
+                self._count_calls(len(batch))
+                for image in batch:
+                    logger.info(f"Processing page {len(page_results) + 1}")
+                    page_results.append(self.engine.ocr(image, cls=cls and Config.OCR_USE_ANGLE_CLS))
+    
+    def _get_page_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool for PDF pages, or None when configured for one worker"""
+        if Config.OCR_PAGE_WORKERS <= 1:
+            return None
+        
+        with self._page_pool_lock:
+            if self._page_pool is None:
+                # spawn: workers build their own engine instead of inheriting
+                # this process's (fork-unsafe) Paddle state
+                self._page_pool = ProcessPoolExecutor(
+                    max_workers=Config.OCR_PAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=ocr_worker.init_worker
+                )
+            return self._page_pool
+    
+    def _map_pages(self, fn, *iterables) -> Optional[List[list]]:
+        """
+        page_pool.map() over a document's pages, or None when there is no pool
+        
+        A dead worker (e.g. Paddle OOM) breaks the whole executor: it is
+        discarded so the next document gets a fresh pool, and None sends this
+        document to the in-process engine.
+        """
+        page_pool = self._get_page_pool()
+        if page_pool is None:
+            return None
+        
+        logger.info(f"Running page OCR on {Config.OCR_PAGE_WORKERS} worker processes")
+        try:
+            return list(page_pool.map(fn, *iterables))
+        except BrokenProcessPool as e:
+            logger.error(f"OCR page pool broken ({e}); restarting it, OCR'ing this document in-process")
+            with self._page_pool_lock:
+                if self._page_pool is page_pool:
+                    self._page_pool = None
+            page_pool.shutdown(wait=False, cancel_futures=True)
+            return None
+    
+    def start_page_pool(self):
+        """Start the page workers now, so their model load is off the first PDF's path"""
+        page_pool = self._get_page_pool()
+        if page_pool:
+            for _ in range(Config.OCR_PAGE_WORKERS):
+                page_pool.submit(ocr_worker.ready)
+    
+    def preprocess_image(self, image_path: str, method: str = Config.OCR_THRESHOLD_METHOD) -> np.ndarray:
         """
         Preprocess image for better OCR results
         
         Args:
             image_path: Path to image file
+            method: Thresholding, "adaptive" (OpenCV Gaussian) or "integral" (Bradley-Roth)
             
         Returns:
             Preprocessed image array
@@ -52,15 +147,22 @@ class OCREngine:
             # Convert to grayscale
             gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
             
-            # Apply denoising
-            denoised = cv2.fastNlMeansDenoising(gray)
+            # Apply denoising: a 3x3 Gaussian is enough ahead of thresholding;
+            # non-local means is far slower and only used when configured
+            if Config.OCR_HEAVY_DENOISE:
+                denoised = cv2.fastNlMeansDenoising(gray)
+            else:
+                denoised = cv2.GaussianBlur(gray, (3, 3), 0)
             
             # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(
-                denoised, 255, 
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                cv2.THRESH_BINARY, 11, 2
-            )
+            if method == "integral":
+                thresh = integral_threshold(denoised)
+            else:
+                thresh = cv2.adaptiveThreshold(
+                    denoised, 255, 
+                    cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                    cv2.THRESH_BINARY, 11, 2
+                )
             
             return thresh
             
@@ -68,6 +170,32 @@ class OCREngine:
             logger.warning(f"Image preprocessing failed: {e}. Using original.")
             return cv2.imread(image_path)
     
+    @staticmethod
+    def _parse_page(page: Optional[list]) -> Dict[str, Any]:
+        """
+        Walk one page of PaddleOCR results once, into struct-of-arrays form
+        
+        Args:
+            page: Lines of one page, each [bounding box, (text, confidence)]
+            
+        Returns:
+            Dict with "texts" (list), "confs" (float32 array) and
+            "boxes" (float32 array of shape (n, 4, 2))
+        """
+        texts, confs, boxes = [], [], []
+        for line in page or ():
+            if len(line) >= 2:
+                texts.append(line[1][0])
+                boxes.append(line[0])
+                if len(line[1]) >= 2:
+                    confs.append(line[1][1])
+        
+        return {
+            "texts": texts,
+            "confs": np.asarray(confs, dtype=np.float32),
+            "boxes": np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+        }
+    
     def calculate_confidence(self, results: list) -> float:
         """
         Calculate average confidence score from OCR results
@@ -81,19 +209,14 @@ class OCREngine:
         if not results or not results[0]:
             return 0.0
         
-        confidences = []
-        for page in results:
-            for line in page:
-                if len(line) >= 2 and len(line[1]) >= 2:
-                    conf = line[1][1]  # Confidence score
-                    confidences.append(conf)
-        
-        return sum(confidences) / len(confidences) if confidences else 0.0
+        confidences = np.concatenate([self._parse_page(page)["confs"] for page in results])
+        return float(confidences.mean()) if confidences.size else 0.0
     
     def extract_text(
         self, 
         image_path: str, 
-        preprocess: bool = True
+        preprocess: bool = True,
+        cls: Optional[bool] = None
     ) -> Tuple[str, float, Dict[str, Any]]:
         """
         Extract text from image using OCR
@@ -101,6 +224,8 @@ class OCREngine:
         Args:
             image_path: Path to image file
             preprocess: Whether to preprocess image
+            cls: Run the text angle classifier (default: on for images, off
+                 for PDFs, whose pages render upright)
             
         Returns:
             Tuple of (extracted_text, confidence_score, metadata)
@@ -114,37 +239,29 @@ class OCREngine:
             
             # Handle PDF files
             if Path(image_path).suffix.lower() == '.pdf':
-                return self._extract_from_pdf(image_path)
+                return self._extract_from_pdf(image_path, cls=bool(cls))
             
             # Preprocess if requested
             if preprocess:
                 logger.info(f"Preprocessing image: {image_path}")
                 processed_img = self.preprocess_image(image_path)
-                # Save temporarily
-                temp_path = str(Path(image_path).parent / f"_temp_{Path(image_path).name}")
-                cv2.imwrite(temp_path, processed_img)
-                ocr_input = temp_path
+                # PaddleOCR takes the array directly (3-channel BGR), no temp file
+                if processed_img.ndim == 2:
+                    processed_img = cv2.cvtColor(processed_img, cv2.COLOR_GRAY2BGR)
+                ocr_input = processed_img
             else:
                 ocr_input = image_path
             
             # Run OCR
             logger.info(f"Running OCR on: {Path(image_path).name}")
-            results = self.engine.ocr(ocr_input, cls=True)
+            results = self._run_ocr(ocr_input, cls=cls is not False)
             
-            # Extract text
-            text_lines = []
-            boxes = []
-            
-            if results and results[0]:
-                for line in results[0]:
-                    if len(line) >= 2:
-                        # line[0] = bounding box, line[1] = (text, confidence)
-                        text = line[1][0]
-                        text_lines.append(text)
-                        boxes.append(line[0])
+            # Extract text, boxes and confidences in a single pass
+            parsed = self._parse_page(results[0] if results else None)
+            text_lines = parsed["texts"]
             
             extracted_text = "\n".join(text_lines)
-            confidence = self.calculate_confidence(results)
+            confidence = float(parsed["confs"].mean()) if parsed["confs"].size else 0.0
             processing_time = time.time() - start_time
             
             # Metadata
@@ -153,13 +270,9 @@ class OCREngine:
                 "confidence": confidence,
                 "total_lines": len(text_lines),
                 "preprocessed": preprocess,
-                "boxes_count": len(boxes)
+                "boxes_count": parsed["boxes"].shape[0]
             }
             
-            # Cleanup temp file
-            if preprocess and Path(temp_path).exists():
-                Path(temp_path).unlink()
-            
             logger.success(
                 f"OCR completed: {len(text_lines)} lines, "
                 f"confidence: {confidence:.2%}, "
@@ -178,12 +291,43 @@ class OCREngine:
                 "error": str(e)
             }
     
-    def _extract_from_pdf(self, pdf_path: str) -> Tuple[str, float, Dict[str, Any]]:
+    def _ocr_pdf_pages(self, pdf_path: str, dpi: int, cls: bool = False) -> List[list]:
+        """
+        Raw PaddleOCR results of every PDF page, in page order
+        
+        Pages are independent, so multi-page documents are spread over the
+        page worker processes. With PyMuPDF pages are rendered straight to
+        arrays (in the worker, for parallel OCR); only pdf2image goes through
+        temporary image files.
+        """
+        if pdf_converter.method == "pymupdf":
+            page_count = pdf_converter.page_count(pdf_path)
+            if page_count > 1:
+                page_results = self._map_pages(
+                    ocr_pdf_page, repeat(pdf_path), range(page_count), repeat(dpi), repeat(cls)
+                )
+                if page_results is not None:
+                    return page_results
+            
+            return self._run_ocr_pages(pdf_converter.iter_page_arrays(pdf_path, dpi=dpi), cls=cls)
+        
+        # Per-document scratch directory (tmpfs when available), removed with its pages
+        with tempfile.TemporaryDirectory(dir=Config.OCR_SCRATCH_DIR) as scratch_dir:
+            image_paths = pdf_converter.convert_to_images(pdf_path, output_dir=scratch_dir, dpi=dpi)
+            if len(image_paths) > 1:
+                page_results = self._map_pages(ocr_page, image_paths, repeat(cls))
+                if page_results is not None:
+                    return page_results
+            
+            return self._run_ocr_pages(image_paths, cls=cls)
+    
+    def _extract_from_pdf(self, pdf_path: str, cls: bool = False) -> Tuple[str, float, Dict[str, Any]]:
         """
         Extract text from PDF by converting to images first
         
         Args:
             pdf_path: Path to PDF file
+            cls: Run the text angle classifier (rendered pages are upright)
             
         Returns:
             Tuple of (extracted_text, confidence_score, metadata)
@@ -196,30 +340,21 @@ class OCREngine:
         try:
             logger.info(f"Processing PDF: {Path(pdf_path).name}")
             
-            # Convert PDF to images
-            image_paths = pdf_converter.convert_to_images(pdf_path, dpi=300)
+            page_results = self._ocr_pdf_pages(pdf_path, dpi=300, cls=cls)
             
-            if not image_paths:
+            if not page_results:
                 raise ValueError("PDF conversion produced no images")
             
-            # Extract text from each page
+            # Extract text from each page, in page order
             all_text = []
             all_confidences = []
             total_lines = 0
             
-            for i, image_path in enumerate(image_paths, 1):
-                logger.info(f"Processing page {i}/{len(image_paths)}")
-                
-                # Run OCR on page image
-                results = self.engine.ocr(image_path, cls=True)
-                
+            for i, results in enumerate(page_results, 1):
                 # Extract text
                 if results and results[0]:
-                    page_lines = []
-                    for line in results[0]:
-                        if len(line) >= 2:
-                            text = line[1][0]
-                            page_lines.append(text)
+                    parsed = self._parse_page(results[0])
+                    page_lines = parsed["texts"]
                     
                     if page_lines:
                         all_text.append(f"\n--- Page {i} ---\n")
@@ -227,11 +362,8 @@ class OCREngine:
                         total_lines += len(page_lines)
                     
                     # Calculate page confidence
-                    page_confidence = self.calculate_confidence(results)
-                    all_confidences.append(page_confidence)
-            
-            # Cleanup temporary images
-            pdf_converter.cleanup_temp_images(image_paths)
+                    confs = parsed["confs"]
+                    all_confidences.append(float(confs.mean()) if confs.size else 0.0)
             
             # Combine results
             extracted_text = "\n".join(all_text)
@@ -242,13 +374,13 @@ class OCREngine:
                 "processing_time": processing_time,
                 "confidence": avg_confidence,
                 "total_lines": total_lines,
-                "total_pages": len(image_paths),
+                "total_pages": len(page_results),
                 "preprocessed": False,
                 "is_pdf": True
             }
             
             logger.success(
-                f"PDF OCR completed: {len(image_paths)} pages, "
+                f"PDF OCR completed: {len(page_results)} pages, "
                 f"{total_lines} lines, "
                 f"confidence: {avg_confidence:.2%}, "
                 f"time: {processing_time:.2f}s"
@@ -271,7 +403,8 @@ class OCREngine:
         """
         Extract text with fallback strategy
         
-        First tries with preprocessing, then without if confidence is low
+        First tries the raw image (clean scans pass here, skipping
+        preprocessing entirely), then with preprocessing if confidence is low
         
         Args:
             image_path: Path to image file
@@ -279,18 +412,19 @@ class OCREngine:
         Returns:
             Tuple of (extracted_text, confidence_score, metadata)
         """
-        # Try with preprocessing
-        text, confidence, metadata = self.extract_text(image_path, preprocess=True)
+        # Try without preprocessing
+        text, confidence, metadata = self.extract_text(image_path, preprocess=False)
         
-        # If confidence is low, try without preprocessing
-        if confidence < Config.OCR_CONFIDENCE_THRESHOLD:
+        # If confidence is low, try with preprocessing (PDF pages are never
+        # preprocessed, so a second pass would only repeat the same OCR)
+        if confidence < Config.OCR_CONFIDENCE_THRESHOLD and not metadata.get("is_pdf"):
             logger.warning(
                 f"Low confidence ({confidence:.2%}), "
-                f"retrying without preprocessing..."
+                f"retrying with preprocessing..."
             )
             text_alt, confidence_alt, metadata_alt = self.extract_text(
                 image_path, 
-                preprocess=False
+                preprocess=True
             )
             
             # Use better result
@@ -0,0 +1,57 @@
+"""
+DocuVault - OCR Page Worker
+Process-pool entry point for parallel PDF page OCR
+"""
+import gc
+from typing import Any, Dict, Optional
+from paddleocr import PaddleOCR
+
+from core.config import Config
+
+
+# Shared by the in-process engine and the page workers
+PADDLE_OPTIONS: Dict[str, Any] = dict(
+    lang=Config.OCR_LANGUAGE,
+    use_gpu=Config.OCR_USE_GPU,
+    show_log=False,
+    use_angle_cls=Config.OCR_USE_ANGLE_CLS,  # Text orientation model (not loaded when off)
+    det_db_thresh=0.3,   # Detection threshold
+    det_db_box_thresh=0.5,  # Box threshold
+    rec_batch_num=Config.OCR_REC_BATCH_NUM  # Batch size for recognition
+)
+
+# Created in the worker process itself: Paddle predictors must not be forked
+_engine: Optional[PaddleOCR] = None
+_calls = 0
+
+
+def init_worker():
+    """Pool initializer: load this worker's engine once, before its first page"""
+    global _engine, _calls
+    _engine = PaddleOCR(**PADDLE_OPTIONS)
+    _calls = 0
+
+
+def ready() -> bool:
+    """No-op task; submitting one per worker makes the pool start them all"""
+    return True
+
+
+def ocr_page(image: Any, cls: bool = False) -> list:
+    """OCR one page image (path or array) with this process's engine (raw PaddleOCR results)"""
+    global _engine, _calls
+    if _calls >= Config.OCR_ENGINE_MAX_CALLS:
+        # Same periodic rebuild as OCREngine, to bound Paddle's memory growth
+        _engine = None
+        gc.collect()
+    if _engine is None:
+        _engine = PaddleOCR(**PADDLE_OPTIONS)
+        _calls = 0
+    _calls += 1
+    return _engine.ocr(image, cls=cls and Config.OCR_USE_ANGLE_CLS)
+
+
+def ocr_pdf_page(pdf_path: str, page_number: int, dpi: int = 300, cls: bool = False) -> list:
+    """Render one PDF page in this process and OCR it: only results cross processes"""
+    from extraction.pdf_converter import pdf_converter
+    return ocr_page(pdf_converter.render_page_array(pdf_path, page_number, dpi), cls)
@@ -4,7 +4,9 @@ Convert PDF pages to images for OCR processing
 """
 import os
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
+import cv2
+import numpy as np
 from loguru import logger
 
 try:
@@ -72,7 +74,7 @@ class PDFConverter:
         
         # Setup output directory
         if output_dir is None:
-            output_dir = Config.CACHE_DIR / "pdf_pages"
+            output_dir = Config.OCR_SCRATCH_DIR
         else:
             output_dir = Path(output_dir)
         
@@ -82,19 +84,25 @@ class PDFConverter:
         doc = fitz.open(pdf_path)
         image_paths = []
         
+        # Loop invariants: the same zoom matrix and file name stem for every page
+        matrix = self._zoom_matrix(dpi)
+        base_name = Path(pdf_path).stem
+        
         # Convert each page
         for page_num in range(len(doc)):
             page = doc[page_num]
             
             # Render page to pixmap
-            zoom = dpi / 72  # 72 is the default DPI
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat)
+            pix = self._render_pixmap(page, matrix)
             
-            # Save as PNG
-            base_name = Path(pdf_path).stem
-            image_path = output_dir / f"{base_name}_page_{page_num + 1}.png"
-            pix.save(str(image_path))
+            # Save (only here, where callers need a file): JPEG for colour
+            # scans, far smaller and faster to decode; PNG for grayscale
+            if pix.n == 1:
+                image_path = output_dir / f"{base_name}_page_{page_num + 1}.png"
+                pix.save(str(image_path))
+            else:
+                image_path = output_dir / f"{base_name}_page_{page_num + 1}.jpg"
+                pix.save(str(image_path), output="jpg", jpg_quality=90)
             
             image_paths.append(str(image_path))
             logger.debug(f"Converted page {page_num + 1}/{len(doc)}: {image_path.name}")
@@ -104,6 +112,65 @@ class PDFConverter:
         logger.success(f"Converted PDF to {len(image_paths)} images using PyMuPDF")
         return image_paths
     
+    @staticmethod
+    def _zoom_matrix(dpi: int) -> "fitz.Matrix":
+        """Page transform for rendering at dpi (built once per document)"""
+        zoom = dpi / 72  # 72 is the default DPI
+        return fitz.Matrix(zoom, zoom)
+    
+    @staticmethod
+    def _render_pixmap(page, matrix: "fitz.Matrix") -> "fitz.Pixmap":
+        """Render a PyMuPDF page to an RGB pixmap (no alpha)"""
+        return page.get_pixmap(matrix=matrix, alpha=False)
+    
+    @staticmethod
+    def _pixmap_to_array(pix: "fitz.Pixmap") -> np.ndarray:
+        """BGR array (the layout OCR expects) of a pixmap's samples, without encoding"""
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    
+    def page_count(self, pdf_path: str) -> int:
+        """Number of pages of a PDF (PyMuPDF)"""
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    
+    def iter_page_arrays(self, pdf_path: str, dpi: int = 300) -> Iterator[np.ndarray]:
+        """
+        Render PDF pages in memory with PyMuPDF, one at a time
+        
+        Args:
+            pdf_path: Path to PDF file
+            dpi: Resolution for rendering
+            
+        Yields:
+            BGR image array of each page, in page order
+        """
+        if not PYMUPDF_AVAILABLE:
+            raise RuntimeError("PyMuPDF not available")
+        
+        matrix = self._zoom_matrix(dpi)
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                yield self._pixmap_to_array(self._render_pixmap(page, matrix))
+    
+    def render_page_array(self, pdf_path: str, page_number: int, dpi: int = 300) -> np.ndarray:
+        """
+        Render a single PDF page in memory with PyMuPDF
+        
+        Args:
+            pdf_path: Path to PDF file
+            page_number: Zero-based page index
+            dpi: Resolution for rendering
+            
+        Returns:
+            BGR image array of the page
+        """
+        if not PYMUPDF_AVAILABLE:
+            raise RuntimeError("PyMuPDF not available")
+        
+        with fitz.open(pdf_path) as doc:
+            return self._pixmap_to_array(self._render_pixmap(doc[page_number], self._zoom_matrix(dpi)))
+    
     def convert_pdf_to_images_pdf2image(
         self,
         pdf_path: str,
@@ -126,7 +193,7 @@ class PDFConverter:
         
         # Setup output directory
         if output_dir is None:
-            output_dir = Config.CACHE_DIR / "pdf_pages"
+            output_dir = Config.OCR_SCRATCH_DIR
         else:
             output_dir = Path(output_dir)
         
@@ -139,8 +206,13 @@ class PDFConverter:
         base_name = Path(pdf_path).stem
         
         for i, image in enumerate(images):
-            image_path = output_dir / f"{base_name}_page_{i + 1}.png"
-            image.save(str(image_path), 'PNG')
+            # Same containers as the PyMuPDF path: PNG for grayscale, JPEG otherwise
+            if image.mode in ("1", "L"):
+                image_path = output_dir / f"{base_name}_page_{i + 1}.png"
+                image.save(str(image_path), 'PNG')
+            else:
+                image_path = output_dir / f"{base_name}_page_{i + 1}.jpg"
+                image.convert("RGB").save(str(image_path), 'JPEG', quality=90)
             image_paths.append(str(image_path))
             logger.debug(f"Converted page {i + 1}/{len(images)}: {image_path.name}")
         
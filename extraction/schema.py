@@ -3,7 +3,7 @@ DocuVault - Document Schema
 Comprehensive schema for various document types
 """
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from datetime import date
 
 
@@ -63,6 +63,13 @@ class PaymentInfo(BaseModel):
     bank_account: Optional[str] = None
 
 
+_VALID_DOCUMENT_TYPES = frozenset({
+    "invoice", "receipt", "quote", "estimate", 
+    "purchase_order", "delivery_note", "credit_note",
+    "statement", "contract", "lease", "bill", "unknown"
+})
+
+
 class ExtractedDocument(BaseModel):
     """Main document structure"""
     document_type: str = Field(
@@ -103,20 +110,16 @@ class ExtractedDocument(BaseModel):
         description="Overall extraction confidence"
     )
     
-    @validator('document_type')
+    @field_validator('document_type', mode='before')
+    @classmethod
     def validate_document_type(cls, v):
-        """Validate document type"""
-        valid_types = [
-            "invoice", "receipt", "quote", "estimate", 
-            "purchase_order", "delivery_note", "credit_note",
-            "statement", "contract", "lease", "bill", "unknown"
-        ]
-        if v.lower() not in valid_types:
+        """Validate document type (anything unrecognised becomes "unknown")"""
+        if not isinstance(v, str) or v.lower() not in _VALID_DOCUMENT_TYPES:
             return "unknown"
         return v.lower()
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "document_type": "invoice",
                 "document_number": "INV-2024-001",
@@ -147,83 +150,8 @@ class ExtractedDocument(BaseModel):
                 }
             }
         }
+    )
 
 
-# JSONSchema for validation (legacy compatibility)
-DOCUMENT_SCHEMA = {
-    "type": "object",
-    "required": ["document_type"],
-    "properties": {
-        "document_type": {"type": "string"},
-        "document_number": {"type": ["string", "null"]},
-        "reference_number": {"type": ["string", "null"]},
-        
-        "dates": {
-            "type": "object",
-            "properties": {
-                "issue_date": {"type": ["string", "null"]},
-                "due_date": {"type": ["string", "null"]},
-                "delivery_date": {"type": ["string", "null"]},
-                "payment_date": {"type": ["string", "null"]}
-            }
-        },
-        
-        "vendor": {
-            "type": ["object", "null"],
-            "properties": {
-                "name": {"type": ["string", "null"]},
-                "email": {"type": ["string", "null"]},
-                "phone": {"type": ["string", "null"]},
-                "tax_id": {"type": ["string", "null"]}
-            }
-        },
-        
-        "customer": {
-            "type": ["object", "null"],
-            "properties": {
-                "name": {"type": ["string", "null"]},
-                "email": {"type": ["string", "null"]},
-                "phone": {"type": ["string", "null"]}
-            }
-        },
-        
-        "items": {
-            "type": "array",
-            "items": {
-                "type": "object",
-                "required": ["description"],
-                "properties": {
-                    "description": {"type": "string"},
-                    "quantity": {"type": ["number", "null"]},
-                    "unit_price": {"type": ["string", "null"]},
-                    "amount": {"type": ["string", "null"]},
-                    "tax": {"type": ["string", "null"]}
-                }
-            }
-        },
-        
-        "amounts": {
-            "type": "object",
-            "properties": {
-                "subtotal": {"type": ["string", "null"]},
-                "tax": {"type": ["string", "null"]},
-                "discount": {"type": ["string", "null"]},
-                "total": {"type": ["string", "null"]},
-                "currency": {"type": ["string", "null"]},
-                "paid": {"type": ["string", "null"]},
-                "due": {"type": ["string", "null"]}
-            }
-        },
-        
-        "payment": {
-            "type": ["object", "null"],
-            "properties": {
-                "method": {"type": ["string", "null"]},
-                "transaction_id": {"type": ["string", "null"]}
-            }
-        },
-        
-        "notes": {"type": ["string", "null"]},
-        "confidence_score": {"type": ["number", "null"]}
-    }
-}
+# JSONSchema for validation (legacy compatibility), derived from the model
+DOCUMENT_SCHEMA = ExtractedDocument.model_json_schema()
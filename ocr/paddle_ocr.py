@@ -3,7 +3,8 @@ from paddleocr import PaddleOCR
 ocr_engine = PaddleOCR(
     lang="en",
     use_gpu=False,
-    show_log=False
+    show_log=False,
+    rec_batch_num=1  # CPU: larger batches only grow Paddle's memory arena
 )
 
 def run_ocr(image_path: str) -> str:
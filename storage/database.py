@@ -2,16 +2,23 @@
 DocuVault - Database Models
 SQLAlchemy models for document storage
 """
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, JSON, Boolean
+from typing import Any, Dict, List, NamedTuple, Optional
+from sqlalchemy import create_engine, event, func, insert, inspect, literal_column, select, text, Column, Integer, String, Text, DateTime, Float, JSON, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import sessionmaker, scoped_session
 from loguru import logger
 
 from core.config import Config
 
 Base = declarative_base()
 
+# Inlined (not a bound parameter) so SQLite can match queries to the expression index
+_DOCUMENT_NUMBER_PATH = literal_column("'$.document_number'")
+
 
 class Document(Base):
     """Document metadata and storage"""
@@ -47,6 +54,21 @@ class Document(Base):
     notes = Column(Text, nullable=True)
     is_archived = Column(Boolean, default=False)
     
+    __table_args__ = (
+        # Library listing: WHERE is_archived = 0 ORDER BY processed_at DESC
+        Index("ix_documents_archived_processed", is_archived, processed_at.desc()),
+        # Query engines: WHERE status = 'completed' AND is_archived = 0 ORDER BY processed_at DESC
+        Index("ix_documents_status_archived_processed", status, is_archived, processed_at.desc()),
+        # Type filters and per-type counts
+        Index("ix_documents_document_type", document_type),
+        # Library type filter / type counts: WHERE is_archived = 0 AND document_type = ?
+        Index("ix_documents_archived_type", is_archived, document_type),
+        # Pipeline backlog: WHERE status = 'pending' ORDER BY uploaded_at
+        Index("ix_documents_status_uploaded", status, uploaded_at),
+        # Lookup by invoice / document number inside the extracted JSON
+        Index("ix_documents_document_number", func.json_extract(extracted_data, _DOCUMENT_NUMBER_PATH)),
+    )
+    
     def __repr__(self):
         return f"<Document(id={self.id}, filename='{self.filename}', type='{self.document_type}')>"
     
@@ -69,6 +91,35 @@ class Document(Base):
         }
 
 
+class DocumentView(NamedTuple):
+    """Detached, read-only snapshot of a Document (safe to cache)"""
+    id: int
+    original_filename: str
+    document_type: Optional[str]
+    status: Optional[str]
+    ocr_confidence: Optional[float]
+    processed_at: Optional[datetime]
+    file_path: Optional[str]
+    extracted_data: Optional[Any]
+    has_ocr_text: bool
+    processed_at_str: str = "N/A"  # Display date, filled in by the loader
+    
+    @classmethod
+    def columns(cls) -> tuple:
+        """Columns to select (in field order) so rows map straight onto the view"""
+        return (
+            Document.id,
+            Document.original_filename,
+            Document.document_type,
+            Document.status,
+            Document.ocr_confidence,
+            Document.processed_at,
+            Document.file_path,
+            Document.extracted_data,
+            Document.ocr_text.isnot(None).label("has_ocr_text")
+        )
+
+
 class SearchHistory(Base):
     """Search/query history"""
     __tablename__ = "search_history"
@@ -79,28 +130,173 @@ class SearchHistory(Base):
     document_ids = Column(JSON, nullable=True)  # List of document IDs used
     created_at = Column(DateTime, default=datetime.utcnow)
     execution_time = Column(Float, nullable=True)
+    
+    # OpenAI Batch API jobs: answered asynchronously, response filled in later
+    batch_id = Column(String(100), nullable=True)
+    status = Column(String(50), nullable=True)  # None (answered inline), queued, completed, failed
+    
+    __table_args__ = (
+        # History pages: ORDER BY created_at DESC, id DESC, keyset cursor on both
+        Index("ix_search_history_created_id", created_at.desc(), id.desc()),
+        # Batch poller: WHERE status = 'queued'
+        Index("ix_search_history_status", status),
+    )
 
 
 class DatabaseManager:
     """Database connection and session management"""
     
     def __init__(self):
+        # Pooled connections are reused across sessions instead of reconnecting
         self.engine = create_engine(
             f"sqlite:///{Config.DB_PATH}",
-            echo=Config.DB_ECHO
+            echo=Config.DB_ECHO,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=True
         )
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        event.listen(self.engine, "connect", self._set_sqlite_pragmas)
+        # Loaded attributes stay readable after commit (e.g. for detached rows)
+        self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.Session = scoped_session(self.SessionLocal)
+        self._scope = threading.local()
+        # Bumped whenever documents are added, changed or archived (cache key)
+        self.documents_version = 0
+        self._version_lock = threading.Lock()
         self._create_tables()
     
+    @staticmethod
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Per-connection SQLite tuning, applied as the pool opens each connection"""
+        cursor = dbapi_connection.cursor()
+        # WAL: readers are not blocked by the writer; NORMAL syncs at checkpoints
+        # rather than on every commit (still durable against application crashes)
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MiB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB
+        cursor.close()
+    
     def _create_tables(self):
         """Create all tables"""
         Base.metadata.create_all(self.engine)
+        # create_all() skips new columns and indexes on tables that already exist
+        existing = inspect(self.engine)
+        with self.engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                present = {column["name"] for column in existing.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in present and column.nullable:
+                        conn.execute(text(
+                            f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                            f"{column.type.compile(dialect=self.engine.dialect)}"
+                        ))
+            # IF NOT EXISTS rather than checkfirst: SQLite reflection skips
+            # expression indexes, so checkfirst would re-create those every start
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
         logger.info("Database tables created/verified")
     
     def get_session(self):
         """Get a new database session"""
         return self.SessionLocal()
     
+    def bump_documents_version(self) -> int:
+        """Invalidate caches keyed on documents_version"""
+        with self._version_lock:
+            self.documents_version += 1
+            return self.documents_version
+    
+    @contextmanager
+    def session_scope(self):
+        """
+        Transactional scope around the thread-local session
+        
+        Nested scopes reuse the outer session; each scope commits on success
+        and rolls back on error, and the outermost one closes the session.
+        """
+        session = self.Session()
+        depth = getattr(self._scope, "depth", 0)
+        self._scope.depth = depth + 1
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._scope.depth = depth
+            if depth == 0:
+                self.Session.remove()
+    
+    def get_analytics_stats(self, low_quality_threshold: float = 0.7) -> Dict[str, Any]:
+        """
+        Aggregate statistics over non-archived documents, computed in SQL
+        
+        Returns:
+            Dict with completed, processing, failed, avg_quality (0-100, missing
+            scores count as 0), types_count and low_quality_ids
+        """
+        active = Document.is_archived == False
+        
+        with self.session_scope() as session:
+            by_status = dict(
+                session.query(Document.status, func.count(Document.id))
+                .filter(active)
+                .group_by(Document.status)
+                .all()
+            )
+            avg_conf, types_count = session.query(
+                func.avg(func.coalesce(Document.ocr_confidence, 0)),
+                func.count(func.distinct(Document.document_type))
+            ).filter(active).one()
+            low_quality_ids = [
+                doc_id for (doc_id,) in session.query(Document.id).filter(
+                    active,
+                    Document.ocr_confidence > 0,
+                    Document.ocr_confidence < low_quality_threshold
+                )
+            ]
+        
+        return {
+            "completed": by_status.get("completed", 0),
+            "processing": by_status.get("processing", 0),
+            "failed": by_status.get("failed", 0),
+            "avg_quality": (avg_conf or 0) * 100,
+            "types_count": types_count or 0,
+            "low_quality_ids": low_quality_ids
+        }
+    
+    def bulk_insert_documents(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert many documents in one transaction (one commit, no ORM unit of work)
+        
+        Args:
+            rows: Column name -> value dicts, one per document
+            
+        Returns:
+            Number of rows inserted
+        """
+        if not rows:
+            return 0
+        
+        with self.session_scope() as session:
+            session.execute(insert(Document), rows)
+        self.bump_documents_version()
+        return len(rows)
+    
+    def find_by_document_number(self, document_number: str) -> List[int]:
+        """Ids of documents whose extracted document_number matches (index lookup)"""
+        with self.session_scope() as session:
+            return list(session.execute(
+                select(Document.id).where(
+                    func.json_extract(Document.extracted_data, _DOCUMENT_NUMBER_PATH) == document_number
+                )
+            ).scalars())
+    
     def reset_database(self):
         """Drop and recreate all tables (USE WITH CAUTION)"""
         Base.metadata.drop_all(self.engine)
@@ -0,0 +1,44 @@
+"""
+DocuVault - Tests
+Adaptive query engine
+"""
+import time
+
+from core.config import Config
+
+
+def test_query_many_overlaps_document_fetches(monkeypatch):
+    """Blocking document fetches run off the event loop, so questions overlap"""
+    from core.adaptive_query import AdaptiveQueryEngine
+    
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    engine = AdaptiveQueryEngine("openai")
+    
+    def slow_fetch(*args):
+        time.sleep(0.3)
+        return []
+    monkeypatch.setattr(engine, "get_documents", slow_fetch)
+    
+    start = time.monotonic()
+    results = engine.query_many(["total?", "vendor?", "compare?"])
+    
+    assert [r["error"] for r in results] == ["no_documents"] * 3
+    assert time.monotonic() - start < 0.8
+
+
+def test_extracted_json_cache_is_thread_safe(monkeypatch):
+    """Concurrent encoders evicting from the bounded cache never raise"""
+    from concurrent.futures import ThreadPoolExecutor
+    from types import SimpleNamespace
+    from core import adaptive_query
+    
+    monkeypatch.setattr(adaptive_query, "_EXTRACTED_JSON", {})
+    monkeypatch.setattr(adaptive_query, "_EXTRACTED_JSON_SIZE", 4)
+    docs = [SimpleNamespace(id=i, processed_at=None, extracted_data={"vendor": f"v{i}"}) for i in range(64)]
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(20):
+            texts = list(pool.map(lambda doc: adaptive_query._extracted_json(doc, "general"), docs))
+    
+    assert texts[5] == '{"vendor":"v5"}'
+    assert len(adaptive_query._EXTRACTED_JSON) <= 4
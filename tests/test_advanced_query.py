@@ -0,0 +1,181 @@
+"""
+DocuVault - Tests
+Advanced query engine helpers
+"""
+import json
+from types import SimpleNamespace
+
+from core.advanced_query import count_tokens
+
+
+def test_count_tokens_gpt_4o():
+    """gpt-4o counts without raising, whatever tiktoken version is installed"""
+    assert isinstance(count_tokens("x", "gpt-4o"), int)
+    assert count_tokens("hello world " * 10, "gpt-4o") > 0
+
+
+def test_count_tokens_unknown_model():
+    """Models tiktoken does not know fall back to a default encoding"""
+    assert count_tokens("hello world " * 10, "not-a-real-model") > 0
+
+
+def test_system_prompts_reach_prompt_cache_minimum():
+    """OpenAI and Anthropic only cache prefixes of at least 1024 tokens"""
+    from core.advanced_query import SYSTEM_PROMPT, SYSTEM_PROMPT_MINI
+    
+    for prompt in (SYSTEM_PROMPT, SYSTEM_PROMPT_MINI):
+        assert count_tokens(prompt, "gpt-4o") >= 1024
+
+
+def test_search_history_pages_forward(tmp_path, monkeypatch):
+    """The last record of a page is a valid cursor for the next page"""
+    from datetime import datetime, timedelta
+    from core import advanced_query
+    from core.config import Config
+    from storage.database import DatabaseManager, SearchHistory
+    
+    monkeypatch.setattr(Config, "DB_PATH", tmp_path / "docuvault.db")
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    manager = DatabaseManager()
+    monkeypatch.setattr(advanced_query, "db_manager", manager)
+    
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    with manager.session_scope() as session:
+        session.add_all([
+            SearchHistory(query=f"q{i}", created_at=start + timedelta(minutes=i))
+            for i in range(4)
+        ])
+    
+    engine = advanced_query.AdvancedQueryEngine("openai")
+    first = engine.get_search_history(limit=2)
+    last = first[-1]
+    second = engine.get_search_history(limit=2, before=(last["created_at"], last["id"]))
+    
+    assert [h["query"] for h in first] == ["q3", "q2"]
+    assert [h["query"] for h in second] == ["q1", "q0"]
+
+
+class _StubBatchClient:
+    """Just enough of the OpenAI client for submit_batch / poll_batches"""
+    
+    def __init__(self):
+        self.requests = []
+        self.files = self
+        self.batches = self
+    
+    # files.create / batches.create
+    def create(self, **kwargs):
+        if "file" in kwargs:
+            _, data = kwargs["file"]
+            self.requests = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+            return SimpleNamespace(id="file-in")
+        return SimpleNamespace(id="batch-1")
+    
+    # batches.retrieve
+    def retrieve(self, batch_id):
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id="file-out")
+    
+    # files.content: answer every request but the last
+    def content(self, file_id):
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "response": {"body": {"choices": [{"message": {"content": f"answer {request['custom_id']}"}}]}}
+            })
+            for request in self.requests[:-1]
+        ]
+        return SimpleNamespace(text="\n".join(lines))
+
+
+def test_batch_submit_and_poll_round_trip(tmp_path, monkeypatch):
+    """Queued questions are submitted as JSONL and answered by polling"""
+    from datetime import datetime
+    from core import advanced_query
+    from core.config import Config
+    from storage.database import DatabaseManager, Document, SearchHistory
+    
+    monkeypatch.setattr(Config, "DB_PATH", tmp_path / "docuvault.db")
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(Config, "BATCH_POLL_INTERVAL", 3600)
+    manager = DatabaseManager()
+    monkeypatch.setattr(advanced_query, "db_manager", manager)
+    
+    with manager.session_scope() as session:
+        session.add(Document(
+            filename="a.pdf", original_filename="a.pdf", file_path="/tmp/a.pdf",
+            status="completed", document_type="invoice", processed_at=datetime(2026, 1, 1),
+            extracted_data={"document_type": "invoice", "amounts": {"total": "10.00"}}
+        ))
+    
+    engine = advanced_query.AdvancedQueryEngine("openai")
+    stub = _StubBatchClient()
+    engine.sync_client = stub
+    
+    assert engine.submit_batch(["total?", "vendor?"]) == "batch-1"
+    assert [request["body"]["model"] for request in stub.requests] == [engine.model] * 2
+    
+    assert engine.poll_batches() == 1
+    with manager.session_scope() as session:
+        rows = session.query(SearchHistory).order_by(SearchHistory.id).all()
+        assert [(row.status, row.response) for row in rows] == [
+            ("completed", f"answer {rows[0].id}"),
+            ("failed", None),
+        ]
+    assert engine._queued_batch_count() == 0
+    
+    # With nothing left queued the poller stops (and is started afresh next time)
+    engine._poll_until_done()
+    assert engine._poller is None
+
+
+def test_get_query_engine_retries_after_failure(tmp_path, monkeypatch):
+    """A failed setup is not cached; the engine is built once keys are configured"""
+    from core import advanced_query
+    from core.config import Config
+    from storage.database import DatabaseManager
+    
+    monkeypatch.setattr(Config, "DB_PATH", tmp_path / "docuvault.db")
+    monkeypatch.setattr(advanced_query, "db_manager", DatabaseManager())
+    monkeypatch.setattr(advanced_query, "_query_engines", {})
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(Config, "ANTHROPIC_API_KEY", None)
+    assert advanced_query.get_query_engine("openai") is None
+    
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    engine = advanced_query.get_query_engine("openai")
+    assert engine is not None
+    assert advanced_query.get_query_engine("openai") is engine
+
+
+def test_query_stream_uses_semantic_cache(tmp_path, monkeypatch):
+    """A re-phrased question is answered from the semantic cache without streaming"""
+    import numpy as np
+    from core import advanced_query
+    from core.config import Config
+    from core.llm_cache import LLMCache
+    from core.semantic_cache import SemanticCache
+    
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(advanced_query, "llm_cache", LLMCache(path=tmp_path / "llm_cache.db"))
+    cache = SemanticCache()
+    async def aembed(question):
+        return np.ones(4, dtype=np.float32) / 2
+    monkeypatch.setattr(cache, "aembed", aembed)
+    monkeypatch.setattr(advanced_query, "semantic_cache", cache)
+    
+    engine = advanced_query.AdvancedQueryEngine("openai")
+    documents = [SimpleNamespace(id=1, processed_at=None)]
+    calls = []
+    def stream_llm(prompt, system_prompt):
+        calls.append(prompt)
+        yield "Total: "
+        yield "42"
+    monkeypatch.setattr(engine, "get_documents", lambda *args: documents)
+    monkeypatch.setattr(engine, "get_type_counts", lambda *args: {"invoice": 1})
+    monkeypatch.setattr(engine, "build_advanced_context", lambda *args: "context")
+    monkeypatch.setattr(engine, "stream_llm", stream_llm)
+    monkeypatch.setattr(engine, "_save_to_history", lambda *args: None)
+    
+    assert "".join(engine.query_stream("What is the total?")) == "Total: 42"
+    assert "".join(engine.query_stream("How much in total?")) == "Total: 42"
+    assert len(calls) == 1
@@ -0,0 +1,31 @@
+"""
+DocuVault - Tests
+Shared event loop for sync wrappers
+"""
+import asyncio
+
+import pytest
+
+from core import async_runner
+
+
+async def _current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_run_reuses_one_loop():
+    """Successive sync calls share a loop, so async clients stay usable"""
+    first = async_runner.run(_current_loop())
+    second = async_runner.run(_current_loop())
+    
+    assert first is second is async_runner.get_loop()
+    assert not first.is_closed()
+
+
+def test_run_propagates_exceptions():
+    """The coroutine's exception is raised in the calling thread"""
+    async def fail():
+        raise ValueError("boom")
+    
+    with pytest.raises(ValueError, match="boom"):
+        async_runner.run(fail())
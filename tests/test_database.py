@@ -0,0 +1,24 @@
+"""
+DocuVault - Tests
+Database schema setup
+"""
+from sqlalchemy import inspect, text
+
+from core.config import Config
+from storage.database import DatabaseManager
+
+
+def test_database_manager_reopens_existing_file(tmp_path, monkeypatch):
+    """Schema setup is idempotent, including the expression index"""
+    monkeypatch.setattr(Config, "DB_PATH", tmp_path / "docuvault.db")
+    
+    DatabaseManager()
+    manager = DatabaseManager()
+    
+    with manager.engine.connect() as conn:
+        names = set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'documents'"
+        )).scalars())
+    assert "ix_documents_document_number" in names
+    assert "ix_documents_status_uploaded" in names
+    assert "documents" in inspect(manager.engine).get_table_names()
@@ -0,0 +1,19 @@
+"""
+DocuVault - Tests
+LLM extraction prompt
+"""
+from core.advanced_query import count_tokens
+from extraction.llm_extractor import _PROMPT_PREFIX, _WORKED_EXAMPLES
+from extraction.schema import ExtractedDocument
+
+
+def test_prompt_prefix_reaches_prompt_cache_minimum():
+    """OpenAI and Anthropic only cache prefixes of at least 1024 tokens"""
+    assert count_tokens(_PROMPT_PREFIX, "gpt-4o") >= 1024
+
+
+def test_worked_examples_match_schema():
+    """The expected outputs shown to the model are valid extractions"""
+    for _, expected in _WORKED_EXAMPLES:
+        document = ExtractedDocument.model_validate(expected)
+        assert document.document_type == expected["document_type"]